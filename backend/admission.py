@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import math
+import time
+from typing import Optional, Tuple
+import orjson
+import redis.asyncio as redis
+from config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_READ_RATE, RATE_LIMIT_READ_BURST,
+    RATE_LIMIT_WRITE_RATE, RATE_LIMIT_WRITE_BURST, MAX_IN_FLIGHT_WRITES
+)
+from metrics import REJECTED_REQUESTS, IN_FLIGHT_WRITES
+from resources import resources
+
+logger = logging.getLogger(__name__)
+
+# KEYS: bucket  ARGV: rate (tokens per second), burst
+# Returns {allowed, seconds until a token is available}. Uses the Redis clock so
+# every worker refills the bucket the same way.
+_TAKE_TOKEN = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local allowed, wait = 0, 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+# Paths that must answer even when the service is shedding load
+_EXEMPT_PATHS = ("/health", "/metrics")
+
+# Seconds between warnings while Redis is unreachable
+_FAIL_OPEN_LOG_INTERVAL = 60.0
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets in Redis, one read and one write bucket per client,
+    refilled continuously and checked and drawn from atomically by one script
+    """
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        read_rate: float = RATE_LIMIT_READ_RATE,
+        read_burst: float = RATE_LIMIT_READ_BURST,
+        write_rate: float = RATE_LIMIT_WRITE_RATE,
+        write_burst: float = RATE_LIMIT_WRITE_BURST
+    ):
+        self.redis_client = redis_client
+        self.limits = {"read": (read_rate, read_burst), "write": (write_rate, write_burst)}
+        self._take_token = redis_client.register_script(_TAKE_TOKEN)
+
+    async def acquire(self, client: str, bucket: str) -> Tuple[bool, float]:
+        """Take a token from the client's bucket: (allowed, seconds to wait if not)"""
+        rate, burst = self.limits[bucket]
+        allowed, wait = await self._take_token(keys=[f"rate_limit:{bucket}:{client}"], args=[rate, burst])
+        return bool(allowed), float(wait)
+
+class AdmissionMiddleware:
+    """
+    Sheds load before it reaches the handlers. Writes (every non-GET request) are
+    capped at MAX_IN_FLIGHT_WRITES at once per process, sized to the database pool
+    each process owns, and unless RATE_LIMIT_ENABLED is off every request draws
+    from its client's token bucket. Either limit answers 429 with Retry-After.
+    If Redis is unreachable, requests are let through rather than failed.
+    """
+    def __init__(
+        self,
+        app,
+        rate_limit: bool = RATE_LIMIT_ENABLED,
+        max_in_flight_writes: int = MAX_IN_FLIGHT_WRITES,
+        limiter: Optional[TokenBucketLimiter] = None
+    ):
+        self.app = app
+        self.rate_limit = rate_limit
+        self.max_in_flight_writes = max_in_flight_writes
+        self.in_flight_writes = 0
+        self._limiter = limiter
+        # Without a given limiter, one is built on the shared Redis client and follows it
+        self._shared_limiter = limiter is None
+        self._fail_open_logged_at = 0.0
+        IN_FLIGHT_WRITES.set_function(lambda: self.in_flight_writes)
+
+    @property
+    def limiter(self) -> TokenBucketLimiter:
+        if self._shared_limiter and (self._limiter is None or self._limiter.redis_client is not resources.redis):
+            self._limiter = TokenBucketLimiter(resources.redis)
+        return self._limiter
+
+    @staticmethod
+    def client_id(scope) -> str:
+        """The API key if one is sent (hashed, so keys never land in Redis), else the client address"""
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                return "key:" + hashlib.sha256(value).hexdigest()[:32]
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in _EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        write = scope["method"] != "GET"
+        if write:
+            if self.in_flight_writes >= self.max_in_flight_writes:
+                # Checked before the bucket, so an overloaded process doesn't add Redis round trips
+                await self._reject(send, "overloaded", 1.0)
+                return
+            self.in_flight_writes += 1
+        try:
+            wait = await self._rate_limit_wait(scope, "write" if write else "read") if self.rate_limit else None
+            if wait is not None:
+                await self._reject(send, "rate_limited", wait)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            if write:
+                self.in_flight_writes -= 1
+
+    async def _rate_limit_wait(self, scope, bucket: str) -> Optional[float]:
+        """Seconds the client must wait, or None if the request may proceed"""
+        try:
+            allowed, wait = await self.limiter.acquire(self.client_id(scope), bucket)
+        except redis.RedisError:
+            now = time.monotonic()
+            if now - self._fail_open_logged_at > _FAIL_OPEN_LOG_INTERVAL:
+                self._fail_open_logged_at = now
+                logger.warning("Rate limiter unavailable, admitting requests", exc_info=True)
+            return None
+        return None if allowed else wait
+
+    async def _reject(self, send, reason: str, wait: float):
+        REJECTED_REQUESTS.labels(reason).inc()
+        detail = "Too many requests in flight" if reason == "overloaded" else "Rate limit exceeded"
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": orjson.dumps({"detail": detail})})
@@ -1,43 +1,113 @@
-from fastapi import Depends, BackgroundTasks
+from typing import Optional
+from fastapi import Depends, BackgroundTasks, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from config import async_session
+from config import LEDGER_MODE, JOURNAL_ENABLED
+from resources import resources
+from replica import replica_monitor
+from models.db_models import DEFAULT_ACCOUNT_ID
 from repositories.account_repo import AccountRepository
 from repositories.orders_repo import OrderRepository
+from repositories.journal_repo import JournalRepository
 from services.account_service import AccountService
 from services.cache_service import CacheService
 from services.order_service import OrderService
+from services.order_cache_service import OrderCacheService
+from services.portfolio_service import PortfolioService
+from services.idempotency_service import IdempotencyService
+from services.journal_service import JournalService
+from services.ledger_service import ledger_service
 
 # Database session dependency
 async def get_db():
     """
     Create and yield a database session
     """
-    async with async_session() as session:
+    async with resources.session_factory() as session:
+        yield session
+
+# Account dependency
+def get_account_id(request: Request) -> int:
+    """
+    Get the account a request addresses: the id under /accounts/{account_id},
+    or the default account on the unprefixed routes
+    """
+    return request.path_params.get("account_id", DEFAULT_ACCOUNT_ID)
+
+async def get_read_db(request: Request, account_id: int = Depends(get_account_id)):
+    """
+    Yield a read replica session for a GET request when the replica is fresh enough
+    for the account, or None to read from the primary. Requests that write read
+    from the primary throughout, so they see their own writes.
+    """
+    if request.method != "GET" or not await replica_monitor.use_replica(account_id):
+        yield None
+        return
+    async with resources.replica_session_factory() as session:
         yield session
 
 # Repository dependencies
-async def get_account_repo(db: AsyncSession = Depends(get_db)):
+async def get_account_repo(
+    db: AsyncSession = Depends(get_db),
+    read_db: Optional[AsyncSession] = Depends(get_read_db),
+    account_id: int = Depends(get_account_id)
+):
     """Get the account repository"""
-    return AccountRepository(db)
+    return AccountRepository(db, account_id, read_db)
 
-async def get_order_repo(db: AsyncSession = Depends(get_db)):
+async def get_order_repo(
+    db: AsyncSession = Depends(get_db),
+    read_db: Optional[AsyncSession] = Depends(get_read_db),
+    account_id: int = Depends(get_account_id)
+):
     """Get the order repository"""
-    return OrderRepository(db)
+    return OrderRepository(db, account_id, read_db)
+
+async def get_journal_repo(
+    db: AsyncSession = Depends(get_db),
+    read_db: Optional[AsyncSession] = Depends(get_read_db),
+    account_id: int = Depends(get_account_id)
+):
+    """Get the account event journal repository"""
+    return JournalRepository(db, account_id, read_db)
 
 # Service dependencies
 def get_cache_service():
-    """Get the cache service"""
-    return CacheService()
+    """Get the cache service, backed by the shared Redis pool"""
+    return CacheService(resources.redis)
+
+async def get_journal_service(journal_repo: JournalRepository = Depends(get_journal_repo)):
+    """Get the journal service, or None when JOURNAL_ENABLED is off"""
+    return JournalService(journal_repo) if JOURNAL_ENABLED else None
 
-async def get_account_service(account_repo: AccountRepository = Depends(get_account_repo)):
+async def get_account_service(
+    account_repo: AccountRepository = Depends(get_account_repo),
+    journal: JournalService = Depends(get_journal_service)
+):
     """Get the account service"""
-    return AccountService(account_repo)
+    return AccountService(account_repo, ledger_service if LEDGER_MODE else None, journal)
 
 async def get_order_service(
     order_repo: OrderRepository = Depends(get_order_repo),
     account_service: AccountService = Depends(get_account_service),
     cache_service: CacheService = Depends(get_cache_service),
+    journal: JournalService = Depends(get_journal_service),
     background_tasks: BackgroundTasks = None
 ):
     """Get the order service"""
-    return OrderService(order_repo, account_service, cache_service, background_tasks)
+    return OrderService(order_repo, account_service, cache_service, background_tasks, journal=journal)
+
+async def get_portfolio_service(
+    order_repo: OrderRepository = Depends(get_order_repo),
+    cache_service: CacheService = Depends(get_cache_service)
+):
+    """Get the portfolio service"""
+    return PortfolioService(
+        order_repo, OrderCacheService.for_account(cache_service.redis_client, order_repo.account_id)
+    )
+
+async def get_idempotency_service(
+    cache_service: CacheService = Depends(get_cache_service),
+    account_id: int = Depends(get_account_id)
+):
+    """Get the idempotency service"""
+    return IdempotencyService.for_account(cache_service.redis_client, account_id)
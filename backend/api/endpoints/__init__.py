@@ -1 +1 @@
-from . import account, orders, price
+from . import account, orders, portfolio, price, system
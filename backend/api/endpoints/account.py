@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from config import ORDER_PAGE_SIZE, ORDER_PAGE_MAX
 from services.account_service import AccountService
-from models.schemas import AccountResponse
-from api.dependencies import get_account_service
+from services.journal_service import JournalService
+from models.schemas import (
+    AccountResponse, AccountCreateRequest, AccountCreateResponse, AccountEventResponse, AccountStateResponse
+)
+from api.dependencies import get_account_service, get_journal_service
 
 router = APIRouter()
 
+# Account management, not scoped to an existing account
+accounts_router = APIRouter()
+
 @router.get("/account", response_model=AccountResponse)
 async def get_account(account_service: AccountService = Depends(get_account_service)):
     """
@@ -12,3 +20,45 @@ async def get_account(account_service: AccountService = Depends(get_account_serv
     """
     account = await account_service.get_account_details()
     return {"cash_balance": account.cash_balance, "btc_balance": account.btc_balance}
+
+def require_journal(journal: Optional[JournalService] = Depends(get_journal_service)) -> JournalService:
+    if journal is None:
+        raise HTTPException(status_code=404, detail="Account journal is disabled")
+    return journal
+
+@router.get("/account/events", response_model=List[AccountEventResponse])
+async def get_account_events(
+    after_seq: int = Query(0, ge=0),
+    limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=ORDER_PAGE_MAX),
+    journal: JournalService = Depends(require_journal)
+):
+    """
+    Returns the account's journaled trade and balance events after `after_seq`, oldest first.
+    Pass the last `seq` back as `after_seq` to get the next page.
+    """
+    return await journal.get_events(after_seq, limit)
+
+@router.get("/account/state", response_model=AccountStateResponse)
+async def get_account_state(journal: JournalService = Depends(require_journal)):
+    """
+    Returns the balances and open and pending orders rebuilt from the account's
+    latest journal snapshot and the events after it.
+    """
+    state = await journal.rebuild()
+    return {
+        "seq": state.seq,
+        "cash_balance": state.cash_balance,
+        "btc_balance": state.btc_balance,
+        "orders": list(state.orders.values()),
+    }
+
+@accounts_router.post("/accounts", response_model=AccountCreateResponse, status_code=201)
+async def create_account(
+    account_req: AccountCreateRequest,
+    account_service: AccountService = Depends(get_account_service)
+):
+    """
+    Opens a new trading account. Its routes live under /accounts/{id}.
+    """
+    account = await account_service.open_account(account_req.cash_balance, account_req.btc_balance)
+    return {"id": account.id, "cash_balance": account.cash_balance, "btc_balance": account.btc_balance}
@@ -1,45 +1,98 @@
-from typing import List
-from fastapi import APIRouter, Depends, BackgroundTasks
+import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, BackgroundTasks, Header, Query, Response
+from config import ORDER_PAGE_SIZE, ORDER_PAGE_MAX
 from services.order_service import OrderService
+from services.idempotency_service import IdempotencyService
 from models.schemas import (
     TradeRequest, 
     CloseRequest, 
+    CancelRequest,
     TradeOrderResponse, 
     TradeResponse, 
-    CloseResponse
+    CloseResponse,
+    CancelResponse,
+    BatchTradeRequest,
+    BatchTradeResponse,
+    BulkCloseRequest,
+    BulkCloseResponse
 )
-from api.dependencies import get_order_service
+from api.dependencies import get_order_service, get_idempotency_service
 
 router = APIRouter()
 
 @router.get("/orders", response_model=List[TradeOrderResponse])
 async def get_order_history(
+    limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=ORDER_PAGE_MAX),
+    cursor: Optional[str] = None,
+    status: Optional[Literal["pending", "open", "closed", "cancelled", "rejected"]] = None,
+    type: Optional[Literal["buy", "sell"]] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+    accept_encoding: str = Header(""),
     order_service: OrderService = Depends(get_order_service)
 ):
     """
-    Returns the list of all trade orders.
+    Returns a page of trade orders, newest first.
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page.
     """
-    return await order_service.get_order_history()
+    page = await order_service.get_order_history(
+        limit, cursor, status, type, created_from, created_to, accept_gzip="gzip" in accept_encoding
+    )
+    # The page is already encoded JSON in the response model's shape, so it skips validation
+    headers = {"X-Next-Cursor": page["next_cursor"]} if page["next_cursor"] else {}
+    if page["encoding"]:
+        # Compressed from cache; the GZip middleware passes encoded bodies through
+        headers.update({"Content-Encoding": page["encoding"], "Vary": "Accept-Encoding"})
+    return Response(content=page["body"], media_type="application/json", headers=headers)
 
 @router.post("/trade", response_model=TradeResponse)
 async def create_trade(
     trade: TradeRequest,
     background_tasks: BackgroundTasks,
-    order_service: OrderService = Depends(get_order_service)
+    order_service: OrderService = Depends(get_order_service),
+    idempotency: IdempotencyService = Depends(get_idempotency_service),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    """
+    Creates a new trade order at the current live price, or with `kind` "limit"
+    or "stop" a pending order that fills once the price reaches `trigger_price`.
+    Send an Idempotency-Key header to make retries safe on every mutating order endpoint.
+    """
+    # Inject background tasks into the service
+    order_service.background_tasks = background_tasks
+    
+    return await idempotency.run(
+        idempotency_key, "trade", trade, TradeResponse,
+        lambda: order_service.create_trade(trade.type, trade.amount, trade.kind, trade.trigger_price)
+    )
+
+@router.post("/trades/batch", response_model=BatchTradeResponse)
+async def create_trades(
+    batch: BatchTradeRequest,
+    background_tasks: BackgroundTasks,
+    order_service: OrderService = Depends(get_order_service),
+    idempotency: IdempotencyService = Depends(get_idempotency_service),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
 ):
     """
-    Creates a new trade order at the current live price.
+    Creates several trade orders at one live price, reporting a result per trade.
     """
     # Inject background tasks into the service
     order_service.background_tasks = background_tasks
     
-    return await order_service.create_trade(trade.type, trade.amount)
+    return await idempotency.run(
+        idempotency_key, "trades_batch", batch, BatchTradeResponse,
+        lambda: order_service.create_trades([(trade.type, trade.amount) for trade in batch.trades])
+    )
 
 @router.post("/close", response_model=CloseResponse)
 async def close_trade(
     close_req: CloseRequest,
     background_tasks: BackgroundTasks,
-    order_service: OrderService = Depends(get_order_service)
+    order_service: OrderService = Depends(get_order_service),
+    idempotency: IdempotencyService = Depends(get_idempotency_service),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
 ):
     """
     Closes an open trade order.
@@ -47,4 +100,51 @@ async def close_trade(
     # Inject background tasks into the service
     order_service.background_tasks = background_tasks
     
-    return await order_service.close_trade(close_req.order_id)
+    return await idempotency.run(
+        idempotency_key, "close", close_req, CloseResponse,
+        lambda: order_service.close_trade(close_req.order_id)
+    )
+
+@router.post("/cancel", response_model=CancelResponse)
+async def cancel_order(
+    cancel_req: CancelRequest,
+    background_tasks: BackgroundTasks,
+    order_service: OrderService = Depends(get_order_service),
+    idempotency: IdempotencyService = Depends(get_idempotency_service),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    """
+    Cancels a pending limit or stop order.
+    """
+    # Inject background tasks into the service
+    order_service.background_tasks = background_tasks
+    
+    return await idempotency.run(
+        idempotency_key, "cancel", cancel_req, CancelResponse,
+        lambda: order_service.cancel_order(cancel_req.order_id)
+    )
+
+@router.post("/close/bulk", response_model=BulkCloseResponse)
+async def close_trades(
+    close_req: BulkCloseRequest,
+    background_tasks: BackgroundTasks,
+    order_service: OrderService = Depends(get_order_service),
+    idempotency: IdempotencyService = Depends(get_idempotency_service),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    """
+    Closes the given open orders, or every open order matching a filter, at one live price.
+    """
+    # Inject background tasks into the service
+    order_service.background_tasks = background_tasks
+    
+    async def close():
+        if close_req.order_ids is not None:
+            return await order_service.close_trades(order_ids=close_req.order_ids)
+        return await order_service.close_trades(
+            type=close_req.filter.type,
+            created_from=close_req.filter.created_from,
+            created_to=close_req.filter.created_to
+        )
+    
+    return await idempotency.run(idempotency_key, "close_bulk", close_req, BulkCloseResponse, close)
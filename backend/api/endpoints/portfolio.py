@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+from services.portfolio_service import PortfolioService
+from models.schemas import PortfolioResponse
+from api.dependencies import get_portfolio_service
+
+router = APIRouter()
+
+@router.get("/portfolio", response_model=PortfolioResponse)
+async def get_portfolio(
+    marks: bool = True,
+    portfolio_service: PortfolioService = Depends(get_portfolio_service)
+):
+    """
+    Returns the open orders valued at the current price: unrealized PnL, exposure,
+    volume-weighted entry price per side and, unless `marks=false`, a mark per order.
+    """
+    return await portfolio_service.get_portfolio(include_marks=marks)
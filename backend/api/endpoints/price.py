@@ -1,6 +1,10 @@
-from fastapi import APIRouter
+import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
 from services.price_service import PriceService
-from models.schemas import PriceResponse
+from services.candle_service import candle_store
+from models.schemas import PriceResponse, PriceHistoryResponse
 
 router = APIRouter()
 
@@ -9,5 +13,18 @@ async def get_price():
     """
     Returns the current Bitcoin price.
     """
-    price = await PriceService.fetch_live_price()
+    price = await PriceService.get_price()
     return {"price": price}
+
+@router.get("/price/history", response_model=PriceHistoryResponse)
+async def get_price_history(
+    interval: Literal["1s", "1m", "1h"] = "1m",
+    start: Optional[datetime.datetime] = Query(None, alias="from"),
+    end: Optional[datetime.datetime] = Query(None, alias="to")
+):
+    """
+    Returns OHLCV candles recorded from the live price, as one array per field.
+    Without a range, returns the most recent candles.
+    """
+    # Columns of plain floats need no validation, so skip the response model's per-item pass
+    return JSONResponse(candle_store.history(interval, start, end))
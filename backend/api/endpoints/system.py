@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from resources import resources
+from metrics import registry
+
+router = APIRouter()
+
+@router.get("/health")
+async def health():
+    """
+    Returns service status and usage of the shared connection pools.
+    """
+    return {"status": "ok", "pools": resources.pool_stats()}
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: request and per-stage latency histograms, cache hit/miss
+    counters, connection pool usage and background queue depths.
+    """
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
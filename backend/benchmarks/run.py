@@ -0,0 +1,253 @@
+"""
+Load-test the trading API and report throughput and latency per endpoint as JSON.
+
+By default the app is booted in-process behind an ASGI client, with a fake Coindesk,
+a SQLite file for Postgres, fakeredis for Redis and a counting stub for Mongo, so
+no services need to run. Point --database-url / --redis-url / --mongo-url at local
+services for more representative numbers, or --url at an already running server.
+
+    python -m benchmarks.run --requests 2000 --concurrency 50 --output bench.json
+    python -m benchmarks.run --baseline bench.json   # exits 1 on a regression
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+import numpy as np
+
+TRADE_AMOUNT = 0.0001
+
+# Endpoint name to a request factory taking (client, request index, prepared state)
+Scenario = Callable[[httpx.AsyncClient, int, Dict[str, Any]], Awaitable[httpx.Response]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "GET /price": lambda client, i, state: client.get("/price"),
+    "GET /account": lambda client, i, state: client.get(f"{state['prefix']}/account"),
+    "GET /orders": lambda client, i, state: client.get(f"{state['prefix']}/orders", params={"limit": 100}),
+    "POST /trade": lambda client, i, state: client.post(
+        f"{state['prefix']}/trade", json={"type": "buy" if i % 2 == 0 else "sell", "amount": TRADE_AMOUNT}
+    ),
+    "POST /close": lambda client, i, state: client.post(
+        f"{state['prefix']}/close", json={"order_id": state["open_order_ids"][i % len(state["open_order_ids"])]}
+    ),
+}
+
+def summarize(latencies: List[float], errors: int, elapsed: float, rejected: int = 0) -> Dict[str, Any]:
+    """
+    Throughput and latency percentiles (milliseconds) of one endpoint run. Requests shed
+    with a 429 are counted as `rejected` and left out of the latencies, so load shedding
+    can't pass for a fast write path.
+    """
+    timings = np.array(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) if timings.size else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rejected": rejected,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(float(timings.mean()), 3) if timings.size else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(timings.max()), 3) if timings.size else 0.0,
+    }
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Endpoints whose throughput fell, or whose p95/p99 rose, by more than `tolerance` against a baseline"""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {current['rps']} req/s, was {previous['rps']}")
+        for percentile in ("p95_ms", "p99_ms"):
+            if current[percentile] > previous[percentile] * (1 + tolerance):
+                regressions.append(f"{name}: {percentile} {current[percentile]}, was {previous[percentile]}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors, was {previous['errors']}")
+        if current.get("rejected", 0) > previous.get("rejected", 0):
+            regressions.append(f"{name}: {current['rejected']} rejected, was {previous.get('rejected', 0)}")
+    return regressions
+
+async def drive(scenario: Scenario, client: httpx.AsyncClient, state: Dict[str, Any], total: int, concurrency: int):
+    """Send `total` requests from `concurrency` workers, returning the summary"""
+    latencies: List[float] = []
+    errors = rejected = 0
+    indexes = itertools.count()
+
+    async def worker():
+        nonlocal errors, rejected
+        for index in indexes:
+            if index >= total:
+                return
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, index, state)
+                if response.status_code == 429:
+                    rejected += 1
+                    continue
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, rejected)
+
+async def prepare(client: httpx.AsyncClient, args) -> Dict[str, Any]:
+    """Open a well-funded account to trade on, and the orders the close scenario will close"""
+    response = await client.post("/accounts", json={"cash_balance": 1e12, "btc_balance": 1e6})
+    response.raise_for_status()
+    prefix = f"/accounts/{response.json()['id']}"
+
+    open_order_ids: List[int] = []
+    closes = args.requests + args.warmup
+    while len(open_order_ids) < closes:
+        batch = min(1000, closes - len(open_order_ids))
+        response = await client.post(f"{prefix}/trades/batch", json={
+            "trades": [{"type": "buy" if i % 2 == 0 else "sell", "amount": TRADE_AMOUNT} for i in range(batch)]
+        })
+        response.raise_for_status()
+        open_order_ids += [result["order_id"] for result in response.json()["results"] if result["order_id"]]
+    return {"prefix": prefix, "open_order_ids": open_order_ids}
+
+async def run_scenarios(client: httpx.AsyncClient, args) -> Dict[str, Any]:
+    state = await prepare(client, args)
+    endpoints = {}
+    for name in args.endpoints:
+        scenario = SCENARIOS[name]
+        if name == "POST /close":
+            # Each close needs its own open order; the warmup uses the tail of the list
+            warmup_state = {**state, "open_order_ids": state["open_order_ids"][args.requests:]}
+            await drive(scenario, client, warmup_state, args.warmup, args.concurrency)
+        else:
+            await drive(scenario, client, state, args.warmup, args.concurrency)
+        endpoints[name] = await drive(scenario, client, state, args.requests, args.concurrency)
+        summary = endpoints[name]
+        print(f"{name}: {summary['rps']} req/s, p99 {summary['p99_ms']} ms, {summary['rejected']} rejected", file=sys.stderr)
+    return endpoints
+
+async def run_in_process(args) -> Dict[str, Any]:
+    """Boot the app in this process with local stand-ins and load it through an ASGI client"""
+    workdir = tempfile.mkdtemp(prefix="trading-benchmark-")
+    # On-disk state goes to a scratch directory; set before the app's config is imported
+    os.environ.setdefault("CANDLE_DIR", os.path.join(workdir, "candles"))
+    os.environ.setdefault("LEDGER_JOURNAL_PATH", os.path.join(workdir, "ledger.journal"))
+    # Every request comes from one client, which the rate limiter would throttle
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    # The in-flight write cap is sized to a production pool and would shed most writes
+    # at benchmark concurrency; raise it unless a cap was asked for
+    if args.max_in_flight_writes is not None:
+        os.environ["MAX_IN_FLIGHT_WRITES"] = str(args.max_in_flight_writes)
+    else:
+        os.environ.setdefault("MAX_IN_FLIGHT_WRITES", "1000")
+    # The fake upstream only speaks the Coindesk format
+    os.environ.setdefault("PRICE_PROVIDERS", "coindesk")
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from benchmarks.standins import FakeCoindesk, FakeMongoClient, sqlite_engine, fake_redis
+    from resources import resources
+    from main import app
+
+    if args.database_url:
+        engine = create_async_engine(args.database_url)
+    else:
+        engine = sqlite_engine(os.path.join(workdir, "trading.db"))
+    if args.redis_url:
+        import redis.asyncio as redis
+        redis_client = redis.from_url(args.redis_url)
+    else:
+        redis_client = fake_redis()
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo_client = AsyncIOMotorClient(args.mongo_url)
+    else:
+        mongo_client = FakeMongoClient()
+    # A replica needs a real primary to replicate from, so it is only used with --database-url
+    replica_engine = create_async_engine(args.replica_url) if args.replica_url else None
+    coindesk = FakeCoindesk(latency=args.upstream_latency / 1000.0)
+    resources.use(
+        engine=engine, replica_engine=replica_engine, redis_client=redis_client,
+        mongo_client=mongo_client, http_client=coindesk.client()
+    )
+
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+            return await run_scenarios(client, args)
+    finally:
+        await app.router.shutdown()
+
+async def run_remote(args) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=args.url, timeout=30.0) as client:
+        return await run_scenarios(client, args)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the trading API endpoints")
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per endpoint first")
+    parser.add_argument("--endpoints", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--url", help="benchmark a running server instead of booting the app in-process")
+    parser.add_argument("--database-url", help="async SQLAlchemy URL to use instead of a SQLite file")
+    parser.add_argument("--replica-url", help="async SQLAlchemy URL of a read replica of --database-url")
+    parser.add_argument("--redis-url", help="Redis to use instead of fakeredis")
+    parser.add_argument("--mongo-url", help="MongoDB to use instead of a stub")
+    parser.add_argument("--max-in-flight-writes", type=int,
+                        help="in-process write cap (MAX_IN_FLIGHT_WRITES); 1000 unless set in the environment")
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="fake Coindesk delay in ms")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown vs the baseline")
+    args = parser.parse_args(argv)
+
+    endpoints = asyncio.run(run_remote(args) if args.url else run_in_process(args))
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "target": args.url or "in-process",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "upstream_latency_ms": args.upstream_latency,
+        },
+        "endpoints": endpoints,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(report, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
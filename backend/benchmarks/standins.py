@@ -0,0 +1,82 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+class FakeCoindesk:
+    """
+    Answers the Coindesk latest-tick request with a random walk around a start price,
+    after an optional delay that stands in for upstream latency
+    """
+    def __init__(self, price: float = 50000.0, latency: float = 0.0, seed: int = 0):
+        self.price = price
+        self.latency = latency
+        self.requests = 0
+        self._random = random.Random(seed)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.price *= 1 + self._random.gauss(0, 0.0005)
+        return httpx.Response(200, json={
+            "Data": {"BTC-USD": {"VALUE": self.price, "VALUE_LAST_UPDATE_TS": time.time()}}
+        })
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+class FakeCollection:
+    """Accepts trade log inserts and keeps only a count"""
+    def __init__(self):
+        self.inserted = 0
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True):
+        self.inserted += len(documents)
+
+class FakeMongoClient:
+    """Hands out FakeCollections for any database and collection name"""
+    def __init__(self):
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, database: str) -> "FakeMongoDatabase":
+        return FakeMongoDatabase(self._collections, database)
+
+    def close(self):
+        pass
+
+class FakeMongoDatabase:
+    def __init__(self, collections: Dict[str, FakeCollection], name: str):
+        self._collections = collections
+        self._name = name
+
+    def __getitem__(self, collection: str) -> FakeCollection:
+        return self._collections.setdefault(f"{self._name}.{collection}", FakeCollection())
+
+def sqlite_engine(path: str) -> AsyncEngine:
+    """
+    A file-backed SQLite engine in WAL mode, standing in for Postgres. SQLite has no
+    RETURNING in this SQLAlchemy version and serializes writers, so the repositories
+    take their fallback paths and write-heavy numbers understate Postgres.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 30})
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def enable_wal(connection, record):
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+def fake_redis():
+    """An in-process Redis with Lua scripting, from the optional fakeredis package"""
+    try:
+        from fakeredis import aioredis
+    except ImportError:
+        raise SystemExit("The fake Redis needs `pip install fakeredis[lua]`, or pass --redis-url")
+    return aioredis.FakeRedis()
@@ -1,6 +1,4 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 
 # Database configuration
 
@@ -10,13 +8,20 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "trading")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "postgres")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Optional read replica for read-only queries; unset sends everything to the primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "2.0"))  # seconds behind before reads fall back to the primary
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "1.0"))  # seconds between lag queries
 
 # Redis configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
 
 
 # MongoDB configuration
@@ -24,3 +29,77 @@ MONGO_HOST = os.getenv("MONGO_HOST", "mongo")
 MONGO_PORT = os.getenv("MONGO_PORT", "27017")
 MONGODB_URL = f"mongodb://{MONGO_HOST}:{MONGO_PORT}"
 MONGODB_DB = os.getenv("MONGODB_DB", "crypto_trading")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "10"))
+
+# Price feed configuration
+PRICE_POLL_INTERVAL = float(os.getenv("PRICE_POLL_INTERVAL", "1.0"))  # seconds between upstream polls
+PRICE_MAX_STALENESS = float(os.getenv("PRICE_MAX_STALENESS", "3.0"))  # oldest tick trades may use
+PRICE_FETCH_TIMEOUT = float(os.getenv("PRICE_FETCH_TIMEOUT", "10.0"))  # seconds, across every provider tried
+
+# Price providers, hedging and circuit breakers
+PRICE_PROVIDERS = os.getenv("PRICE_PROVIDERS", "coindesk,coinbase,kraken")  # in order of preference
+PRICE_AGGREGATION = os.getenv("PRICE_AGGREGATION", "first")  # "first" good answer, or "median" across providers
+PRICE_HEDGE_DELAY = float(os.getenv("PRICE_HEDGE_DELAY", "0.25"))  # seconds, until a provider has latency history
+PRICE_HEDGE_MIN_DELAY = float(os.getenv("PRICE_HEDGE_MIN_DELAY", "0.05"))  # bounds on the p95-based hedge delay
+PRICE_HEDGE_MAX_DELAY = float(os.getenv("PRICE_HEDGE_MAX_DELAY", "1.0"))
+PRICE_PROVIDER_TIMEOUT = float(os.getenv("PRICE_PROVIDER_TIMEOUT", "2.0"))  # seconds one provider request may take
+PRICE_BREAKER_FAILURES = int(os.getenv("PRICE_BREAKER_FAILURES", "3"))  # consecutive failures that open a breaker
+PRICE_BREAKER_RESET = float(os.getenv("PRICE_BREAKER_RESET", "30.0"))  # seconds before an open breaker is retried
+
+# Outbound HTTP client pool
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60.0"))
+
+# Trade log writer
+TRADE_LOG_QUEUE_SIZE = int(os.getenv("TRADE_LOG_QUEUE_SIZE", "10000"))
+TRADE_LOG_BATCH_SIZE = int(os.getenv("TRADE_LOG_BATCH_SIZE", "500"))
+TRADE_LOG_FLUSH_INTERVAL = float(os.getenv("TRADE_LOG_FLUSH_INTERVAL", "0.5"))  # seconds
+
+# Response compression
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "4096"))  # bytes; smaller bodies aren't worth compressing
+
+# Admission control: per-client token buckets in Redis and a per-process cap on concurrent writes
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_READ_RATE = float(os.getenv("RATE_LIMIT_READ_RATE", "50.0"))  # GET requests per second per client
+RATE_LIMIT_READ_BURST = float(os.getenv("RATE_LIMIT_READ_BURST", "100"))
+RATE_LIMIT_WRITE_RATE = float(os.getenv("RATE_LIMIT_WRITE_RATE", "10.0"))  # other requests per second per client
+RATE_LIMIT_WRITE_BURST = float(os.getenv("RATE_LIMIT_WRITE_BURST", "20"))
+MAX_IN_FLIGHT_WRITES = int(os.getenv("MAX_IN_FLIGHT_WRITES", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))  # per process
+
+# Idempotency keys on mutating order endpoints
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))  # seconds a stored response is replayed for
+IDEMPOTENCY_LOCK_TTL = float(os.getenv("IDEMPOTENCY_LOCK_TTL", "30.0"))  # seconds a running request holds its key
+
+# Order history pagination
+ORDER_PAGE_SIZE = int(os.getenv("ORDER_PAGE_SIZE", "100"))
+ORDER_PAGE_MAX = int(os.getenv("ORDER_PAGE_MAX", "500"))  # also the size of the cached newest page
+ORDER_CACHE_TTL = int(os.getenv("ORDER_CACHE_TTL", "300"))  # seconds a cached page is trusted before a rebuild
+
+# Batch trading
+TRADE_BATCH_MAX = int(os.getenv("TRADE_BATCH_MAX", "1000"))  # most trades accepted per batch request
+BULK_CLOSE_MAX_IDS = int(os.getenv("BULK_CLOSE_MAX_IDS", "10000"))  # most order ids accepted per bulk close
+
+# In-memory account ledger (paper-trading load tests)
+LEDGER_MODE = os.getenv("LEDGER_MODE", "false").lower() == "true"
+LEDGER_JOURNAL_PATH = os.getenv("LEDGER_JOURNAL_PATH", "ledger.journal")
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", "0.2"))  # seconds between Postgres write-behinds
+LEDGER_FSYNC = os.getenv("LEDGER_FSYNC", "batch")  # "always" to fsync every entry, "batch" to fsync per flush
+
+# Account event journal and snapshots. Journaling writes and locks the accounts row
+# on every trade, which LEDGER_MODE exists to avoid, so it is off there unless asked for
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "false" if LEDGER_MODE else "true").lower() == "true"
+JOURNAL_SNAPSHOT_INTERVAL = int(os.getenv("JOURNAL_SNAPSHOT_INTERVAL", "200"))  # events per account between snapshots
+
+# Portfolio valuation
+PORTFOLIO_CACHE_ACCOUNTS = int(os.getenv("PORTFOLIO_CACHE_ACCOUNTS", "1000"))  # open books kept in memory per process
+
+# Limit and stop order matching
+MATCHING_FILL_CONCURRENCY = int(os.getenv("MATCHING_FILL_CONCURRENCY", "8"))  # accounts filled in parallel per tick
+
+# OHLCV candles, kept in memory-mapped ring buffers
+CANDLE_DIR = os.getenv("CANDLE_DIR", "candles")
+CANDLE_CAPACITY_1S = int(os.getenv("CANDLE_CAPACITY_1S", "86400"))  # one day of second candles
+CANDLE_CAPACITY_1M = int(os.getenv("CANDLE_CAPACITY_1M", "43200"))  # thirty days of minute candles
+CANDLE_CAPACITY_1H = int(os.getenv("CANDLE_CAPACITY_1H", "8760"))  # a year of hourly candles
+CANDLE_HISTORY_POINTS = int(os.getenv("CANDLE_HISTORY_POINTS", "1000"))  # candles returned when no range is given
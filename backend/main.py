@@ -1,38 +1,102 @@
+from typing import List
 from fastapi import FastAPI, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
-from config import engine, async_session
-from models.db_models import Base
+from config import MONGODB_DB, LEDGER_MODE, GZIP_MIN_SIZE, JOURNAL_ENABLED
+from resources import resources
+from metrics import MetricsMiddleware
+from admission import AdmissionMiddleware
+from models.migrations import ensure_schema
 from repositories.account_repo import AccountRepository
-from api.endpoints import account, orders, price
+from repositories.orders_repo import OrderRepository
+from repositories.journal_repo import JournalRepository
+from services.account_service import AccountService
+from services.cache_service import CacheService
+from services.order_service import OrderService
+from services.journal_service import JournalService
+from services.price_service import price_feed
+from services.trade_log_service import trade_log_service
+from services.ledger_service import ledger_service
+from services.matching_engine import RestingOrder, matching_engine
+from services.candle_service import candle_store
+from api.endpoints import account, orders, portfolio, price, system
 
 app = FastAPI(title="Crypto Trading API")
 
+# Shed excess load inside CORS, so browsers can read the 429s
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "Retry-After"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+app.add_middleware(MetricsMiddleware)
 
-# Register API endpoints
-app.include_router(account.router)
-app.include_router(orders.router)
+# Register API endpoints. The account-scoped routes are served for the default
+# account at the top level and for any account under /accounts/{account_id}
+app.include_router(account.accounts_router)
+for prefix in ("", "/accounts/{account_id:int}"):
+    app.include_router(account.router, prefix=prefix)
+    app.include_router(orders.router, prefix=prefix)
+    app.include_router(portfolio.router, prefix=prefix)
 app.include_router(price.router)
+app.include_router(system.router)
+
+async def fill_resting_orders(account_id: int, orders: List[RestingOrder], price: float):
+    """Fill the triggered limit and stop orders of one account through the regular trade path"""
+    async with resources.session_factory() as session:
+        account_service = AccountService(
+            AccountRepository(session, account_id), ledger_service if LEDGER_MODE else None
+        )
+        journal = JournalService(JournalRepository(session, account_id)) if JOURNAL_ENABLED else None
+        order_service = OrderService(
+            OrderRepository(session, account_id), account_service, CacheService(resources.redis), journal=journal
+        )
+        await order_service.fill_orders(orders, price)
 
 @app.on_event("startup")
 async def startup():
-    # Create PostgreSQL tables if they don't exist
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    # Initialize account if it doesn't exist
-    async with async_session() as session:
-        account_repo = AccountRepository(session)
-        account = await account_repo.get_account()
-        if not account:
-            await account_repo.create_account()
+    # Build the shared clients and connection pools once per process
+    resources.startup()
+
+    # Migrate the schema, including the default account, unless its fingerprint shows it is current
+    await ensure_schema(resources.engine)
+
+    # Serve balances from memory, replaying any journaled changes Postgres hasn't seen
+    if LEDGER_MODE:
+        await ledger_service.start(resources.session_factory)
+
+    # Start the batched trade log writer
+    trade_log_service.start(connect=lambda: resources.mongo_client[MONGODB_DB]["trade_logs"])
+
+    # Rest the pending limit and stop orders in the matching engine, which fills them as ticks arrive
+    async with resources.session_factory() as session:
+        pending = await OrderRepository(session).get_all_pending_orders()
+    await matching_engine.start(
+        price_feed,
+        fill_resting_orders,
+        [RestingOrder(o.id, o.account_id, o.type, o.kind, o.amount, o.trigger_price) for o in pending]
+    )
+
+    # Record every tick into the on-disk OHLCV candle rings
+    candle_store.start(price_feed)
+
+    # Start polling the live price in the background
+    price_feed.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await price_feed.stop()
+    await matching_engine.stop()
+    candle_store.stop()
+    await trade_log_service.stop()
+    await ledger_service.stop()
+    await resources.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,106 @@
+import time
+from typing import Any, Dict, Tuple
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from resources import resources
+
+# The app's own registry, so importing this module twice (e.g. in tests) can't clash
+# with the default one, and /metrics exposes exactly what the app records
+registry = CollectorRegistry()
+
+# Latency buckets in seconds, from a cache hit up to a slow upstream fetch
+_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram(
+    "trading_request_seconds", "HTTP request latency by handler",
+    ["method", "handler", "status"], buckets=_BUCKETS, registry=registry
+)
+STAGE_SECONDS = Histogram(
+    "trading_stage_seconds", "Latency of one stage of handling a request or a background job",
+    ["stage"], buckets=_BUCKETS, registry=registry
+)
+CACHE_LOOKUPS = Counter(
+    "trading_cache_lookups_total", "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"], registry=registry
+)
+QUEUE_DEPTH = Gauge(
+    "trading_queue_depth", "Items waiting in a background queue",
+    ["queue"], registry=registry
+)
+IN_FLIGHT_WRITES = Gauge(
+    "trading_in_flight_writes", "Write requests being handled by this process", registry=registry
+)
+REJECTED_REQUESTS = Counter(
+    "trading_rejected_requests_total", "Requests shed with a 429, by reason (rate_limited or overloaded)",
+    ["reason"], registry=registry
+)
+REPLICA_LAG = Gauge(
+    "trading_replica_lag_seconds", "Last measured lag of the read replica behind the primary", registry=registry
+)
+ROUTED_READS = Counter(
+    "trading_routed_reads_total", "Read-only requests by the database that served them (replica or primary)",
+    ["target"], registry=registry
+)
+PRICE_PROVIDER_OPEN = Gauge(
+    "trading_price_provider_open", "1 while a price provider's circuit breaker is open",
+    ["provider"], registry=registry
+)
+
+# Labelled children, looked up once: labels() takes a lock on every call
+_stages: Dict[str, Any] = {}
+_lookups: Dict[Tuple[str, bool], Any] = {}
+
+def stage(name: str):
+    """Time the enclosed block as one stage: `with stage("db_commit"): ...`"""
+    child = _stages.get(name)
+    if child is None:
+        child = _stages[name] = STAGE_SECONDS.labels(name)
+    return child.time()
+
+def cache_lookup(cache: str, hit: bool):
+    child = _lookups.get((cache, hit))
+    if child is None:
+        child = _lookups[(cache, hit)] = CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss")
+    child.inc()
+
+class PoolCollector:
+    """Reads the shared connection pools' usage when /metrics is scraped, so recording costs nothing"""
+    def collect(self):
+        family = GaugeMetricFamily(
+            "trading_pool_connections", "Connections of each shared pool by state", labels=["pool", "state"]
+        )
+        for pool, stats in resources.pool_stats().items():
+            for state, value in stats.items():
+                family.add_metric([pool, state], value)
+        yield family
+
+registry.register(PoolCollector())
+
+class MetricsMiddleware:
+    """
+    Records the latency of every HTTP request, labelled by the handler that served it
+    rather than the path, so account ids don't multiply the series
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router leaves the matched endpoint in the scope
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], handler, str(status)).observe(time.perf_counter() - started)
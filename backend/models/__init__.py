@@ -1,5 +1,9 @@
-from .db_models import Base, Account, TradeOrder
+from .db_models import Base, Account, TradeOrder, AccountEvent, AccountSnapshot
 from .schemas import (
-    TradeRequest, CloseRequest, TradeOrderResponse, 
-    AccountResponse, PriceResponse, TradeResponse, CloseResponse
+    TradeRequest, CloseRequest, CancelRequest, TradeOrderResponse, 
+    AccountResponse, PriceResponse, PriceHistoryResponse, TradeResponse, CloseResponse,
+    BatchTradeRequest, BatchTradeResult, BatchTradeResponse,
+    OpenOrderFilter, BulkCloseRequest, BulkCloseResponse,
+    AccountCreateRequest, AccountCreateResponse, AccountEventResponse, AccountStateResponse,
+    PositionMark, PortfolioResponse, CancelResponse
 )
@@ -1,21 +1,60 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, ForeignKey, JSON, UniqueConstraint
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
+# The account the unprefixed routes trade on, and the owner of orders from before accounts were first-class
+DEFAULT_ACCOUNT_ID = 1
+
 class TradeOrder(Base):
     __tablename__ = "trade_orders"
     id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False, default=DEFAULT_ACCOUNT_ID)
     type = Column(String, nullable=False)  # "buy" or "sell"
+    kind = Column(String, nullable=False, default="market")  # "market", "limit" or "stop"
     amount = Column(Float, nullable=False)
-    price = Column(Float, nullable=False)
+    price = Column(Float, nullable=False)  # fill price, or the trigger price while pending
+    trigger_price = Column(Float, nullable=True)  # limit or stop price
+    # "pending" until a limit or stop order triggers, then "open"; or "cancelled" / "rejected"
     status = Column(String, nullable=False, default="open")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     closed_at = Column(DateTime, nullable=True)
 
+    # Every query is scoped to one account; keyset pagination then walks (created_at, id)
+    # newest first, optionally within a status or type
+    __table_args__ = (
+        Index("ix_trade_orders_account_created_at_id", "account_id", "created_at", "id"),
+        Index("ix_trade_orders_account_status_created_at_id", "account_id", "status", "created_at", "id"),
+        Index("ix_trade_orders_account_type_created_at_id", "account_id", "type", "created_at", "id"),
+    )
+
 class Account(Base):
     __tablename__ = "accounts"
     id = Column(Integer, primary_key=True, index=True)
     cash_balance = Column(Float, default=10000.0) # Start with $10k
     btc_balance = Column(Float, default=0.5) # and half a BTC
+    ledger_seq = Column(Integer, nullable=False, default=0) # last ledger journal entry applied
+    # Server default too, so rows inserted in SQL by earlier migrations get it
+    event_seq = Column(Integer, nullable=False, default=0, server_default="0") # last account event journaled
+
+class AccountEvent(Base):
+    """One entry of an account's append-only journal of trade and balance events"""
+    __tablename__ = "account_events"
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 1, 2, ... per account, in the order the events committed
+    type = Column(String, nullable=False)  # e.g. "balance_changed", "order_opened", "order_closed"
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    # Also the index replays read the tail of one account through
+    __table_args__ = (UniqueConstraint("account_id", "seq", name="uq_account_events_account_seq"),)
+
+class AccountSnapshot(Base):
+    """The compacted state of an account (balances and open orders) as of one event"""
+    __tablename__ = "account_snapshots"
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    seq = Column(Integer, nullable=False)  # last event folded into the state
+    state = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
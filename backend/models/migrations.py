@@ -0,0 +1,169 @@
+import datetime
+import hashlib
+import logging
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Dialect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from models.db_models import Base, TradeOrder, AccountSnapshot, DEFAULT_ACCOUNT_ID
+
+logger = logging.getLogger(__name__)
+
+# Kept out of Base.metadata so the bookkeeping table isn't part of the fingerprint
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("fingerprint", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary key of the Postgres advisory lock that serializes migrating workers
+_MIGRATION_LOCK = 7_201_314
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+def _columns(connection: Connection, table: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+def _add_column(connection: Connection, table: str, name: str, ddl: str):
+    if name not in _columns(connection, table):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+# Databases from before migrations were created by create_all, which never altered an
+# existing table, so they may stop at any earlier schema. Each step therefore checks
+# what is there before changing it.
+
+def _create_tables(connection: Connection):
+    Base.metadata.create_all(connection)
+
+def _add_ledger_seq(connection: Connection):
+    _add_column(connection, "accounts", "ledger_seq", "INTEGER NOT NULL DEFAULT 0")
+
+def _scope_orders_to_accounts(connection: Connection):
+    # SQLite can't add a column with both a foreign key and a non-null default
+    reference = "" if connection.dialect.name == "sqlite" else " REFERENCES accounts (id)"
+    _add_column(connection, "trade_orders", "account_id", f"INTEGER NOT NULL DEFAULT {DEFAULT_ACCOUNT_ID}{reference}")
+    for name in ("ix_trade_orders_created_at_id", "ix_trade_orders_status_created_at_id",
+                 "ix_trade_orders_type_created_at_id"):
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    existing = {index["name"] for index in inspect(connection).get_indexes("trade_orders")}
+    for index in TradeOrder.__table__.indexes:
+        if index.name not in existing:
+            index.create(connection)
+
+def _add_order_kinds(connection: Connection):
+    _add_column(connection, "trade_orders", "kind", "VARCHAR NOT NULL DEFAULT 'market'")
+    _add_column(connection, "trade_orders", "trigger_price", "FLOAT")
+
+def _create_default_account(connection: Connection):
+    exists = connection.execute(text("SELECT 1 FROM accounts WHERE id = :id"), {"id": DEFAULT_ACCOUNT_ID}).first()
+    if not exists:
+        # Without an explicit id, so a Postgres sequence stays in step
+        connection.execute(text(
+            "INSERT INTO accounts (cash_balance, btc_balance, ledger_seq) VALUES (10000.0, 0.5, 0)"
+        ))
+
+def _add_event_journal(connection: Connection):
+    _add_column(connection, "accounts", "event_seq", "INTEGER NOT NULL DEFAULT 0")
+    Base.metadata.create_all(connection, tables=[table for table in Base.metadata.sorted_tables
+                                                  if table.name in ("account_events", "account_snapshots")])
+    # Accounts that traded before the journal start from a snapshot of their current state
+    orders = TradeOrder.__table__
+    live = connection.execute(
+        select(orders).where(orders.c.status.in_(("open", "pending"))).order_by(orders.c.id)
+    ).all()
+    by_account = {}
+    for order in live:
+        by_account.setdefault(order.account_id, []).append({
+            "id": order.id,
+            "type": order.type,
+            "kind": order.kind,
+            "amount": order.amount,
+            "price": order.price,
+            "trigger_price": order.trigger_price,
+            "status": order.status,
+            "created_at": order.created_at.isoformat(),
+            "closed_at": None,
+        })
+    snapshotted = {row.account_id for row in connection.execute(select(AccountSnapshot.account_id))}
+    now = datetime.datetime.utcnow()
+    for account in connection.execute(text("SELECT id, cash_balance, btc_balance FROM accounts")).all():
+        if account.id in snapshotted:
+            continue
+        connection.execute(AccountSnapshot.__table__.insert().values(
+            account_id=account.id, seq=0, created_at=now, state={
+                "cash_balance": account.cash_balance,
+                "btc_balance": account.btc_balance,
+                "orders": by_account.get(account.id, []),
+            }
+        ))
+
+# Append only: a deployed database has run every step up to its stored version
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create tables", _create_tables),
+    Migration(2, "Add the ledger sequence to accounts", _add_ledger_seq),
+    Migration(3, "Scope orders to accounts", _scope_orders_to_accounts),
+    Migration(4, "Add limit and stop order columns", _add_order_kinds),
+    Migration(5, "Create the default account", _create_default_account),
+    Migration(6, "Add the account event journal and snapshots", _add_event_journal),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def schema_fingerprint(dialect: Dialect) -> str:
+    """Hash of the DDL the models compile to, plus the migration count"""
+    digest = hashlib.sha256(str(LATEST_VERSION).encode())
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()
+
+def _read_version(connection: Connection) -> Optional[Tuple[int, str]]:
+    try:
+        row = connection.execute(select(schema_version.c.version, schema_version.c.fingerprint)).first()
+    except DBAPIError:
+        # No schema_version table yet
+        return None
+    return (row.version, row.fingerprint) if row else None
+
+def _migrate(connection: Connection, fingerprint: str) -> int:
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _MIGRATION_LOCK})
+    schema_version.create(connection, checkfirst=True)
+
+    # Read again under the lock: another worker may have just migrated
+    current = _read_version(connection)
+    version = current[0] if current else 0
+    for migration in MIGRATIONS[version:]:
+        logger.info("Applying schema migration %d: %s", migration.version, migration.description)
+        migration.apply(connection)
+    if version >= LATEST_VERSION and (current is None or current[1] != fingerprint):
+        logger.warning("Models changed without a migration; creating any missing tables only")
+        Base.metadata.create_all(connection)
+
+    connection.execute(schema_version.delete())
+    connection.execute(schema_version.insert().values(
+        id=1, version=LATEST_VERSION, fingerprint=fingerprint, applied_at=datetime.datetime.utcnow()
+    ))
+    return version
+
+async def ensure_schema(engine: AsyncEngine) -> bool:
+    """
+    Bring the database schema up to date. A schema already at the latest version with
+    a matching fingerprint costs one query and no DDL. Returns whether anything ran.
+    """
+    fingerprint = schema_fingerprint(engine.dialect)
+    async with engine.connect() as connection:
+        current = await connection.run_sync(_read_version)
+    if current == (LATEST_VERSION, fingerprint):
+        return False
+
+    async with engine.begin() as connection:
+        await connection.run_sync(_migrate, fingerprint)
+    return True
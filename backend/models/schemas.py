@@ -1,21 +1,58 @@
 import datetime
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Any, Dict, Optional, List
+from pydantic import BaseModel, conlist, root_validator, validator
+from config import TRADE_BATCH_MAX, BULK_CLOSE_MAX_IDS
 
 # Request schemas
 class TradeRequest(BaseModel):
     type: str  # "buy" or "sell"
     amount: float
+    kind: str = "market"  # "market", "limit" or "stop"
+    trigger_price: Optional[float] = None  # required for limit and stop orders
 
 class CloseRequest(BaseModel):
     order_id: int
 
+class CancelRequest(BaseModel):
+    order_id: int
+
+class BatchTradeRequest(BaseModel):
+    trades: conlist(TradeRequest, min_items=1, max_items=TRADE_BATCH_MAX)
+
+    @validator("trades")
+    def check_market_orders(cls, trades):
+        if any(trade.kind != "market" for trade in trades):
+            raise ValueError("Batches only accept market orders")
+        return trades
+
+class OpenOrderFilter(BaseModel):
+    type: Optional[str] = None  # "buy" or "sell"
+    created_from: Optional[datetime.datetime] = None
+    created_to: Optional[datetime.datetime] = None
+
+class BulkCloseRequest(BaseModel):
+    # Either explicit order ids, or a filter over open orders ({} matches all of them)
+    order_ids: Optional[conlist(int, min_items=1, max_items=BULK_CLOSE_MAX_IDS)] = None
+    filter: Optional[OpenOrderFilter] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_selection(cls, values):
+        if (values.get("order_ids") is None) == (values.get("filter") is None):
+            raise ValueError("Provide exactly one of order_ids or filter")
+        return values
+
+class AccountCreateRequest(BaseModel):
+    cash_balance: float = 10000.0
+    btc_balance: float = 0.5
+
 # Response schemas
 class TradeOrderResponse(BaseModel):
     id: int
     type: str
+    kind: str = "market"
     amount: float
     price: float
+    trigger_price: Optional[float] = None
     status: str
     created_at: datetime.datetime
     closed_at: Optional[datetime.datetime] = None
@@ -30,18 +67,87 @@ class AccountResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class AccountCreateResponse(AccountResponse):
+    id: int
+
+class AccountEventResponse(BaseModel):
+    seq: int
+    type: str
+    payload: Dict[str, Any]
+    created_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
+
+class AccountStateResponse(AccountResponse):
+    seq: int  # last journal event folded in
+    orders: List[TradeOrderResponse]  # open and pending orders
+
 class PriceResponse(BaseModel):
     price: float
 
+class PriceHistoryResponse(BaseModel):
+    interval: str
+    time: List[int]  # candle start, epoch seconds
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    volume: List[float]  # ticks observed in the candle
+
 class TradeResponse(BaseModel):
     order_id: int
-    price: float
+    price: float  # fill price, or the trigger price of a pending order
+    status: str = "open"
     timestamp: datetime.datetime
     account: AccountResponse
 
+class CancelResponse(BaseModel):
+    order_id: int
+    status: str
+    timestamp: datetime.datetime
+
 class CloseResponse(BaseModel):
     order_id: int
     status: str
     timestamp: datetime.datetime
     account: AccountResponse
     close_price: float
+
+class BatchTradeResult(BaseModel):
+    index: int
+    status: str  # "filled" or "rejected"
+    order_id: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchTradeResponse(BaseModel):
+    price: float
+    timestamp: datetime.datetime
+    results: List[BatchTradeResult]
+    account: AccountResponse
+
+class BulkCloseResponse(BaseModel):
+    closed_order_ids: List[int]
+    close_price: float
+    timestamp: datetime.datetime
+    account: AccountResponse
+
+class PositionMark(BaseModel):
+    order_id: int
+    type: str
+    amount: float
+    entry_price: float
+    mark_value: float
+    unrealized_pnl: float
+
+class PortfolioResponse(BaseModel):
+    price: float
+    timestamp: datetime.datetime
+    open_orders: int
+    net_exposure_btc: float
+    gross_exposure_btc: float
+    net_exposure_usd: float
+    unrealized_pnl: float
+    buy_vwap: Optional[float] = None
+    sell_vwap: Optional[float] = None
+    marks: Optional[List[PositionMark]] = None
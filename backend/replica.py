@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import text
+from config import DB_REPLICA_MAX_LAG, DB_REPLICA_LAG_CHECK_INTERVAL
+from metrics import REPLICA_LAG, ROUTED_READS
+from resources import resources
+
+logger = logging.getLogger(__name__)
+
+# The primary's WAL position, read before asking the replica how far it has replayed
+_PRIMARY_LSN_QUERY = text("SELECT pg_current_wal_lsn()::text")
+
+# Seconds the replica trails the primary: zero once it has replayed up to the primary's
+# position (or isn't in recovery at all), else the age of the last transaction it
+# replayed. WAL the primary has not shipped yet counts as lag, unlike comparing
+# against what the replica has received. NULL if it is behind but has replayed nothing.
+_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_replay_lsn() IS NULL "
+    "OR pg_last_wal_replay_lsn() >= CAST(:primary_lsn AS pg_lsn) THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8 END"
+)
+
+# Labelled children, looked up once
+_routed = {True: ROUTED_READS.labels("replica"), False: ROUTED_READS.labels("primary")}
+
+# Seconds between warnings while the replica is unreachable
+_UNAVAILABLE_LOG_INTERVAL = 60.0
+
+class ReplicaMonitor:
+    """
+    Decides whether a read may go to the replica. The replica's lag is measured at
+    most every `check_interval` seconds, and reads fall back to the primary while it
+    is over `max_lag` or can't be measured. Commits are recorded per account, so an
+    account that just wrote reads from the primary until the replica has caught up
+    past its write. Writes made by other processes are covered by `max_lag` alone.
+    """
+    def __init__(
+        self,
+        max_lag: float = DB_REPLICA_MAX_LAG,
+        check_interval: float = DB_REPLICA_LAG_CHECK_INTERVAL,
+        max_accounts: int = 100_000
+    ):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.max_accounts = max_accounts
+        self.lag: Optional[float] = None
+        # Wall-clock time up to which the replica is known to hold every commit
+        self.current_as_of = 0.0
+        self._checked_at = float("-inf")
+        self._check: Optional[asyncio.Future] = None
+        self._writes: "OrderedDict[int, float]" = OrderedDict()
+        self._unavailable_logged_at = float("-inf")
+        REPLICA_LAG.set_function(lambda: self.lag if self.lag is not None else float("nan"))
+
+    def record_write(self, account_id: int):
+        """Note that a transaction touching the account just committed on the primary"""
+        self._writes[account_id] = time.time()
+        self._writes.move_to_end(account_id)
+        if len(self._writes) > self.max_accounts:
+            # Forgetting the oldest write only matters if the replica is still behind it
+            self._writes.popitem(last=False)
+
+    async def use_replica(self, account_id: int) -> bool:
+        """Whether a read of the account may be served by the replica"""
+        if resources.replica_engine is None:
+            return False
+        await self._refresh()
+        fresh = (
+            self.lag is not None
+            and self.lag <= self.max_lag
+            and self._writes.get(account_id, 0.0) <= self.current_as_of
+        )
+        _routed[fresh].inc()
+        return fresh
+
+    async def _refresh(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        # Concurrent requests share one lag query
+        if self._check is None:
+            self._check = asyncio.ensure_future(self._measure())
+            self._check.add_done_callback(self._clear_check)
+        await asyncio.shield(self._check)
+
+    def _clear_check(self, future: asyncio.Future):
+        self._check = None
+
+    async def _measure(self):
+        started = time.time()
+        try:
+            engine = resources.replica_engine
+            if engine.dialect.name == "postgresql":
+                lag = await asyncio.wait_for(self._query_lag(engine), self.check_interval)
+            else:
+                # Only Postgres reports replication lag; e.g. a SQLite stand-in is always current
+                lag = 0.0
+        except Exception:
+            lag = None
+            if time.monotonic() - self._unavailable_logged_at > _UNAVAILABLE_LOG_INTERVAL:
+                self._unavailable_logged_at = time.monotonic()
+                logger.warning("Read replica unavailable, reading from the primary", exc_info=True)
+        self.lag = lag
+        if lag is not None:
+            self.current_as_of = started - lag
+        self._checked_at = time.monotonic()
+
+    async def _query_lag(self, engine) -> Optional[float]:
+        async with resources.engine.connect() as connection:
+            primary_lsn = await connection.scalar(_PRIMARY_LSN_QUERY)
+        async with engine.connect() as connection:
+            lag = await connection.scalar(_LAG_QUERY, {"primary_lsn": primary_lsn})
+        return None if lag is None else float(lag)
+
+# App-scoped monitor, fed by the repositories' commits
+replica_monitor = ReplicaMonitor()
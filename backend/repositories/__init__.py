@@ -1,2 +1,3 @@
 from .account_repo import AccountRepository
 from .orders_repo import OrderRepository
+from .journal_repo import JournalRepository
@@ -1,33 +1,108 @@
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.engine import Row
 from models.db_models import Account
+from repositories.base import BaseRepository
 
-class AccountRepository:
-    def __init__(self, session: AsyncSession):
-        self.session = session
+accounts = Account.__table__
 
+class AccountRepository(BaseRepository):
     async def get_account(self) -> Account:
         """Get the account or None if it doesn't exist"""
-        result = await self.session.execute(select(Account))
+        # Balances are changed with direct UPDATEs, so never trust a stale identity-map copy
+        result = await self.read_session.execute(
+            select(Account)
+            .where(Account.id == self.account_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+
+    async def get_account_for_update(self) -> Account:
+        """Get the account and lock its row until the transaction ends"""
+        # Only this account's row is locked, so other accounts never wait on it
+        result = await self.session.execute(
+            select(Account)
+            .where(Account.id == self.account_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
         return result.scalars().first()
 
     async def create_account(self, cash_balance: float = 10000.0, btc_balance: float = 0.5) -> Account:
-        """Create a new account with initial balances"""
+        """Create a new account with initial balances, under the next free id"""
         account = Account(cash_balance=cash_balance, btc_balance=btc_balance)
         self.session.add(account)
-        await self.session.commit()
+        await self.session.flush()
+        await self.commit()
         await self.session.refresh(account)
         return account
 
-    async def update_account_balances(self, cash_delta: float, btc_delta: float) -> Account:
-        """Update account balances by the given deltas"""
-        account = await self.get_account()
-        if not account:
-            raise ValueError("Account not initialized")
-        
-        account.cash_balance += cash_delta
-        account.btc_balance += btc_delta
-        
-        await self.session.commit()
-        await self.session.refresh(account)
-        return account
+    async def apply_balance_delta(self, cash_delta: float, btc_delta: float) -> Optional[Row]:
+        """
+        Atomically apply balance deltas in a single guarded UPDATE, so neither balance
+        can go negative under concurrent trades. Returns the new (id, cash_balance,
+        btc_balance), or None if the account is missing or the funds are insufficient.
+        """
+        query = (
+            update(accounts)
+            .where(accounts.c.id == self.account_id)
+            .values(
+                cash_balance=accounts.c.cash_balance + cash_delta,
+                btc_balance=accounts.c.btc_balance + btc_delta
+            )
+        )
+        if cash_delta < 0:
+            query = query.where(accounts.c.cash_balance >= -cash_delta)
+        if btc_delta < 0:
+            query = query.where(accounts.c.btc_balance >= -btc_delta)
+
+        if self.supports_returning:
+            result = await self.session.execute(
+                query.returning(accounts.c.id, accounts.c.cash_balance, accounts.c.btc_balance)
+            )
+            balances = result.first()
+        else:
+            result = await self.session.execute(query)
+            balances = None
+            if result.rowcount:
+                result = await self.session.execute(
+                    select(accounts.c.id, accounts.c.cash_balance, accounts.c.btc_balance)
+                    .where(accounts.c.id == self.account_id)
+                )
+                balances = result.first()
+
+        await self.commit()
+        return balances
+
+    async def get_ledger_state(self, account_ids: Optional[List[int]] = None) -> List[Row]:
+        """Get (id, cash_balance, btc_balance, ledger_seq) for the given accounts, or every account"""
+        query = select(accounts.c.id, accounts.c.cash_balance, accounts.c.btc_balance, accounts.c.ledger_seq)
+        if account_ids is not None:
+            query = query.where(accounts.c.id.in_(account_ids))
+        result = await self.session.execute(query)
+        return result.all()
+
+    async def save_ledger_balances(self, entries: List[Dict[str, Any]]):
+        """
+        Write ledger balances back in one batched statement. Entries older than what an
+        account already holds are skipped, so replaying the journal is idempotent.
+        """
+        await self.session.execute(
+            update(accounts)
+            .where(accounts.c.id == bindparam("account_id"), accounts.c.ledger_seq < bindparam("seq"))
+            .values(
+                cash_balance=bindparam("cash_balance"),
+                btc_balance=bindparam("btc_balance"),
+                ledger_seq=bindparam("seq")
+            ),
+            [
+                {
+                    "account_id": entry["account_id"],
+                    "seq": entry["seq"],
+                    "cash_balance": entry["cash_balance"],
+                    "btc_balance": entry["btc_balance"],
+                }
+                for entry in entries
+            ]
+        )
+        await self.commit()
@@ -0,0 +1,81 @@
+from typing import Awaitable, Callable, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.db_models import DEFAULT_ACCOUNT_ID
+from metrics import stage
+from replica import replica_monitor
+
+_UNIT_OF_WORK = "unit_of_work"
+_ROLLBACK_HOOKS = "unit_of_work_rollback_hooks"
+_WRITTEN_ACCOUNTS = "unit_of_work_written_accounts"
+
+class UnitOfWork:
+    """
+    Groups the writes of every repository sharing a session into one transaction
+    with a single commit, rolled back if anything inside the block raises.
+    Nested units of work join the outermost one.
+    """
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self._outermost = False
+
+    async def __aenter__(self) -> "UnitOfWork":
+        if not self.session.info.get(_UNIT_OF_WORK):
+            self.session.info[_UNIT_OF_WORK] = True
+            self.session.info[_ROLLBACK_HOOKS] = []
+            self.session.info[_WRITTEN_ACCOUNTS] = set()
+            self._outermost = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if not self._outermost:
+            return
+        self.session.info.pop(_UNIT_OF_WORK, None)
+        rollback_hooks = self.session.info.pop(_ROLLBACK_HOOKS, [])
+        written_accounts = self.session.info.pop(_WRITTEN_ACCOUNTS, set())
+        if exc_type is None:
+            with stage("db_commit"):
+                await self.session.commit()
+            for account_id in written_accounts:
+                replica_monitor.record_write(account_id)
+        else:
+            await self.session.rollback()
+            # Undo side effects that live outside the database, newest first
+            for hook in reversed(rollback_hooks):
+                await hook()
+
+class BaseRepository:
+    def __init__(
+        self,
+        session: AsyncSession,
+        account_id: int = DEFAULT_ACCOUNT_ID,
+        read_session: Optional[AsyncSession] = None
+    ):
+        self.session = session
+        # Repositories only see and change the rows of one account
+        self.account_id = account_id
+        # Read-only queries may be served by a replica session; writes, and reads that
+        # must see them, always use `session` on the primary
+        self.read_session = read_session or session
+
+    @property
+    def supports_returning(self) -> bool:
+        """Whether the database can hand back changed rows with UPDATE ... RETURNING"""
+        return self.session.bind.dialect.full_returning
+
+    def unit_of_work(self) -> UnitOfWork:
+        """Start a transaction spanning every repository on this session"""
+        return UnitOfWork(self.session)
+
+    async def commit(self):
+        """Commit, unless the write is part of a unit of work that commits at the end"""
+        if self.session.info.get(_UNIT_OF_WORK):
+            self.session.info[_WRITTEN_ACCOUNTS].add(self.account_id)
+        else:
+            with stage("db_commit"):
+                await self.session.commit()
+            replica_monitor.record_write(self.account_id)
+
+    def on_rollback(self, hook: Callable[[], Awaitable[None]]):
+        """Register a compensating action to run if the current unit of work rolls back"""
+        if self.session.info.get(_UNIT_OF_WORK):
+            self.session.info[_ROLLBACK_HOOKS].append(hook)
@@ -0,0 +1,79 @@
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.engine import Row
+from models.db_models import Account, AccountEvent, AccountSnapshot
+from repositories.base import BaseRepository
+
+accounts = Account.__table__
+account_events = AccountEvent.__table__
+account_snapshots = AccountSnapshot.__table__
+
+class JournalRepository(BaseRepository):
+    async def append(self, events: List[Tuple[str, Dict[str, Any]]]) -> Optional[int]:
+        """
+        Append (type, payload) events to the account's journal under the next sequence
+        numbers, returning the last one, or None if the account doesn't exist.
+        Allocating the numbers locks the account row until the transaction ends.
+        """
+        query = (
+            update(accounts)
+            .where(accounts.c.id == self.account_id)
+            .values(event_seq=accounts.c.event_seq + len(events))
+        )
+        if self.supports_returning:
+            result = await self.session.execute(query.returning(accounts.c.event_seq))
+            last_seq = result.scalar()
+        else:
+            result = await self.session.execute(query)
+            last_seq = None
+            if result.rowcount:
+                result = await self.session.execute(
+                    select(accounts.c.event_seq).where(accounts.c.id == self.account_id)
+                )
+                last_seq = result.scalar()
+        if last_seq is None:
+            return None
+
+        created_at = datetime.datetime.utcnow()
+        first_seq = last_seq - len(events) + 1
+        await self.session.execute(insert(account_events), [
+            {
+                "account_id": self.account_id,
+                "seq": first_seq + offset,
+                "type": type,
+                "payload": payload,
+                "created_at": created_at
+            }
+            for offset, (type, payload) in enumerate(events)
+        ])
+        await self.commit()
+        return last_seq
+
+    async def get_events(self, after_seq: int = 0, limit: Optional[int] = None) -> List[Row]:
+        """Get (seq, type, payload, created_at) of the account's events after `after_seq`, oldest first"""
+        query = (
+            select(account_events.c.seq, account_events.c.type, account_events.c.payload, account_events.c.created_at)
+            .where(account_events.c.account_id == self.account_id, account_events.c.seq > after_seq)
+            .order_by(account_events.c.seq)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        result = await self.read_session.execute(query)
+        return result.all()
+
+    async def get_snapshot(self) -> Optional[Row]:
+        """Get the (seq, state) of the account's latest snapshot, or None"""
+        result = await self.read_session.execute(
+            select(account_snapshots.c.seq, account_snapshots.c.state)
+            .where(account_snapshots.c.account_id == self.account_id)
+        )
+        return result.first()
+
+    async def save_snapshot(self, seq: int, state: Dict[str, Any]):
+        """Replace the account's snapshot; only the latest is kept"""
+        await self.session.execute(delete(account_snapshots).where(account_snapshots.c.account_id == self.account_id))
+        await self.session.execute(insert(account_snapshots).values(
+            account_id=self.account_id, seq=seq, state=state, created_at=datetime.datetime.utcnow()
+        ))
+        await self.commit()
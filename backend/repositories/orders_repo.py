@@ -1,49 +1,238 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import datetime
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, tuple_
+from sqlalchemy.engine import Row
 from models.db_models import TradeOrder
+from repositories.base import BaseRepository
 
-class OrderRepository:
-    def __init__(self, session: AsyncSession):
-        self.session = session
+trade_orders = TradeOrder.__table__
 
-    async def get_all_orders(self) -> List[TradeOrder]:
-        """Get all trade orders"""
-        result = await self.session.execute(select(TradeOrder))
+class OrderRepository(BaseRepository):
+    async def list_orders(
+        self,
+        limit: int,
+        cursor: Optional[Tuple[datetime.datetime, int]] = None,
+        status: Optional[str] = None,
+        type: Optional[str] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None,
+        primary: bool = False
+    ) -> List[TradeOrder]:
+        """
+        Get a page of orders, newest first, continuing after the (created_at, id) cursor.
+        `primary` reads from the primary even when a replica session is available.
+        """
+        query = select(TradeOrder).where(TradeOrder.account_id == self.account_id)
+        if status:
+            query = query.where(TradeOrder.status == status)
+        if type:
+            query = query.where(TradeOrder.type == type)
+        if created_from:
+            query = query.where(TradeOrder.created_at >= created_from)
+        if created_to:
+            query = query.where(TradeOrder.created_at < created_to)
+        if cursor:
+            query = query.where(tuple_(TradeOrder.created_at, TradeOrder.id) < tuple_(*cursor))
+
+        query = query.order_by(TradeOrder.created_at.desc(), TradeOrder.id.desc()).limit(limit)
+        result = await (self.session if primary else self.read_session).execute(query)
         return result.scalars().all()
 
+    async def get_open_positions(self) -> List[Row]:
+        """Get (id, type, amount, price) of every open order, without loading full ORM objects"""
+        result = await self.session.execute(
+            select(trade_orders.c.id, trade_orders.c.type, trade_orders.c.amount, trade_orders.c.price)
+            .where(trade_orders.c.account_id == self.account_id, trade_orders.c.status == "open")
+            .order_by(trade_orders.c.id)
+        )
+        return result.all()
+
     async def get_order_by_id(self, order_id: int) -> Optional[TradeOrder]:
         """Get a specific order by ID"""
         result = await self.session.execute(
-            select(TradeOrder).where(TradeOrder.id == order_id)
+            select(TradeOrder)
+            .where(TradeOrder.id == order_id, TradeOrder.account_id == self.account_id)
+            .execution_options(populate_existing=True)
         )
         return result.scalar_one_or_none()
 
     async def get_open_order_by_id(self, order_id: int) -> Optional[TradeOrder]:
         """Get a specific open order by ID"""
         result = await self.session.execute(
-            select(TradeOrder).where(TradeOrder.id == order_id, TradeOrder.status == "open")
+            select(TradeOrder)
+            .where(
+                TradeOrder.id == order_id,
+                TradeOrder.account_id == self.account_id,
+                TradeOrder.status == "open"
+            )
+            .execution_options(populate_existing=True)
         )
         return result.scalar_one_or_none()
 
-    async def create_order(self, type: str, amount: float, price: float) -> TradeOrder:
+    async def get_all_pending_orders(self) -> List[Row]:
+        """Get the pending limit and stop orders of every account, to rebuild the matching engine"""
+        result = await self.session.execute(
+            select(
+                trade_orders.c.id,
+                trade_orders.c.account_id,
+                trade_orders.c.type,
+                trade_orders.c.kind,
+                trade_orders.c.amount,
+                trade_orders.c.trigger_price
+            )
+            .where(trade_orders.c.status == "pending")
+            .order_by(trade_orders.c.id)
+        )
+        return result.all()
+
+    async def create_order(
+        self,
+        type: str,
+        amount: float,
+        price: float,
+        kind: str = "market",
+        trigger_price: Optional[float] = None,
+        status: str = "open"
+    ) -> TradeOrder:
         """Create a new trade order"""
-        new_order = TradeOrder(type=type, amount=amount, price=price)
+        new_order = TradeOrder(
+            account_id=self.account_id,
+            type=type,
+            kind=kind,
+            amount=amount,
+            price=price,
+            trigger_price=trigger_price,
+            status=status
+        )
         self.session.add(new_order)
-        await self.session.commit()
-        await self.session.refresh(new_order)
+        # The flush fetches the generated id (via RETURNING where supported) and fills
+        # in the Python-side defaults, so no follow-up SELECT is needed
+        await self.session.flush()
+        await self.commit()
         return new_order
 
-    async def close_order(self, order_id: int) -> Optional[TradeOrder]:
-        """Mark an order as closed"""
-        order = await self.get_open_order_by_id(order_id)
-        if not order:
-            return None
-        
-        order.status = "closed"
-        order.closed_at = datetime.datetime.utcnow()
-        
-        await self.session.commit()
-        await self.session.refresh(order)
+    async def create_orders(self, orders: List[Tuple[str, float, float]]) -> List[TradeOrder]:
+        """Create several (type, amount, price) orders with a single multi-row INSERT"""
+        created_at = datetime.datetime.utcnow()
+        if self.supports_returning:
+            result = await self.session.execute(
+                insert(trade_orders)
+                .values([
+                    {
+                        "account_id": self.account_id,
+                        "type": type,
+                        "amount": amount,
+                        "price": price,
+                        "status": "open",
+                        "created_at": created_at
+                    }
+                    for type, amount, price in orders
+                ])
+                .returning(*trade_orders.c)
+            )
+            new_orders = sorted(result.all(), key=lambda order: order.id)
+        else:
+            new_orders = [
+                TradeOrder(
+                    account_id=self.account_id,
+                    type=type,
+                    amount=amount,
+                    price=price,
+                    status="open",
+                    created_at=created_at
+                )
+                for type, amount, price in orders
+            ]
+            self.session.add_all(new_orders)
+            await self.session.flush()
+
+        await self.commit()
+        return new_orders
+
+    async def _transition(self, order_id: int, from_status: str, **values) -> Optional[Row]:
+        """Change an order that is still in `from_status` in one guarded statement, returning the row or None"""
+        query = (
+            update(trade_orders)
+            .where(
+                trade_orders.c.id == order_id,
+                trade_orders.c.account_id == self.account_id,
+                trade_orders.c.status == from_status
+            )
+            .values(**values)
+        )
+
+        if self.supports_returning:
+            result = await self.session.execute(query.returning(*trade_orders.c))
+            order = result.first()
+        else:
+            result = await self.session.execute(query)
+            order = None
+            if result.rowcount:
+                result = await self.session.execute(
+                    select(trade_orders).where(trade_orders.c.id == order_id)
+                )
+                order = result.first()
+
+        await self.commit()
         return order
+
+    async def close_order(self, order_id: int) -> Optional[Row]:
+        """Mark an open order as closed in one statement, returning the closed row or None"""
+        return await self._transition(order_id, "open", status="closed", closed_at=datetime.datetime.utcnow())
+
+    async def fill_order(self, order_id: int, price: float) -> Optional[Row]:
+        """Open a pending order at its fill price, returning the row or None if it is no longer pending"""
+        return await self._transition(order_id, "pending", status="open", price=price)
+
+    async def cancel_order(self, order_id: int) -> Optional[Row]:
+        """Cancel a pending order, returning the row or None if it is no longer pending"""
+        return await self._transition(order_id, "pending", status="cancelled", closed_at=datetime.datetime.utcnow())
+
+    async def reject_order(self, order_id: int) -> Optional[Row]:
+        """Reject a pending order that triggered but couldn't be funded"""
+        return await self._transition(order_id, "pending", status="rejected", closed_at=datetime.datetime.utcnow())
+
+    async def close_orders(
+        self,
+        order_ids: Optional[List[int]] = None,
+        type: Optional[str] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None
+    ) -> List[Row]:
+        """Close every open order matching the ids or filters in one statement, returning the closed rows"""
+        criteria = [trade_orders.c.account_id == self.account_id, trade_orders.c.status == "open"]
+        if order_ids is not None:
+            criteria.append(trade_orders.c.id.in_(order_ids))
+        if type:
+            criteria.append(trade_orders.c.type == type)
+        if created_from:
+            criteria.append(trade_orders.c.created_at >= created_from)
+        if created_to:
+            criteria.append(trade_orders.c.created_at < created_to)
+        closed_at = datetime.datetime.utcnow()
+
+        if self.supports_returning:
+            result = await self.session.execute(
+                update(trade_orders)
+                .where(*criteria)
+                .values(status="closed", closed_at=closed_at)
+                .returning(*trade_orders.c)
+            )
+            orders = result.all()
+        else:
+            result = await self.session.execute(select(trade_orders.c.id).where(*criteria))
+            ids = result.scalars().all()
+            orders = []
+            if ids:
+                await self.session.execute(
+                    update(trade_orders)
+                    .where(trade_orders.c.id.in_(ids))
+                    .values(status="closed", closed_at=closed_at)
+                )
+                result = await self.session.execute(
+                    select(trade_orders).where(trade_orders.c.id.in_(ids)).order_by(trade_orders.c.id)
+                )
+                orders = result.all()
+
+        await self.commit()
+        return orders
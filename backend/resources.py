@@ -0,0 +1,219 @@
+from typing import Any, Dict, Optional
+import httpx
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from config import (
+    DATABASE_URL, DATABASE_REPLICA_URL, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    REDIS_URL, REDIS_MAX_CONNECTIONS,
+    MONGODB_URL, MONGO_MAX_POOL_SIZE,
+    PRICE_FETCH_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY
+)
+
+class MongoPoolStats:
+    """
+    Counts Mongo connections from pool events, since pymongo exposes no pool stats.
+    Mixed into a pymongo pool listener when the client is built.
+    """
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+
+class AppResources:
+    """
+    Clients and connection pools shared by every request. Each one is built once
+    per process, on startup or first use, and closed on shutdown.
+    """
+    def __init__(self):
+        self._engine: Optional[AsyncEngine] = None
+        self._session_factory: Optional[sessionmaker] = None
+        self._replica_engine: Optional[AsyncEngine] = None
+        self._replica_session_factory: Optional[sessionmaker] = None
+        self._redis_pool: Optional[redis.ConnectionPool] = None
+        self._redis: Optional[redis.Redis] = None
+        self._mongo_client: Optional[Any] = None
+        self._mongo_stats = MongoPoolStats()
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            self._engine = create_async_engine(
+                DATABASE_URL,
+                echo=DB_ECHO,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW
+            )
+        return self._engine
+
+    @property
+    def session_factory(self) -> sessionmaker:
+        if self._session_factory is None:
+            self._session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        return self._session_factory
+
+    @property
+    def replica_engine(self) -> Optional[AsyncEngine]:
+        """The read replica's engine, or None when DATABASE_REPLICA_URL isn't set"""
+        if self._replica_engine is None and DATABASE_REPLICA_URL:
+            self._replica_engine = create_async_engine(
+                DATABASE_REPLICA_URL,
+                echo=DB_ECHO,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW
+            )
+        return self._replica_engine
+
+    @property
+    def replica_session_factory(self) -> Optional[sessionmaker]:
+        if self._replica_session_factory is None and self.replica_engine is not None:
+            self._replica_session_factory = sessionmaker(
+                self.replica_engine, class_=AsyncSession, expire_on_commit=False
+            )
+        return self._replica_session_factory
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis_pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+            self._redis = redis.Redis(connection_pool=self._redis_pool)
+        return self._redis
+
+    @property
+    def mongo_client(self) -> Any:
+        if self._mongo_client is None:
+            # Imported on first use: Motor and pymongo are slow to import, and only the
+            # trade log writer needs them, off the request path
+            from motor.motor_asyncio import AsyncIOMotorClient
+            from pymongo import monitoring
+            self._mongo_stats = type("MongoPoolListener", (MongoPoolStats, monitoring.ConnectionPoolListener), {})()
+            self._mongo_client = AsyncIOMotorClient(
+                MONGODB_URL,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                event_listeners=[self._mongo_stats]
+            )
+        return self._mongo_client
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=PRICE_FETCH_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._http_client
+
+    def use(
+        self,
+        engine: Optional[AsyncEngine] = None,
+        replica_engine: Optional[AsyncEngine] = None,
+        redis_client: Optional["redis.Redis"] = None,
+        mongo_client: Optional[Any] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        """Install pre-built clients in place of the configured ones, e.g. local stand-ins"""
+        if engine is not None:
+            self._engine = engine
+            self._session_factory = None
+        if replica_engine is not None:
+            self._replica_engine = replica_engine
+            self._replica_session_factory = None
+        if redis_client is not None:
+            self._redis = redis_client
+        if mongo_client is not None:
+            self._mongo_client = mongo_client
+        if http_client is not None:
+            self._http_client = http_client
+
+    def startup(self):
+        """Build the clients requests use up front, so the first requests don't pay for it"""
+        self.session_factory
+        self.replica_session_factory
+        self.redis
+        self.http_client
+
+    async def shutdown(self):
+        """Close every client and release its pooled connections"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self._redis is not None:
+            await self._redis.close()
+            if self._redis_pool is not None:
+                await self._redis_pool.disconnect()
+            self._redis = self._redis_pool = None
+        if self._mongo_client is not None:
+            self._mongo_client.close()
+            self._mongo_client = None
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = self._session_factory = None
+        if self._replica_engine is not None:
+            await self._replica_engine.dispose()
+            self._replica_engine = self._replica_session_factory = None
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Report usage of each connection pool that has been built"""
+        stats: Dict[str, Dict[str, Any]] = {}
+        # Only a queue pool keeps connections to report on; e.g. SQLite in tests and benchmarks has none
+        for name, engine in (("postgres", self._engine), ("postgres_replica", self._replica_engine)):
+            if engine is not None and isinstance(engine.sync_engine.pool, QueuePool):
+                pool = engine.sync_engine.pool
+                stats[name] = {
+                    "size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "idle": pool.checkedin(),
+                    "overflow": pool.overflow(),
+                    "max": DB_POOL_SIZE + DB_MAX_OVERFLOW,
+                }
+        if self._redis_pool is not None:
+            stats["redis"] = {
+                "open": self._redis_pool._created_connections,
+                "in_use": len(self._redis_pool._in_use_connections),
+                "idle": len(self._redis_pool._available_connections),
+                "max": self._redis_pool.max_connections,
+            }
+        if self._mongo_client is not None:
+            stats["mongo"] = {
+                "open": self._mongo_stats.open,
+                "in_use": self._mongo_stats.checked_out,
+                "max": MONGO_MAX_POOL_SIZE,
+            }
+        if self._http_client is not None and not self._http_client.is_closed:
+            connections = getattr(getattr(self._http_client._transport, "_pool", None), "connections", [])
+            idle = sum(1 for connection in connections if connection.is_idle())
+            stats["http"] = {
+                "open": len(connections),
+                "in_use": len(connections) - idle,
+                "idle": idle,
+                "max": HTTP_MAX_CONNECTIONS,
+            }
+        return stats
+
+# One container per process, managed by the app startup and shutdown hooks
+resources = AppResources()
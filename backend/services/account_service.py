@@ -1,69 +1,122 @@
 from repositories.account_repo import AccountRepository
+from services.ledger_service import LedgerService
+from services.journal_service import JournalService, balance_event
 from fastapi import HTTPException
+from metrics import stage
+
+# Side of an order in the balance arithmetic
+BUY, SELL = 1, -1
+
+def opening_deltas(side, btc_amount, price):
+    """
+    (cash_delta, btc_delta) of opening an order: a buy pays cash for BTC, a sell the reverse.
+    Works elementwise on NumPy arrays, so the backtester shares this accounting.
+    """
+    return -side * btc_amount * price, side * btc_amount
+
+def closing_deltas(side, btc_amount, price):
+    """
+    (cash_delta, btc_delta) of closing an order, which unwinds it at the close price
+    """
+    return side * btc_amount * price, -side * btc_amount
 
 class AccountService:
-    def __init__(self, account_repo: AccountRepository):
+    def __init__(self, account_repo: AccountRepository, ledger: LedgerService = None, journal: JournalService = None):
         self.account_repo = account_repo
+        # In ledger mode the in-memory ledger, not Postgres, holds the authoritative balances
+        self.ledger = ledger
+        self.journal = journal
+    
+    async def open_account(self, cash_balance: float, btc_balance: float):
+        """
+        Open a new account with the given starting balances, journaled as its first event
+        """
+        async with self.account_repo.unit_of_work():
+            account = await self.account_repo.create_account(cash_balance, btc_balance)
+            if self.journal:
+                await self.journal.for_account(account.id).record([balance_event("account_opened", account)])
+        return account
     
     async def get_account_details(self):
         """
         Get the current account details
         """
-        account = await self.account_repo.get_account()
+        if self.ledger:
+            account = await self.ledger.load(self.account_repo.account_id)
+        else:
+            account = await self.account_repo.get_account()
         if not account:
             raise HTTPException(status_code=404, detail="Account not initialized")
         return account
     
-    async def check_buy_feasibility(self, trade_value: float):
+    async def lock_account(self):
         """
-        Check if the account has enough cash for a buy trade
+        Get the account and hold its row lock for the rest of the transaction
         """
-        account = await self.account_repo.get_account()
+        if self.ledger:
+            account = await self.ledger.load(self.account_repo.account_id)
+        else:
+            account = await self.account_repo.get_account_for_update()
         if not account:
             raise HTTPException(status_code=404, detail="Account not initialized")
-        
-        if account.cash_balance < trade_value:
-            raise HTTPException(status_code=400, detail="Insufficient cash balance")
+        return account
     
-    async def check_sell_feasibility(self, btc_amount: float):
+    async def apply_balance_delta(self, cash_delta: float, btc_delta: float, insufficient_detail: str):
         """
-        Check if the account has enough BTC for a sell trade
+        Apply a balance change with a single guarded update, failing if funds are insufficient
         """
-        account = await self.account_repo.get_account()
-        if not account:
-            raise HTTPException(status_code=404, detail="Account not initialized")
+        if self.ledger:
+            return await self._apply_ledger_delta(cash_delta, btc_delta, insufficient_detail)
         
-        if account.btc_balance < btc_amount:
-            raise HTTPException(status_code=400, detail="Insufficient BTC balance")
+        with stage("account_update"):
+            account = await self.account_repo.apply_balance_delta(cash_delta, btc_delta)
+        if account is None:
+            # Only the failure path pays for a read, to tell a missing account from low funds
+            if not await self.account_repo.get_account():
+                raise HTTPException(status_code=404, detail="Account not initialized")
+            raise HTTPException(status_code=400, detail=insufficient_detail)
+        return account
+    
+    async def _apply_ledger_delta(self, cash_delta: float, btc_delta: float, insufficient_detail: str):
+        account_id = self.account_repo.account_id
+        await self.ledger.load(account_id)
+        with stage("ledger_apply"):
+            account = await self.ledger.apply(account_id, cash_delta, btc_delta)
+        if account is None:
+            if self.ledger.get(account_id) is None:
+                raise HTTPException(status_code=404, detail="Account not initialized")
+            raise HTTPException(status_code=400, detail=insufficient_detail)
+        
+        # The ledger isn't part of the database transaction, so undo the change if the trade rolls back
+        self.account_repo.on_rollback(
+            lambda: self.ledger.apply(account_id, -cash_delta, -btc_delta, force=True)
+        )
+        return account
     
     async def process_buy(self, btc_amount: float, price: float):
         """
         Process a buy trade by updating account balances
         """
-        trade_value = btc_amount * price
-        await self.check_buy_feasibility(trade_value)
-        return await self.account_repo.update_account_balances(-trade_value, btc_amount)
+        cash_delta, btc_delta = opening_deltas(BUY, btc_amount, price)
+        return await self.apply_balance_delta(cash_delta, btc_delta, "Insufficient cash balance")
     
     async def process_sell(self, btc_amount: float, price: float):
         """
         Process a sell trade by updating account balances
         """
-        trade_value = btc_amount * price
-        await self.check_sell_feasibility(btc_amount)
-        return await self.account_repo.update_account_balances(trade_value, -btc_amount)
+        cash_delta, btc_delta = opening_deltas(SELL, btc_amount, price)
+        return await self.apply_balance_delta(cash_delta, btc_delta, "Insufficient BTC balance")
     
     async def close_buy_order(self, btc_amount: float, price: float):
         """
         Close a buy order (sell the BTC)
         """
-        trade_value = btc_amount * price
-        await self.check_sell_feasibility(btc_amount)
-        return await self.account_repo.update_account_balances(trade_value, -btc_amount)
+        cash_delta, btc_delta = closing_deltas(BUY, btc_amount, price)
+        return await self.apply_balance_delta(cash_delta, btc_delta, "Insufficient BTC balance")
     
     async def close_sell_order(self, btc_amount: float, price: float):
         """
         Close a sell order (buy back the BTC)
         """
-        trade_value = btc_amount * price
-        await self.check_buy_feasibility(trade_value)
-        return await self.account_repo.update_account_balances(-trade_value, btc_amount)
+        cash_delta, btc_delta = closing_deltas(SELL, btc_amount, price)
+        return await self.apply_balance_delta(cash_delta, btc_delta, "Insufficient cash balance")
@@ -0,0 +1,226 @@
+import argparse
+import importlib
+import json
+import sys
+from typing import Any, Callable, Dict, NamedTuple, Optional
+import numpy as np
+from services.account_service import opening_deltas, closing_deltas
+
+# Maps the price series to the signed BTC amount to trade at every tick:
+# positive opens a buy, negative opens a sell, zero does nothing
+Strategy = Callable[[np.ndarray], np.ndarray]
+
+# Running balances may dip this far below zero from float summation alone
+_TOLERANCE = 1e-9
+
+# Events summed per block when checking funds
+_BLOCK = 4096
+
+class BacktestResult(NamedTuple):
+    equity: np.ndarray  # cash + BTC marked at each tick
+    cash: np.ndarray
+    btc: np.ndarray
+    orders: Dict[str, np.ndarray]  # one entry per order the strategy asked for
+    stats: Dict[str, Any]
+
+def load_prices(path: str) -> np.ndarray:
+    """
+    Load a price series from a .npy file, or from a CSV file taking the "price"
+    or "close" column if there is a header, else the last column
+    """
+    if path.endswith(".npy"):
+        return np.load(path).astype(np.float64).ravel()
+
+    with open(path) as csv_file:
+        header = csv_file.readline().strip().split(",")
+    try:
+        [float(value) for value in header]
+        skiprows, column = 0, len(header) - 1
+    except ValueError:
+        names = [name.strip().lower() for name in header]
+        column = next((names.index(name) for name in ("price", "close") if name in names), len(names) - 1)
+        skiprows = 1
+    return np.loadtxt(path, delimiter=",", skiprows=skiprows, usecols=column, dtype=np.float64, ndmin=1)
+
+def moving_average_crossover(fast: int = 50, slow: int = 200, amount: float = 0.01) -> Strategy:
+    """
+    Reference strategy: buy when the fast moving average crosses above the slow one,
+    sell when it crosses below
+    """
+    def strategy(prices: np.ndarray) -> np.ndarray:
+        if prices.size == 0:
+            return np.zeros(0)
+        cumulative = np.concatenate(([0.0], np.cumsum(prices)))
+        def moving_average(window: int) -> np.ndarray:
+            average = np.full(prices.size, np.nan)
+            average[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+            return average
+        above = moving_average(fast) > moving_average(slow)
+        crossed = np.diff(above.astype(np.int8), prepend=np.int8(above[0]))
+        return crossed * amount
+    return strategy
+
+class BacktestService:
+    """
+    Replays a strategy over a price series with the same accounting as the live
+    trade paths: orders open at the tick price, close after a holding period (or
+    stay open and are marked at the end), and an open or close the balances can't
+    cover is refused, as AccountService refuses it. All bookkeeping is done on
+    NumPy arrays of order events, with no database involved.
+    """
+    def __init__(self, cash_balance: float = 10000.0, btc_balance: float = 0.5):
+        self.cash_balance = cash_balance
+        self.btc_balance = btc_balance
+
+    def run(self, prices: np.ndarray, strategy: Strategy, close_after: Optional[int] = None) -> BacktestResult:
+        """
+        Backtest `strategy` over `prices`. With `close_after`, every order is closed that
+        many ticks after it opened, if the series lasts that long.
+        """
+        if close_after is not None and close_after < 1:
+            raise ValueError("close_after must be at least one tick")
+        prices = np.asarray(prices, dtype=np.float64)
+        signals = np.asarray(strategy(prices), dtype=np.float64)
+        if signals.shape != prices.shape:
+            raise ValueError("Strategy must return one order amount per tick")
+
+        # Orders the strategy asked for
+        open_ticks = np.flatnonzero(signals)
+        sides = np.sign(signals[open_ticks])
+        amounts = np.abs(signals[open_ticks])
+        entry_prices = prices[open_ticks]
+        order_count = open_ticks.size
+        close_ticks = np.full(order_count, -1, dtype=np.int64)
+        if close_after is not None:
+            scheduled = open_ticks + close_after
+            close_ticks = np.where(scheduled < prices.size, scheduled, -1)
+
+        # One event per open and per close, in time order; at a tick, closes go first to free funds
+        has_close = close_ticks >= 0
+        closing = np.flatnonzero(has_close)
+        event_order = np.concatenate((np.arange(order_count), closing))
+        event_ticks = np.concatenate((open_ticks, close_ticks[closing]))
+        event_is_close = np.concatenate((np.zeros(order_count, dtype=bool), np.ones(closing.size, dtype=bool)))
+        open_cash, open_btc = opening_deltas(sides, amounts, entry_prices)
+        close_cash, close_btc = closing_deltas(sides[closing], amounts[closing], prices[close_ticks[closing]])
+        event_cash = np.concatenate((open_cash, close_cash))
+        event_btc = np.concatenate((open_btc, close_btc))
+
+        sort = np.lexsort((~event_is_close, event_ticks))
+        event_order, event_ticks, event_is_close = event_order[sort], event_ticks[sort], event_is_close[sort]
+        event_cash, event_btc = event_cash[sort], event_btc[sort]
+
+        active = self._fund_events(order_count, event_order, event_is_close, event_cash, event_btc)
+
+        # Balances and equity at every tick
+        cash = self.cash_balance + np.cumsum(
+            np.bincount(event_ticks, weights=np.where(active, event_cash, 0.0), minlength=prices.size)
+        )
+        btc = self.btc_balance + np.cumsum(
+            np.bincount(event_ticks, weights=np.where(active, event_btc, 0.0), minlength=prices.size)
+        )
+        equity = cash + btc * prices
+
+        # Final state of every order
+        filled = np.zeros(order_count, dtype=bool)
+        filled[event_order[active & ~event_is_close]] = True
+        closed = np.zeros(order_count, dtype=bool)
+        closed[event_order[active & event_is_close]] = True
+        exit_prices = np.where(closed, prices[np.maximum(close_ticks, 0)], prices[-1] if prices.size else np.nan)
+        pnl = np.where(filled, sides * amounts * (exit_prices - entry_prices), 0.0)
+        status = np.where(closed, "closed", np.where(filled, "open", "rejected"))
+
+        orders = {
+            "open_tick": open_ticks,
+            "close_tick": np.where(closed, close_ticks, -1),
+            "side": sides.astype(np.int8),
+            "amount": amounts,
+            "entry_price": entry_prices,
+            "exit_price": np.where(filled, exit_prices, np.nan),
+            "pnl": pnl,
+            "status": status,
+        }
+        return BacktestResult(equity, cash, btc, orders, self._stats(equity, pnl, filled, closed))
+
+    def _fund_events(
+        self,
+        order_count: int,
+        event_order: np.ndarray,
+        event_is_close: np.ndarray,
+        event_cash: np.ndarray,
+        event_btc: np.ndarray
+    ) -> np.ndarray:
+        """
+        Decide which events the balances can cover. Blocks of events are checked with
+        cumulative sums; a block where the running balances would overdraw is walked
+        event by event from that point. A refused open also drops its close; a refused
+        close leaves its order open.
+        """
+        active = np.ones(event_order.size, dtype=bool)
+        close_of = np.full(order_count, -1, dtype=np.int64)
+        close_of[event_order[event_is_close]] = np.flatnonzero(event_is_close)
+
+        cash, btc = self.cash_balance, self.btc_balance
+        for block_start in range(0, event_order.size, _BLOCK):
+            block = slice(block_start, min(block_start + _BLOCK, event_order.size))
+            running_cash = cash + np.cumsum(np.where(active[block], event_cash[block], 0.0))
+            running_btc = btc + np.cumsum(np.where(active[block], event_btc[block], 0.0))
+            overdrawn = np.flatnonzero((running_cash < -_TOLERANCE) | (running_btc < -_TOLERANCE))
+            if not overdrawn.size:
+                cash, btc = running_cash[-1], running_btc[-1]
+                continue
+
+            first = int(overdrawn[0])
+            if first:
+                cash, btc = running_cash[first - 1], running_btc[first - 1]
+            for index in range(block_start + first, block.stop):
+                if not active[index]:
+                    continue
+                new_cash, new_btc = cash + event_cash[index], btc + event_btc[index]
+                if new_cash < -_TOLERANCE or new_btc < -_TOLERANCE:
+                    active[index] = False
+                    if not event_is_close[index] and close_of[event_order[index]] >= 0:
+                        active[close_of[event_order[index]]] = False
+                    continue
+                cash, btc = new_cash, new_btc
+        return active
+
+    def _stats(self, equity: np.ndarray, pnl: np.ndarray, filled: np.ndarray, closed: np.ndarray) -> Dict[str, Any]:
+        starting_equity = equity[0] if equity.size else 0.0
+        drawdown = 1.0 - equity / np.maximum.accumulate(equity) if equity.size else np.zeros(0)
+        closed_pnl = pnl[closed]
+        return {
+            "ticks": int(equity.size),
+            "orders": int(pnl.size),
+            "filled": int(filled.sum()),
+            "rejected": int(pnl.size - filled.sum()),
+            "closed": int(closed.sum()),
+            "final_equity": float(equity[-1]) if equity.size else 0.0,
+            "total_return": float(equity[-1] / starting_equity - 1.0) if equity.size and starting_equity else 0.0,
+            "max_drawdown": float(drawdown.max()) if drawdown.size else 0.0,
+            "realized_pnl": float(closed_pnl.sum()),
+            "unrealized_pnl": float(pnl[filled & ~closed].sum()),
+            "win_rate": float((closed_pnl > 0).mean()) if closed_pnl.size else None,
+        }
+
+def _load_strategy(spec: str) -> Strategy:
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest a strategy against a historical BTC price series")
+    parser.add_argument("prices", help="CSV or .npy file of prices")
+    parser.add_argument("--strategy", help="module:callable mapping the price array to order amounts "
+                                           "(default: a 50/200 tick moving average crossover)")
+    parser.add_argument("--close-after", type=int, help="close every order after this many ticks")
+    parser.add_argument("--cash", type=float, default=10000.0)
+    parser.add_argument("--btc", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    strategy = _load_strategy(args.strategy) if args.strategy else moving_average_crossover()
+    result = BacktestService(args.cash, args.btc).run(load_prices(args.prices), strategy, args.close_after)
+    json.dump(result.stats, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
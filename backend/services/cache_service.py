@@ -4,8 +4,8 @@ from config import REDIS_URL
 from typing import Any, Optional
 
 class CacheService:
-    def __init__(self):
-        self.redis_client = redis.from_url(REDIS_URL)
+    def __init__(self, redis_client: redis.Redis = None):
+        self.redis_client = redis_client or redis.from_url(REDIS_URL)
     
     async def get(self, key: str) -> Optional[str]:
         """Get a value from cache by key"""
@@ -0,0 +1,200 @@
+import datetime
+import fcntl
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from fastapi import HTTPException
+from config import (
+    CANDLE_DIR, CANDLE_CAPACITY_1S, CANDLE_CAPACITY_1M, CANDLE_CAPACITY_1H, CANDLE_HISTORY_POINTS
+)
+from services.price_feed import PriceFeed, PriceTick
+
+logger = logging.getLogger(__name__)
+
+# Candle interval name to its length in seconds
+INTERVALS = {"1s": 1, "1m": 60, "1h": 3600}
+
+# Columns of a candle buffer. Upstream quotes carry no traded volume, so volume counts ticks.
+FIELDS = ("time", "open", "high", "low", "close", "volume")
+TIME, OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(FIELDS))
+
+def _epoch(moment: datetime.datetime) -> float:
+    # Naive datetimes are UTC throughout the app
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+class CandleBuffer:
+    """
+    A fixed-size ring of candles for one interval, stored column by column in a
+    memory-mapped file. A candle lives in the slot of its bucket number modulo the
+    capacity, so there is no head pointer to persist and any time range maps to at
+    most two contiguous slices of the columns.
+    """
+    def __init__(self, path: str, interval: int, capacity: int):
+        self.path = path
+        self.interval = interval
+        self.capacity = capacity
+        self._columns: Optional[np.memmap] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._columns is not None
+
+    def open(self, writable: bool = True):
+        """
+        Map the file, creating an empty buffer if it is missing or sized for another
+        capacity. Read-only, a missing or mis-sized file leaves the buffer closed.
+        """
+        size = len(FIELDS) * self.capacity * np.dtype(np.float64).itemsize
+        reuse = os.path.exists(self.path) and os.path.getsize(self.path) == size
+        if not writable:
+            if reuse:
+                self._columns = np.memmap(self.path, dtype=np.float64, mode="r", shape=(len(FIELDS), self.capacity))
+            return
+        self._columns = np.memmap(
+            self.path, dtype=np.float64, mode="r+" if reuse else "w+", shape=(len(FIELDS), self.capacity)
+        )
+        if not reuse:
+            self._columns[TIME] = -1.0
+
+    def close(self):
+        if self._columns is not None:
+            if self._columns.mode != "r":
+                self._columns.flush()
+            self._columns = None
+
+    def record(self, price: float, timestamp: float):
+        """Fold a tick into the candle of its bucket"""
+        bucket = timestamp // self.interval
+        slot = int(bucket) % self.capacity
+        start = bucket * self.interval
+        candle = self._columns[:, slot]
+        if candle[TIME] == start:
+            candle[HIGH] = max(candle[HIGH], price)
+            candle[LOW] = min(candle[LOW], price)
+            candle[CLOSE] = price
+            candle[VOLUME] += 1
+        elif candle[TIME] < start:
+            # The slot held an older lap of the ring, or nothing yet
+            candle[OPEN] = candle[HIGH] = candle[LOW] = candle[CLOSE] = price
+            candle[VOLUME] = 1
+            candle[TIME] = start
+        # A tick older than the candle already in its slot has fallen off the ring
+
+    def slices(self, start: float, end: float) -> List[np.ndarray]:
+        """
+        Views (not copies) of the columns covering the buckets from `start` to `end`,
+        clamped to the newest `capacity` buckets
+        """
+        last = int(end // self.interval)
+        first = max(int(start // self.interval), last - self.capacity + 1)
+        if first > last:
+            return []
+        head, tail = first % self.capacity, last % self.capacity
+        if head <= tail:
+            return [self._columns[:, head:tail + 1]]
+        return [self._columns[:, head:], self._columns[:, :tail + 1]]
+
+    def history(self, start: float, end: float) -> Dict[str, List[float]]:
+        """The candles from `start` to `end` as columns, skipping buckets without ticks"""
+        first = start // self.interval * self.interval
+        history: Dict[str, List[float]] = {field: [] for field in FIELDS}
+        for columns in self.slices(start, end):
+            # A slot inside the range holds either its bucket or a stale lap; keep the former
+            present = (columns[TIME] >= first) & (columns[TIME] <= end)
+            if not present.all():
+                columns = columns[:, present]
+            for index, field in enumerate(FIELDS):
+                history[field] += columns[index].tolist()
+        history["time"] = [int(moment) for moment in history["time"]]
+        return history
+
+class CandleStore:
+    """
+    Aggregates every price feed tick into 1s, 1m and 1h OHLCV candles, kept in
+    memory-mapped ring buffers under CANDLE_DIR so history survives restarts
+    and charts are served without upstream calls.
+
+    Every worker process polls the same feed, so only the one holding an exclusive
+    lock on the directory records ticks; the others map the files read-only and
+    serve history from the owner's writes. If the owner exits, the next worker to
+    see a tick takes the lock over.
+    """
+    def __init__(self, directory: str = CANDLE_DIR, capacities: Optional[Dict[str, int]] = None):
+        capacities = capacities or {"1s": CANDLE_CAPACITY_1S, "1m": CANDLE_CAPACITY_1M, "1h": CANDLE_CAPACITY_1H}
+        self.directory = directory
+        # The capacity is part of the file name, so resizing a ring starts a fresh file
+        self.buffers = {
+            name: CandleBuffer(os.path.join(directory, f"{name}-{capacities[name]}.candles"), seconds, capacities[name])
+            for name, seconds in INTERVALS.items()
+        }
+        self._price_feed: Optional[PriceFeed] = None
+        self._lock_file = None
+        self.owner = False
+
+    def start(self, price_feed: PriceFeed):
+        """Map the buffers and start recording ticks, or following the owner's"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, ".lock"), "a")
+        if not self._acquire():
+            for buffer in self.buffers.values():
+                buffer.open(writable=False)
+        self._price_feed = price_feed
+        price_feed.subscribe(self.on_tick)
+
+    def stop(self):
+        """Stop recording, flush the buffers to disk and hand ownership on"""
+        if self._price_feed is not None:
+            self._price_feed.unsubscribe(self.on_tick)
+            self._price_feed = None
+        for buffer in self.buffers.values():
+            buffer.close()
+        if self._lock_file is not None:
+            # Closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+        self.owner = False
+
+    def _acquire(self) -> bool:
+        """Try to become the owner, remapping the buffers writable if so"""
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        logger.info("Recording price candles in this process")
+        self.owner = True
+        for buffer in self.buffers.values():
+            buffer.close()
+            buffer.open()
+        return True
+
+    def on_tick(self, tick: PriceTick):
+        if not self.owner and not self._acquire():
+            return
+        for buffer in self.buffers.values():
+            buffer.record(tick.price, tick.source_ts)
+
+    def history(
+        self,
+        interval: str,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Get the candles of an interval between two moments, by default the latest CANDLE_HISTORY_POINTS
+        """
+        buffer = self.buffers[interval]
+        if not buffer.is_open and self._price_feed is not None:
+            # The owner may have created the file since this process started
+            buffer.open(writable=False)
+        if not buffer.is_open:
+            raise HTTPException(status_code=503, detail="Price history unavailable")
+        end_ts = _epoch(end) if end else time.time()
+        start_ts = _epoch(start) if start else end_ts - CANDLE_HISTORY_POINTS * buffer.interval
+        return {"interval": interval, **buffer.history(start_ts, end_ts)}
+
+# App-scoped candle store, fed by the price feed
+candle_store = CandleStore()
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+import orjson
+import redis.asyncio as redis
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from config import IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TTL
+from metrics import cache_lookup
+
+# KEYS: key  ARGV: pending record, lock ttl (ms)
+# Returns the stored record, or nil after claiming the key for this request
+_CLAIM = """
+local existing = redis.call('GET', KEYS[1])
+if existing then return existing end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return false
+"""
+
+# KEYS: key  ARGV: pending record
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+class IdempotencyService:
+    """
+    Runs a mutating request at most once per Idempotency-Key. The first request
+    claims the key in Redis and stores its response, as the bytes sent, for
+    IDEMPOTENCY_TTL seconds; retries are answered from that record. A retry that
+    arrives while the first request is still running waits for it: in the same
+    process on a shared future, elsewhere by polling Redis.
+    """
+    # Requests running in this process, by Redis key, so local retries wait without polling
+    _inflight: Dict[str, asyncio.Future] = {}
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        prefix: str = "idempotency",
+        ttl: int = IDEMPOTENCY_TTL,
+        lock_ttl: float = IDEMPOTENCY_LOCK_TTL
+    ):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self._claim = redis_client.register_script(_CLAIM)
+        self._release = redis_client.register_script(_RELEASE)
+
+    @classmethod
+    def for_account(cls, redis_client: redis.Redis, account_id: int) -> "IdempotencyService":
+        """The idempotency records of one account"""
+        return cls(redis_client, prefix=f"idempotency:{account_id}")
+
+    @staticmethod
+    def fingerprint(operation: str, request: Optional[BaseModel]) -> str:
+        """Identifies the request a key was first used with"""
+        payload = request.json(sort_keys=True) if request is not None else ""
+        return hashlib.sha256(f"{operation}|{payload}".encode()).hexdigest()
+
+    @staticmethod
+    def _response(record: Dict[str, Any], replayed: bool) -> Response:
+        headers = {REPLAYED_HEADER: "true"} if replayed else None
+        return Response(
+            content=record["body"].encode(), status_code=record["status_code"],
+            media_type="application/json", headers=headers
+        )
+
+    async def run(
+        self,
+        key: Optional[str],
+        operation: str,
+        request: Optional[BaseModel],
+        response_model: Type[BaseModel],
+        action: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Run `action` for the request, or replay its stored response if the key was seen.
+        Without a key the action just runs. Client errors are stored like successes;
+        server errors release the key so a retry runs again.
+        """
+        if key is None:
+            return await action()
+
+        redis_key = f"{self.prefix}:{operation}:{key}"
+        fingerprint = self.fingerprint(operation, request)
+        # The token makes each claim unique, so only its owner can release it
+        pending = orjson.dumps({"fingerprint": fingerprint, "pending": uuid.uuid4().hex})
+        record = await self._wait_or_claim(redis_key, fingerprint, pending)
+        if record is not None:
+            return self._response(record, replayed=True)
+
+        # This request owns the key; local retries wait on the future
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[redis_key] = future
+        try:
+            record = await self._record(fingerprint, response_model, action)
+            await self.redis_client.set(redis_key, orjson.dumps(record), ex=self.ttl)
+        except BaseException:
+            record = None
+            raise
+        finally:
+            del self._inflight[redis_key]
+            future.set_result(record)
+            if record is None:
+                await self._release(keys=[redis_key], args=[pending])
+        return self._response(record, replayed=False)
+
+    @staticmethod
+    async def _record(
+        fingerprint: str, response_model: Type[BaseModel], action: Callable[[], Awaitable[Any]]
+    ) -> Dict[str, Any]:
+        """Run the action and capture its response, letting server errors propagate"""
+        try:
+            result = await action()
+        except HTTPException as exc:
+            if exc.status_code >= 500:
+                raise
+            return {
+                "fingerprint": fingerprint,
+                "status_code": exc.status_code,
+                "body": orjson.dumps({"detail": exc.detail}).decode(),
+            }
+        return {
+            "fingerprint": fingerprint,
+            "status_code": 200,
+            "body": orjson.dumps(jsonable_encoder(response_model.parse_obj(result))).decode(),
+        }
+
+    async def _wait_or_claim(self, redis_key: str, fingerprint: str, pending: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored record for the key, waiting while another request holds it,
+        or None once this request has claimed it
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        delay = 0.01
+        while True:
+            future = self._inflight.get(redis_key)
+            if future is not None:
+                record = await asyncio.shield(future)
+            else:
+                value = await self._claim(keys=[redis_key], args=[pending, int(self.lock_ttl * 1000)])
+                if value is None:
+                    cache_lookup("idempotency", False)
+                    return None
+                record = orjson.loads(value)
+                if "pending" in record:
+                    if record["fingerprint"] != fingerprint:
+                        raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+                    if loop.time() >= deadline:
+                        raise HTTPException(
+                            status_code=409, detail="A request with this Idempotency-Key is still in progress"
+                        )
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.2)
+                    continue
+
+            if record is None:
+                # The original failed and released the key; try to claim it
+                continue
+            if record["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+            cache_lookup("idempotency", True)
+            return record
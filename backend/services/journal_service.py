@@ -0,0 +1,97 @@
+from typing import Any, Dict, List, Optional, Tuple
+from config import JOURNAL_SNAPSHOT_INTERVAL
+from metrics import stage
+from repositories.journal_repo import JournalRepository
+
+# A journal event: its type and JSON payload
+Event = Tuple[str, Dict[str, Any]]
+
+# Order statuses that keep an order in the rebuilt state
+_LIVE_STATUSES = ("open", "pending")
+
+def balance_event(type: str, account) -> Event:
+    """An "account_opened" or "balance_changed" event carrying the balances after the change"""
+    return type, {"cash_balance": account.cash_balance, "btc_balance": account.btc_balance}
+
+def order_event(type: str, order: Dict[str, Any]) -> Event:
+    """An order event ("order_opened", "order_closed", ...) carrying the serialized order row after the change"""
+    return type, order
+
+class AccountState:
+    """The balances and open or pending orders of an account as of one journal event"""
+    def __init__(
+        self,
+        seq: int = 0,
+        cash_balance: float = 0.0,
+        btc_balance: float = 0.0,
+        orders: Optional[Dict[int, Dict[str, Any]]] = None
+    ):
+        self.seq = seq
+        self.cash_balance = cash_balance
+        self.btc_balance = btc_balance
+        self.orders = orders or {}
+
+    @classmethod
+    def from_snapshot(cls, seq: int, state: Dict[str, Any]) -> "AccountState":
+        return cls(seq, state["cash_balance"], state["btc_balance"], {order["id"]: order for order in state["orders"]})
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        # Orders as a list, since JSON would turn integer keys into strings
+        return {"cash_balance": self.cash_balance, "btc_balance": self.btc_balance, "orders": list(self.orders.values())}
+
+    def apply(self, seq: int, type: str, payload: Dict[str, Any]):
+        """Fold one event into the state"""
+        if type in ("account_opened", "balance_changed"):
+            self.cash_balance = payload["cash_balance"]
+            self.btc_balance = payload["btc_balance"]
+        elif payload["status"] in _LIVE_STATUSES:
+            self.orders[payload["id"]] = payload
+        else:
+            # Closed, cancelled and rejected orders drop out, which keeps snapshots compact
+            self.orders.pop(payload["id"], None)
+        self.seq = seq
+
+class JournalService:
+    """
+    Appends an account's trade and balance events to its journal in Postgres, in the
+    caller's transaction, so the journal commits or rolls back with the change it
+    records. Every `snapshot_interval` events the state is compacted into a snapshot,
+    so a rebuild reads one snapshot plus at most about that many events, however long
+    the account has traded.
+    """
+    def __init__(self, journal_repo: JournalRepository, snapshot_interval: int = JOURNAL_SNAPSHOT_INTERVAL):
+        self.journal_repo = journal_repo
+        self.snapshot_interval = snapshot_interval
+
+    def for_account(self, account_id: int) -> "JournalService":
+        """The journal of another account, on the same session"""
+        return JournalService(JournalRepository(self.journal_repo.session, account_id), self.snapshot_interval)
+
+    async def record(self, events: List[Event]) -> Optional[int]:
+        """Append events in order, returning the sequence number of the last one"""
+        if not events:
+            return None
+        with stage("journal_append"):
+            last_seq = await self.journal_repo.append(events)
+        if last_seq is not None and (last_seq - len(events)) // self.snapshot_interval < last_seq // self.snapshot_interval:
+            await self.snapshot()
+        return last_seq
+
+    async def snapshot(self) -> AccountState:
+        """Compact the account's current state into its snapshot"""
+        with stage("journal_snapshot"):
+            state = await self.rebuild()
+            await self.journal_repo.save_snapshot(state.seq, state.to_snapshot())
+        return state
+
+    async def rebuild(self) -> AccountState:
+        """The account's current state, from its latest snapshot plus the events after it"""
+        snapshot = await self.journal_repo.get_snapshot()
+        state = AccountState.from_snapshot(snapshot.seq, snapshot.state) if snapshot else AccountState()
+        for event in await self.journal_repo.get_events(state.seq):
+            state.apply(event.seq, event.type, event.payload)
+        return state
+
+    async def get_events(self, after_seq: int = 0, limit: Optional[int] = None) -> List[Any]:
+        """The account's events after `after_seq`, oldest first, for auditing"""
+        return await self.journal_repo.get_events(after_seq, limit)
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, NamedTuple, Optional
+from sqlalchemy.orm import sessionmaker
+from config import LEDGER_JOURNAL_PATH, LEDGER_FLUSH_INTERVAL, LEDGER_FSYNC
+from metrics import QUEUE_DEPTH, stage
+from repositories.account_repo import AccountRepository
+
+logger = logging.getLogger(__name__)
+
+class LedgerBalance(NamedTuple):
+    id: int
+    cash_balance: float
+    btc_balance: float
+
+class LedgerService:
+    """
+    Holds the authoritative account balances in memory, behind a lock per account.
+    Every change is appended to a local journal before it is acknowledged, and
+    written behind to Postgres in order. On startup the journal entries Postgres
+    has not seen yet are replayed, so a crash loses nothing that was journaled.
+    """
+    def __init__(
+        self,
+        journal_path: str = LEDGER_JOURNAL_PATH,
+        flush_interval: float = LEDGER_FLUSH_INTERVAL,
+        fsync: str = LEDGER_FSYNC
+    ):
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._balances: Dict[int, LedgerBalance] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._seq = 0
+        self._pending: List[Dict[str, Any]] = []  # journaled, not yet in Postgres
+        self._journal = None
+        # Journal files replaced by a compaction, closed once no fsync is using them
+        self._retired: List[Any] = []
+        self._fsyncs_in_flight = 0
+        self._session_factory: Optional[sessionmaker] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending_count(self) -> int:
+        """Number of journaled changes not yet written to Postgres"""
+        return len(self._pending)
+
+    def get(self, account_id: int) -> Optional[LedgerBalance]:
+        """Current balances of an account, or None if the ledger doesn't hold it"""
+        return self._balances.get(account_id)
+
+    async def load(self, account_id: int) -> Optional[LedgerBalance]:
+        """
+        Current balances of an account, reading it from Postgres if it was created
+        after the ledger started. Returns None if the account doesn't exist.
+        """
+        balance = self._balances.get(account_id)
+        if balance is not None or self._session_factory is None:
+            return balance
+
+        async with self._session_factory() as session:
+            rows = await AccountRepository(session).get_ledger_state([account_id])
+        async with self._lock(account_id):
+            # Another request may have loaded and changed it meanwhile
+            if account_id not in self._balances and rows:
+                self._balances[account_id] = LedgerBalance(rows[0].id, rows[0].cash_balance, rows[0].btc_balance)
+            return self._balances.get(account_id)
+
+    async def start(self, session_factory: sessionmaker):
+        """
+        Load balances from Postgres, replay the journal tail and start the write-behind loop
+        """
+        self._session_factory = session_factory
+        async with session_factory() as session:
+            rows = await AccountRepository(session).get_ledger_state()
+
+        persisted_seq = {}
+        for row in rows:
+            self._balances[row.id] = LedgerBalance(row.id, row.cash_balance, row.btc_balance)
+            persisted_seq[row.id] = row.ledger_seq
+        self._seq = max(persisted_seq.values(), default=0)
+
+        for entry in self._read_journal():
+            self._seq = max(self._seq, entry["seq"])
+            account_id = entry["account_id"]
+            if account_id in persisted_seq and entry["seq"] > persisted_seq[account_id]:
+                self._balances[account_id] = LedgerBalance(account_id, entry["cash_balance"], entry["btc_balance"])
+                self._pending.append(entry)
+        if self._pending:
+            logger.info("Replayed %d ledger journal entries", len(self._pending))
+
+        # Start a fresh journal holding only the entries still owed to Postgres,
+        # which also drops any torn write left by the crash
+        self._rewrite_journal(self._pending, fsync=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the write-behind loop after a final flush
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        self._journal.close()
+        self._journal = None
+        self._close_retired()
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.journal_path):
+            return []
+        entries = []
+        with open(self.journal_path) as journal:
+            for line in journal:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn final write from a crash; everything before it is intact
+                    logger.warning("Ignoring corrupt ledger journal line")
+                    break
+        return entries
+
+    def _rewrite_journal(self, entries: List[Dict[str, Any]], fsync: bool):
+        """Atomically replace the journal with one holding just `entries`, and append to it from now on"""
+        with open(self.journal_path + ".tmp", "w") as journal:
+            journal.writelines(json.dumps(entry) + "\n" for entry in entries)
+            journal.flush()
+            if fsync:
+                os.fsync(journal.fileno())
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        if self._journal is not None:
+            self._retired.append(self._journal)
+        self._journal = open(self.journal_path, "a")
+        self._close_retired()
+
+    async def _fsync(self, journal):
+        self._fsyncs_in_flight += 1
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, journal.fileno())
+        finally:
+            self._fsyncs_in_flight -= 1
+            self._close_retired()
+
+    def _close_retired(self):
+        if self._fsyncs_in_flight:
+            return
+        for journal in self._retired:
+            journal.close()
+        self._retired.clear()
+
+    def _lock(self, account_id: int) -> asyncio.Lock:
+        lock = self._locks.get(account_id)
+        if lock is None:
+            lock = self._locks[account_id] = asyncio.Lock()
+        return lock
+
+    async def apply(
+        self,
+        account_id: int,
+        cash_delta: float,
+        btc_delta: float,
+        force: bool = False
+    ) -> Optional[LedgerBalance]:
+        """
+        Apply balance deltas if neither balance would go negative (unless forced).
+        Returns the new balances, or None if the account is unknown or funds are insufficient.
+        """
+        async with self._lock(account_id):
+            balance = self._balances.get(account_id)
+            if balance is None:
+                return None
+            if not force and (
+                (cash_delta < 0 and balance.cash_balance < -cash_delta)
+                or (btc_delta < 0 and balance.btc_balance < -btc_delta)
+            ):
+                return None
+
+            self._seq += 1
+            new_balance = LedgerBalance(account_id, balance.cash_balance + cash_delta, balance.btc_balance + btc_delta)
+            entry = {
+                "seq": self._seq,
+                "account_id": account_id,
+                "cash_delta": cash_delta,
+                "btc_delta": btc_delta,
+                "cash_balance": new_balance.cash_balance,
+                "btc_balance": new_balance.btc_balance,
+            }
+            # Journal and queue the entry without yielding in between, so a flush
+            # never finds it in the journal but not in `_pending`
+            self._journal.write(json.dumps(entry) + "\n")
+            self._journal.flush()
+            self._balances[account_id] = new_balance
+            self._pending.append(entry)
+            if self.fsync == "always":
+                await self._fsync(self._journal)
+            return new_balance
+
+    async def flush(self):
+        """
+        Write the latest journaled balances of each changed account to Postgres
+        """
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        latest: Dict[int, Dict[str, Any]] = {}
+        for entry in batch:
+            latest[entry["account_id"]] = entry
+
+        try:
+            with stage("ledger_flush"):
+                if self.fsync != "always":
+                    await self._fsync(self._journal)
+                async with self._session_factory() as session:
+                    await AccountRepository(session).save_ledger_balances(list(latest.values()))
+        except BaseException as exc:
+            # Also when cancelled mid-write: saving is idempotent, so retrying is safe
+            self._pending = batch + self._pending
+            if not isinstance(exc, Exception):
+                raise
+            logger.error("Ledger write-behind failed, will retry", exc_info=True)
+            return
+
+        # Compact the journal down to the entries newer than this batch, i.e. the ones
+        # journaled while it was written; everything up to the batch is in Postgres.
+        # Only with fsync "always" may those already have been acknowledged as durable.
+        if self._pending:
+            self._rewrite_journal(self._pending, fsync=self.fsync == "always")
+        else:
+            self._journal.seek(0)
+            self._journal.truncate()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+# App-scoped ledger, only started when LEDGER_MODE is enabled
+ledger_service = LedgerService()
+QUEUE_DEPTH.labels("ledger_pending").set_function(lambda: ledger_service.pending_count)
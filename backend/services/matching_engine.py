@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from config import MATCHING_FILL_CONCURRENCY
+from metrics import QUEUE_DEPTH, stage
+from services.price_feed import PriceFeed, PriceTick
+
+logger = logging.getLogger(__name__)
+
+ORDER_KINDS = ("limit", "stop")
+
+class RestingOrder(NamedTuple):
+    order_id: int
+    account_id: int
+    type: str  # "buy" or "sell"
+    kind: str  # "limit" or "stop"
+    amount: float
+    trigger_price: float
+
+# Fill the triggered orders of one account at the given price
+FillOrders = Callable[[int, List[RestingOrder], float], Awaitable[None]]
+
+def triggers_on_fall(type: str, kind: str) -> bool:
+    """Buy limits and sell stops trigger once the price falls to them, the others once it rises"""
+    return (type == "buy") == (kind == "limit")
+
+class MatchingEngine:
+    """
+    Holds resting limit and stop orders in one heap per side and kind, ordered by
+    how small a price move triggers them. A tick pops only the triggered prefix of
+    each heap, O(k log n) for k triggered orders, and the fills run through the
+    regular trade paths.
+    """
+    def __init__(self, fill_concurrency: int = MATCHING_FILL_CONCURRENCY):
+        self.fill_concurrency = fill_concurrency
+        # Entries are (key, order_id); the key is the trigger price, negated for orders
+        # triggering on a fall, so the top of every heap is the next order to trigger
+        self._books: Dict[Tuple[str, str], List[Tuple[float, int]]] = {
+            (type, kind): [] for type in ("buy", "sell") for kind in ORDER_KINDS
+        }
+        self._resting: Dict[int, RestingOrder] = {}
+        self._stale = 0  # heap entries of cancelled orders, discarded lazily
+        self._price: Optional[float] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._fill_orders: Optional[FillOrders] = None
+        self._price_feed: Optional[PriceFeed] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def resting_count(self) -> int:
+        """Number of orders waiting to trigger"""
+        return len(self._resting)
+
+    def add(self, order: RestingOrder):
+        """Rest an order until a price tick triggers it"""
+        self._rest(order)
+        # Match it against the latest price now rather than on the next tick
+        if self._wake is not None and self._price is not None:
+            self._wake.set()
+
+    def _rest(self, order: RestingOrder):
+        key = -order.trigger_price if triggers_on_fall(order.type, order.kind) else order.trigger_price
+        self._resting[order.order_id] = order
+        heapq.heappush(self._books[(order.type, order.kind)], (key, order.order_id))
+
+    def cancel(self, order_id: int) -> bool:
+        """Stop an order from triggering; its heap entry is skipped when it reaches the top"""
+        if self._resting.pop(order_id, None) is None:
+            return False
+        self._stale += 1
+        if self._stale > 1024 and self._stale > len(self._resting):
+            self._compact()
+        return True
+
+    def _compact(self):
+        # Rebuild the heaps without cancelled entries, so mass cancellations don't keep them bloated
+        for book in self._books.values():
+            book[:] = [entry for entry in book if entry[1] in self._resting]
+            heapq.heapify(book)
+        self._stale = 0
+
+    def triggered(self, price: float) -> List[RestingOrder]:
+        """Remove and return every resting order the price triggers, most favourable trigger first"""
+        orders = []
+        for (type, kind), book in self._books.items():
+            falling = triggers_on_fall(type, kind)
+            while book:
+                key, order_id = book[0]
+                if (price > -key) if falling else (price < key):
+                    break
+                heapq.heappop(book)
+                order = self._resting.pop(order_id, None)
+                if order is None:
+                    self._stale -= 1
+                else:
+                    orders.append(order)
+        return orders
+
+    def _on_tick(self, tick: PriceTick):
+        self._price = tick.price
+        self._wake.set()
+
+    async def start(self, price_feed: PriceFeed, fill_orders: FillOrders, orders: List[RestingOrder]):
+        """
+        Load the pending orders and start matching them against every new tick
+        """
+        self._fill_orders = fill_orders
+        for order in orders:
+            self._rest(order)
+        self._wake = asyncio.Event()
+        self._price_feed = price_feed
+        price_feed.subscribe(self._on_tick)
+        if price_feed.latest:
+            self._on_tick(price_feed.latest)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop matching; pending orders stay in the database and are reloaded on start
+        """
+        if self._task is None:
+            return
+        self._price_feed.unsubscribe(self._on_tick)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            # Ticks arriving while a round of fills runs collapse into one round at the newest price
+            self._wake.clear()
+            price = self._price
+            orders = self.triggered(price)
+            if orders:
+                await self.fill(orders, price)
+
+    async def fill(self, orders: List[RestingOrder], price: float):
+        """
+        Fill triggered orders, accounts in parallel and each account's orders in trigger order
+        """
+        by_account: Dict[int, List[RestingOrder]] = defaultdict(list)
+        for order in orders:
+            by_account[order.account_id].append(order)
+        semaphore = asyncio.Semaphore(self.fill_concurrency)
+
+        async def fill_account(account_id: int, account_orders: List[RestingOrder]):
+            async with semaphore:
+                try:
+                    with stage("matching_fill"):
+                        await self._fill_orders(account_id, account_orders, price)
+                except Exception:
+                    logger.error("Filling orders of account %s failed, will retry", account_id, exc_info=True)
+                    # Fills are guarded on the pending status, so retrying the whole set
+                    # on the next tick is safe
+                    for order in account_orders:
+                        self._rest(order)
+
+        await asyncio.gather(*(
+            fill_account(account_id, account_orders) for account_id, account_orders in by_account.items()
+        ))
+
+# App-scoped engine, fed by the price feed
+matching_engine = MatchingEngine()
+QUEUE_DEPTH.labels("resting_orders").set_function(lambda: matching_engine.resting_count)
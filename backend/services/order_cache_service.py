@@ -0,0 +1,225 @@
+import datetime
+import gzip
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import orjson
+import redis.asyncio as redis
+from config import ORDER_PAGE_MAX, ORDER_CACHE_TTL
+from metrics import cache_lookup, stage
+
+# Bump whenever the cached order representation changes, forcing a rebuild
+CACHE_VERSION = "4"
+
+# Statuses with a cached window of their own, besides the unfiltered one: the
+# filtered pages the web UI reads
+CACHED_STATUSES = ("open", "closed")
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# The last gzipped body of each cached page served by this process, keyed by window
+# and limit, so an unchanged page is compressed once rather than on every hit
+_compressed_pages: "OrderedDict[Tuple[str, int], Tuple[bytes, bytes]]" = OrderedDict()
+_COMPRESSED_PAGES_MAX = 1024
+
+# KEYS: version, index, orders, complete  ARGV: version, limit
+_GET_PAGE = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return false end
+local ids = redis.call('ZREVRANGE', KEYS[2], 0, tonumber(ARGV[2]) - 1)
+-- A short page is only the whole story if nothing was ever evicted past the window
+if #ids < tonumber(ARGV[2]) and redis.call('GET', KEYS[4]) ~= '1' then return false end
+if #ids == 0 then return {} end
+return redis.call('HMGET', KEYS[3], unpack(ids))
+"""
+
+# KEYS: generation, then (version, index, orders, complete) per window
+# ARGV: version, window, window count, each window's status ('' for all orders),
+#       then (mode, score, member, json, status) per order, mode being 'add' or 'update'
+_APPLY = """
+-- Whether the window holds every order down to `score`: all of them if it is
+-- complete, else the newest ones down to its oldest entry
+local function covers(index, complete, score)
+  if redis.call('GET', complete) == '1' then return true end
+  local oldest = redis.call('ZRANGE', index, 0, 0, 'WITHSCORES')
+  return #oldest > 0 and tonumber(score) >= tonumber(oldest[2])
+end
+
+redis.call('INCR', KEYS[1])
+local windows = tonumber(ARGV[3])
+local first = 4 + windows
+for w = 1, windows do
+  local version, index, orders, complete = KEYS[w * 4 - 2], KEYS[w * 4 - 1], KEYS[w * 4], KEYS[w * 4 + 1]
+  local status = ARGV[3 + w]
+  if redis.call('GET', version) == ARGV[1] then
+    for i = first, #ARGV, 5 do
+      local mode, score, member, json, order_status = ARGV[i], ARGV[i + 1], ARGV[i + 2], ARGV[i + 3], ARGV[i + 4]
+      if status == '' or order_status == status then
+        if redis.call('ZSCORE', index, member) then
+          redis.call('HSET', orders, member, json)
+        elseif (mode == 'add' or status ~= '') and covers(index, complete, score) then
+          redis.call('ZADD', index, score, member)
+          redis.call('HSET', orders, member, json)
+        end
+      elseif redis.call('ZREM', index, member) == 1 then
+        redis.call('HDEL', orders, member)
+      end
+    end
+    local excess = redis.call('ZCARD', index) - tonumber(ARGV[2])
+    if excess > 0 then
+      local evicted = redis.call('ZRANGE', index, 0, excess - 1)
+      redis.call('ZREMRANGEBYRANK', index, 0, excess - 1)
+      for _, member in ipairs(evicted) do redis.call('HDEL', orders, member) end
+      redis.call('SET', complete, '0')
+    end
+  end
+end
+return 1
+"""
+
+# KEYS: version, index, orders, complete, generation  ARGV: version, generation, ttl, complete, (score, member, json)...
+_REBUILD = """
+if (redis.call('GET', KEYS[5]) or '0') ~= ARGV[2] then return 0 end
+redis.call('DEL', KEYS[2], KEYS[3])
+for i = 5, #ARGV, 3 do
+  redis.call('ZADD', KEYS[2], ARGV[i], ARGV[i + 1])
+  redis.call('HSET', KEYS[3], ARGV[i + 1], ARGV[i + 2])
+end
+redis.call('SET', KEYS[4], ARGV[4])
+redis.call('SET', KEYS[1], ARGV[1])
+for i = 1, 4 do redis.call('EXPIRE', KEYS[i], ARGV[3]) end
+return 1
+"""
+
+class OrderCacheService:
+    """
+    Keeps an account's newest orders warm in Redis, in one window for all orders and
+    one per status in CACHED_STATUSES. Each window is a sorted set of order ids scored
+    by creation time, plus a hash of order id to the order's JSON, exactly as the API
+    returns it. Trades add, patch or move entries between windows in place, so only a
+    version mismatch forces a rebuild; windows also expire `ttl` seconds after their
+    rebuild, which bounds how long a lost update can leave them stale.
+    """
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        prefix: str = "order_history",
+        window: int = ORDER_PAGE_MAX,
+        ttl: int = ORDER_CACHE_TTL
+    ):
+        self.redis_client = redis_client
+        self.window = window
+        self.ttl = ttl
+        self.prefix = prefix
+        self.generation_key = f"{prefix}:generation"
+        self._get_page = redis_client.register_script(_GET_PAGE)
+        self._apply = redis_client.register_script(_APPLY)
+        self._rebuild = redis_client.register_script(_REBUILD)
+
+    @classmethod
+    def for_account(cls, redis_client: redis.Redis, account_id: int) -> "OrderCacheService":
+        """The order history cache of one account"""
+        return cls(redis_client, prefix=f"order_history:{account_id}")
+
+    def window_keys(self, status: Optional[str] = None) -> List[str]:
+        """The version, index, orders and complete keys of a window"""
+        prefix = f"{self.prefix}:{status}" if status else self.prefix
+        return [f"{prefix}:version", f"{prefix}:index", f"{prefix}:orders", f"{prefix}:complete"]
+
+    @staticmethod
+    def _member(order: Dict[str, Any]) -> str:
+        # Zero-padded so ties on created_at sort by id, like the (created_at, id) keyset
+        return f"{order['id']:012d}"
+
+    @staticmethod
+    def _score(order: Dict[str, Any]) -> int:
+        created_at = datetime.datetime.fromisoformat(order["created_at"])
+        return (created_at - _EPOCH) // datetime.timedelta(microseconds=1)
+
+    def _entries(self, orders: Iterable[Dict[str, Any]]) -> List[Any]:
+        args: List[Any] = []
+        for order in orders:
+            args += [self._score(order), self._member(order), orjson.dumps(order)]
+        return args
+
+    async def get_page(self, limit: int, status: Optional[str] = None) -> Optional[List[bytes]]:
+        """
+        Get the newest `limit` orders (of one cached status) as encoded JSON, or None if
+        the window needs a rebuild
+        """
+        with stage("redis_order_cache"):
+            values = await self._get_page(keys=self.window_keys(status), args=[CACHE_VERSION, limit])
+        if values is None or any(value is None for value in values):
+            cache_lookup("order_history", False)
+            return None
+        cache_lookup("order_history", True)
+        return values
+
+    def compress_page(self, body: bytes, limit: int, status: Optional[str] = None) -> bytes:
+        """
+        gzip a page joined from get_page, reusing the compressed body of the last
+        identical page of the window
+        """
+        key = (self.window_keys(status)[0], limit)
+        cached = _compressed_pages.get(key)
+        if cached is not None and cached[0] == body:
+            _compressed_pages.move_to_end(key)
+            return cached[1]
+        with stage("gzip_order_page"):
+            compressed = gzip.compress(body)
+        _compressed_pages[key] = (body, compressed)
+        _compressed_pages.move_to_end(key)
+        if len(_compressed_pages) > _COMPRESSED_PAGES_MAX:
+            _compressed_pages.popitem(last=False)
+        return compressed
+
+    async def generation(self) -> int:
+        """
+        Read the mutation counter. Pass it to rebuild so a rebuild that raced a trade is discarded.
+        """
+        value = await self.redis_client.get(self.generation_key)
+        return int(value) if value else 0
+
+    async def rebuild(self, orders: List[Dict[str, Any]], generation: int, status: Optional[str] = None) -> bool:
+        """
+        Replace a window with the newest orders (of one cached status) read from the
+        database, unless a trade happened since `generation`
+        """
+        # Fewer orders than the window means these are all of them
+        complete = "1" if len(orders) < self.window else "0"
+        with stage("redis_order_cache"):
+            applied = await self._rebuild(
+                keys=self.window_keys(status) + [self.generation_key],
+                args=[CACHE_VERSION, generation, self.ttl, complete] + self._entries(orders[:self.window])
+            )
+        return bool(applied)
+
+    async def _apply_changes(self, mode: str, orders: List[Dict[str, Any]]) -> bool:
+        statuses = (None,) + CACHED_STATUSES
+        keys = [self.generation_key]
+        for status in statuses:
+            keys += self.window_keys(status)
+        args: List[Any] = [CACHE_VERSION, self.window, len(statuses)] + [status or "" for status in statuses]
+        for order in orders:
+            args += [mode, self._score(order), self._member(order), orjson.dumps(order), order["status"]]
+        with stage("redis_order_cache"):
+            applied = await self._apply(keys=keys, args=args)
+        return bool(applied)
+
+    async def add_orders(self, orders: List[Dict[str, Any]]) -> bool:
+        """
+        Add new orders to the windows they belong in, evicting the oldest beyond each window
+        """
+        return await self._apply_changes("add", orders)
+
+    async def update_orders(self, orders: List[Dict[str, Any]]) -> bool:
+        """
+        Patch changed orders in place, e.g. status and closed_at on close, moving them
+        between status windows
+        """
+        return await self._apply_changes("update", orders)
+
+    async def invalidate(self):
+        """
+        Drop the version markers so the next readers rebuild from the database
+        """
+        with stage("redis_order_cache"):
+            await self.redis_client.delete(*(self.window_keys(status)[0] for status in (None,) + CACHED_STATUSES))
@@ -1,12 +1,18 @@
+import base64
 import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+import orjson
 from fastapi import HTTPException, BackgroundTasks
-from pymongo import MongoClient
-from config import MONGODB_URL, MONGODB_DB
+from config import ORDER_PAGE_SIZE, ORDER_PAGE_MAX, GZIP_MIN_SIZE
 from repositories.orders_repo import OrderRepository
 from services.account_service import AccountService
 from services.price_service import PriceService
 from services.cache_service import CacheService
+from services.order_cache_service import OrderCacheService, CACHED_STATUSES
+from services.trade_log_service import TradeLogService, trade_log_service
+from services.portfolio_service import OpenBookCache, open_books
+from services.matching_engine import MatchingEngine, RestingOrder, ORDER_KINDS, matching_engine
+from services.journal_service import Event, JournalService, balance_event, order_event
 
 class OrderService:
     def __init__(
@@ -14,76 +20,163 @@ class OrderService:
         order_repo: OrderRepository, 
         account_service: AccountService,
         cache_service: CacheService,
-        background_tasks: BackgroundTasks = None
+        background_tasks: BackgroundTasks = None,
+        trade_log: TradeLogService = None,
+        order_cache: OrderCacheService = None,
+        books: OpenBookCache = None,
+        engine: MatchingEngine = None,
+        journal: JournalService = None
     ):
         self.order_repo = order_repo
         self.account_service = account_service
         self.cache_service = cache_service
         self.background_tasks = background_tasks
-        
-        # MongoDB setup
-        self.mongo_client = MongoClient(MONGODB_URL)
-        self.db = self.mongo_client[MONGODB_DB]
-        self.trade_logs_collection = self.db["trade_logs"]
+        self.trade_log = trade_log or trade_log_service
+        self.order_cache = order_cache or OrderCacheService.for_account(
+            cache_service.redis_client, order_repo.account_id
+        )
+        self.books = books or open_books
+        self.matching_engine = engine or matching_engine
+        # Without a journal (JOURNAL_ENABLED off) trades aren't journaled
+        self.journal = journal
     
-    async def get_order_history(self) -> List[Dict[str, Any]]:
+    @staticmethod
+    def encode_cursor(order: Dict[str, Any]) -> str:
         """
-        Get the order history, using cache if available
+        Encode the (created_at, id) position of an order as an opaque cursor
         """
-        cached = await self.cache_service.get_json("order_history")
-        if cached:
-            return cached
-            
-        orders = await self.order_repo.get_all_orders()
-        orders_json = [
-            {
-                "id": order.id,
-                "type": order.type,
-                "amount": order.amount,
-                "price": order.price,
-                "status": order.status,
-                "created_at": order.created_at.isoformat(),
-                "closed_at": order.closed_at.isoformat() if order.closed_at else None,
-            }
-            for order in orders
-        ]
-        
-        # Cache the order history for 30 seconds
-        await self.cache_service.set_json("order_history", orders_json, 30)
-        return orders_json
+        raw = f"{order['created_at']}|{order['id']}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+        """
+        Decode a cursor produced by encode_cursor
+        """
+        try:
+            created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.datetime.fromisoformat(created_at), int(order_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def get_order_history(
+        self,
+        limit: int = ORDER_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        type: Optional[str] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None,
+        accept_gzip: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Get a page of the order history, newest first, as the encoded JSON array to send,
+        its content encoding and the cursor for the next page. The first page, unfiltered
+        or of a cached status, is served from cache when available, joining the cached
+        entries without decoding them, and already gzipped if the client accepts it.
+        """
+        first_page = (
+            not any((cursor, type, created_from, created_to))
+            and status in (None,) + CACHED_STATUSES
+            and limit <= ORDER_PAGE_MAX
+        )
+        if first_page:
+            entries = await self.order_cache.get_page(limit, status)
+            if entries is not None:
+                # Only the last order is decoded, for the cursor
+                next_cursor = self.encode_cursor(orjson.loads(entries[-1])) if len(entries) == limit else None
+                body = b"[" + b",".join(entries) + b"]"
+                if accept_gzip and len(body) >= GZIP_MIN_SIZE:
+                    body = self.order_cache.compress_page(body, limit, status)
+                    return {"body": body, "encoding": "gzip", "next_cursor": next_cursor}
+                return {"body": body, "encoding": None, "next_cursor": next_cursor}
+
+            # Rebuild the cached window, unless a trade lands while we read it. It is read from
+            # the primary: a lagging replica could leave the shared cache without the newest orders
+            generation = await self.order_cache.generation()
+            orders = await self.order_repo.list_orders(ORDER_PAGE_MAX, status=status, primary=True)
+            orders_json = [self.serialize_order(order) for order in orders]
+            await self.order_cache.rebuild(orders_json, generation, status)
+            orders_json = orders_json[:limit]
+        else:
+            orders = await self.order_repo.list_orders(
+                limit,
+                cursor=self.decode_cursor(cursor) if cursor else None,
+                status=status,
+                type=type,
+                created_from=created_from,
+                created_to=created_to
+            )
+            orders_json = [self.serialize_order(order) for order in orders]
+
+        next_cursor = self.encode_cursor(orders_json[-1]) if len(orders_json) == limit else None
+        return {"body": orjson.dumps(orders_json), "encoding": None, "next_cursor": next_cursor}
+
+    @staticmethod
+    def serialize_order(order) -> Dict[str, Any]:
+        """
+        Convert an order row into its JSON representation, matching TradeOrderResponse
+        field for field, since order history is sent without re-validation
+        """
+        return {
+            "id": order.id,
+            "type": order.type,
+            "kind": order.kind,
+            "amount": order.amount,
+            "price": order.price,
+            "trigger_price": order.trigger_price,
+            "status": order.status,
+            "created_at": order.created_at.isoformat(),
+            "closed_at": order.closed_at.isoformat() if order.closed_at else None,
+        }
     
-    async def invalidate_order_cache(self):
+    async def record_events(self, events: List[Event]):
         """
-        Invalidate the order history cache
+        Append events to the account's journal, in the current unit of work
         """
-        await self.cache_service.delete("order_history")
+        if self.journal:
+            await self.journal.record(events)
     
     async def log_trade_action(self, log_entry: Dict[str, Any]):
         """
-        Log a trade action to MongoDB
+        Queue a trade action for the batched MongoDB writer
         """
-        self.trade_logs_collection.insert_one(log_entry)
+        await self.trade_log.submit(log_entry)
     
-    async def create_trade(self, trade_type: str, amount: float) -> Dict[str, Any]:
+    async def create_trade(
+        self,
+        trade_type: str,
+        amount: float,
+        kind: str = "market",
+        trigger_price: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
-        Create a new trade order
+        Create a new trade order, at the live price or resting until its trigger price
         """
-        price = await PriceService.fetch_live_price()
-        
         if trade_type.lower() not in ["buy", "sell"]:
             raise HTTPException(status_code=400, detail="Invalid trade type")
+        if kind != "market":
+            return await self.place_resting_order(trade_type.lower(), amount, kind, trigger_price)
         
-        # Update account based on trade type
-        if trade_type.lower() == "buy":
-            account = await self.account_service.process_buy(amount, price)
-        else:  # sell
-            account = await self.account_service.process_sell(amount, price)
+        price = await PriceService.get_price()
+        
+        # Update the account and create the order in a single transaction
+        async with self.order_repo.unit_of_work():
+            if trade_type.lower() == "buy":
+                account = await self.account_service.process_buy(amount, price)
+            else:  # sell
+                account = await self.account_service.process_sell(amount, price)
             
-        # Create the order
-        new_order = await self.order_repo.create_order(trade_type, amount, price)
+            new_order = await self.order_repo.create_order(trade_type, amount, price)
+            await self.record_events([
+                order_event("order_opened", self.serialize_order(new_order)),
+                balance_event("balance_changed", account)
+            ])
+        self.books.invalidate(self.order_repo.account_id)
         
         # Log the action
         log_entry = {
+            "account_id": self.order_repo.account_id,
             "order_id": new_order.id,
             "action": "create",
             "type": trade_type,
@@ -95,37 +188,259 @@ class OrderService:
         
         if self.background_tasks:
             self.background_tasks.add_task(self.log_trade_action, log_entry)
-            self.background_tasks.add_task(self.invalidate_order_cache)
+            self.background_tasks.add_task(self.order_cache.add_orders, [self.serialize_order(new_order)])
         
         return {
             "order_id": new_order.id,
             "price": price,
+            "status": new_order.status,
             "timestamp": new_order.created_at,
             "account": {"cash_balance": account.cash_balance, "btc_balance": account.btc_balance}
         }
     
-    async def close_trade(self, order_id: int) -> Dict[str, Any]:
+    async def place_resting_order(
+        self,
+        trade_type: str,
+        amount: float,
+        kind: str,
+        trigger_price: Optional[float]
+    ) -> Dict[str, Any]:
         """
-        Close an existing trade order
+        Rest a limit or stop order in the matching engine. Balances only change when it fills.
+        """
+        if kind not in ORDER_KINDS:
+            raise HTTPException(status_code=400, detail="Invalid order kind")
+        if trigger_price is None or trigger_price <= 0:
+            raise HTTPException(status_code=400, detail="Limit and stop orders need a positive trigger_price")
+        
+        # Fails with a 404 before an order is rested for an account that doesn't exist
+        account = await self.account_service.get_account_details()
+        
+        async with self.order_repo.unit_of_work():
+            new_order = await self.order_repo.create_order(
+                trade_type, amount, trigger_price, kind=kind, trigger_price=trigger_price, status="pending"
+            )
+            await self.record_events([order_event("order_placed", self.serialize_order(new_order))])
+        self.matching_engine.add(
+            RestingOrder(new_order.id, self.order_repo.account_id, trade_type, kind, amount, trigger_price)
+        )
+        
+        log_entry = {
+            "account_id": self.order_repo.account_id,
+            "order_id": new_order.id,
+            "action": "place",
+            "type": trade_type,
+            "kind": kind,
+            "amount": amount,
+            "trigger_price": trigger_price,
+            "status": "pending",
+            "timestamp": datetime.datetime.utcnow()
+        }
+        
+        if self.background_tasks:
+            self.background_tasks.add_task(self.log_trade_action, log_entry)
+            self.background_tasks.add_task(self.order_cache.add_orders, [self.serialize_order(new_order)])
+        
+        return {
+            "order_id": new_order.id,
+            "price": trigger_price,
+            "status": new_order.status,
+            "timestamp": new_order.created_at,
+            "account": {"cash_balance": account.cash_balance, "btc_balance": account.btc_balance}
+        }
+    
+    async def cancel_order(self, order_id: int) -> Dict[str, Any]:
+        """
+        Cancel a pending limit or stop order
         """
-        current_price = await PriceService.fetch_live_price()
+        async with self.order_repo.unit_of_work():
+            order = await self.order_repo.cancel_order(order_id)
+            if not order:
+                raise HTTPException(status_code=404, detail="Pending order not found")
+            await self.record_events([order_event("order_cancelled", self.serialize_order(order))])
+        self.matching_engine.cancel(order.id)
         
-        # Get the order
-        order = await self.order_repo.get_open_order_by_id(order_id)
-        if not order:
-            raise HTTPException(status_code=404, detail="Open order not found")
+        log_entry = {
+            "account_id": self.order_repo.account_id,
+            "order_id": order.id,
+            "action": "cancel",
+            "timestamp": order.closed_at,
+        }
+        
+        if self.background_tasks:
+            self.background_tasks.add_task(self.log_trade_action, log_entry)
+            self.background_tasks.add_task(self.order_cache.update_orders, [self.serialize_order(order)])
+        
+        return {"order_id": order.id, "status": order.status, "timestamp": order.closed_at}
+    
+    async def fill_orders(self, orders: List[RestingOrder], price: float) -> List[Any]:
+        """
+        Fill triggered limit and stop orders at `price`, each in its own transaction,
+        so an order the account can no longer fund is rejected without holding back the rest
+        """
+        filled, rejected = [], []
+        for resting in orders:
+            try:
+                async with self.order_repo.unit_of_work():
+                    order = await self.order_repo.fill_order(resting.order_id, price)
+                    if order is None:
+                        # Cancelled after it triggered
+                        continue
+                    if resting.type == "buy":
+                        account = await self.account_service.process_buy(resting.amount, price)
+                    else:  # sell
+                        account = await self.account_service.process_sell(resting.amount, price)
+                    await self.record_events([
+                        order_event("order_filled", self.serialize_order(order)),
+                        balance_event("balance_changed", account)
+                    ])
+                filled.append(order)
+            except HTTPException as exc:
+                # Client errors (low funds, a deleted account) won't clear on retry
+                if not 400 <= exc.status_code < 500:
+                    raise
+                async with self.order_repo.unit_of_work():
+                    order = await self.order_repo.reject_order(resting.order_id)
+                    if order:
+                        await self.record_events([order_event("order_rejected", self.serialize_order(order))])
+                if order:
+                    rejected.append(order)
+        if filled:
+            self.books.invalidate(self.order_repo.account_id)
+        
+        timestamp = datetime.datetime.utcnow()
+        log_entries = [
+            {
+                "account_id": self.order_repo.account_id,
+                "order_id": order.id,
+                "action": "fill",
+                "price": price,
+                "status": "open",
+                "timestamp": timestamp
+            }
+            for order in filled
+        ] + [
+            {
+                "account_id": self.order_repo.account_id,
+                "order_id": order.id,
+                "action": "reject",
+                "status": "rejected",
+                "timestamp": timestamp
+            }
+            for order in rejected
+        ]
+        # Fills run in the matching engine's task, not a request, so there are no background tasks
+        if log_entries:
+            await self.trade_log.submit_many(log_entries)
+            await self.order_cache.update_orders([self.serialize_order(order) for order in filled + rejected])
+        return filled
+    
+    async def create_trades(self, trades: List[Tuple[str, float]]) -> Dict[str, Any]:
+        """
+        Create several trade orders against one price. Feasibility is checked
+        cumulatively in request order; infeasible trades are rejected individually,
+        and the accepted ones are inserted together with one net balance change.
+        """
+        price = await PriceService.get_price()
+        results: List[Dict[str, Any]] = []
+        accepted: List[Tuple[int, str, float]] = []
+        
+        async with self.order_repo.unit_of_work():
+            account = await self.account_service.lock_account()
+            cash_balance, btc_balance = account.cash_balance, account.btc_balance
+            
+            for index, (trade_type, amount) in enumerate(trades):
+                trade_type = trade_type.lower()
+                trade_value = amount * price
+                if trade_type == "buy":
+                    if cash_balance < trade_value:
+                        results.append({"index": index, "status": "rejected", "error": "Insufficient cash balance"})
+                        continue
+                    cash_balance -= trade_value
+                    btc_balance += amount
+                elif trade_type == "sell":
+                    if btc_balance < amount:
+                        results.append({"index": index, "status": "rejected", "error": "Insufficient BTC balance"})
+                        continue
+                    cash_balance += trade_value
+                    btc_balance -= amount
+                else:
+                    results.append({"index": index, "status": "rejected", "error": "Invalid trade type"})
+                    continue
+                accepted.append((index, trade_type, amount))
+            
+            new_orders = []
+            if accepted:
+                new_orders = await self.order_repo.create_orders(
+                    [(trade_type, amount, price) for _, trade_type, amount in accepted]
+                )
+                account = await self.account_service.apply_balance_delta(
+                    cash_balance - account.cash_balance,
+                    btc_balance - account.btc_balance,
+                    "Insufficient balance"
+                )
+                await self.record_events(
+                    [order_event("order_opened", self.serialize_order(order)) for order in new_orders]
+                    + [balance_event("balance_changed", account)]
+                )
+        if new_orders:
+            self.books.invalidate(self.order_repo.account_id)
         
-        # Update account based on order type
-        if order.type.lower() == "buy":
-            account = await self.account_service.close_buy_order(order.amount, current_price)
-        else:  # sell
-            account = await self.account_service.close_sell_order(order.amount, current_price)
+        for (index, _, _), order in zip(accepted, new_orders):
+            results.append({"index": index, "status": "filled", "order_id": order.id})
+        results.sort(key=lambda result: result["index"])
         
-        # Close the order
-        order = await self.order_repo.close_order(order_id)
+        if new_orders and self.background_tasks:
+            log_entries = [
+                {
+                    "account_id": self.order_repo.account_id,
+                    "order_id": order.id,
+                    "action": "create",
+                    "type": order.type,
+                    "amount": order.amount,
+                    "price": price,
+                    "status": "open",
+                    "timestamp": datetime.datetime.utcnow()
+                }
+                for order in new_orders
+            ]
+            self.background_tasks.add_task(self.trade_log.submit_many, log_entries)
+            self.background_tasks.add_task(
+                self.order_cache.add_orders, [self.serialize_order(order) for order in new_orders]
+            )
+        
+        return {
+            "price": price,
+            "timestamp": new_orders[0].created_at if new_orders else datetime.datetime.utcnow(),
+            "results": results,
+            "account": {"cash_balance": account.cash_balance, "btc_balance": account.btc_balance}
+        }
+    
+    async def close_trade(self, order_id: int) -> Dict[str, Any]:
+        """
+        Close an existing trade order
+        """
+        current_price = await PriceService.get_price()
+        
+        # Close the order and update the account in a single transaction
+        async with self.order_repo.unit_of_work():
+            order = await self.order_repo.close_order(order_id)
+            if not order:
+                raise HTTPException(status_code=404, detail="Open order not found")
+            
+            if order.type.lower() == "buy":
+                account = await self.account_service.close_buy_order(order.amount, current_price)
+            else:  # sell
+                account = await self.account_service.close_sell_order(order.amount, current_price)
+            await self.record_events([
+                order_event("order_closed", self.serialize_order(order)),
+                balance_event("balance_changed", account)
+            ])
+        self.books.invalidate(self.order_repo.account_id)
         
         # Log the action
         log_entry = {
+            "account_id": self.order_repo.account_id,
             "order_id": order.id,
             "action": "close",
             "timestamp": datetime.datetime.utcnow(),
@@ -134,7 +449,7 @@ class OrderService:
         
         if self.background_tasks:
             self.background_tasks.add_task(self.log_trade_action, log_entry)
-            self.background_tasks.add_task(self.invalidate_order_cache)
+            self.background_tasks.add_task(self.order_cache.update_orders, [self.serialize_order(order)])
         
         return {
             "order_id": order.id,
@@ -143,3 +458,56 @@ class OrderService:
             "account": {"cash_balance": account.cash_balance, "btc_balance": account.btc_balance},
             "close_price": current_price,
         }
+    
+    async def close_trades(
+        self,
+        order_ids: Optional[List[int]] = None,
+        type: Optional[str] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Close many open orders against one price, applying their combined balance effect once
+        """
+        current_price = await PriceService.get_price()
+        
+        async with self.order_repo.unit_of_work():
+            orders = await self.order_repo.close_orders(order_ids, type, created_from, created_to)
+            if orders:
+                # Closing a buy sells its BTC back, closing a sell buys it back
+                btc_delta = sum(-order.amount if order.type.lower() == "buy" else order.amount for order in orders)
+                account = await self.account_service.apply_balance_delta(
+                    -btc_delta * current_price, btc_delta, "Insufficient balance to close orders"
+                )
+                await self.record_events(
+                    [order_event("order_closed", self.serialize_order(order)) for order in orders]
+                    + [balance_event("balance_changed", account)]
+                )
+            else:
+                account = await self.account_service.get_account_details()
+        if orders:
+            self.books.invalidate(self.order_repo.account_id)
+        
+        timestamp = orders[0].closed_at if orders else datetime.datetime.utcnow()
+        if orders and self.background_tasks:
+            log_entries = [
+                {
+                    "account_id": self.order_repo.account_id,
+                    "order_id": order.id,
+                    "action": "close",
+                    "timestamp": timestamp,
+                    "close_price": current_price,
+                }
+                for order in orders
+            ]
+            self.background_tasks.add_task(self.trade_log.submit_many, log_entries)
+            self.background_tasks.add_task(
+                self.order_cache.update_orders, [self.serialize_order(order) for order in orders]
+            )
+        
+        return {
+            "closed_order_ids": [order.id for order in orders],
+            "close_price": current_price,
+            "timestamp": timestamp,
+            "account": {"cash_balance": account.cash_balance, "btc_balance": account.btc_balance},
+        }
@@ -0,0 +1,141 @@
+import datetime
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+import numpy as np
+from config import PORTFOLIO_CACHE_ACCOUNTS
+from metrics import cache_lookup
+from repositories.orders_repo import OrderRepository
+from services.order_cache_service import OrderCacheService
+from services.price_service import PriceService
+
+class OpenBook:
+    """
+    The open orders of one account as column arrays, plus the valuation at the
+    last price it was marked against
+    """
+    def __init__(self, rows: List[Any], generation: int):
+        count = len(rows)
+        self.generation = generation
+        self.ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=count)
+        self.amounts = np.fromiter((row.amount for row in rows), dtype=np.float64, count=count)
+        self.entry_prices = np.fromiter((row.price for row in rows), dtype=np.float64, count=count)
+        # +1 for a long (buy), -1 for a short (sell)
+        self.sides = np.fromiter(
+            (1.0 if row.type.lower() == "buy" else -1.0 for row in rows), dtype=np.float64, count=count
+        )
+        self.marked_price: Optional[float] = None
+        self.valuation: Optional[Dict[str, Any]] = None
+
+    def mark(self, price: float) -> Dict[str, Any]:
+        """Value every open order against `price` in one vectorized pass, reusing the last result if unchanged"""
+        if self.valuation is not None and self.marked_price == price:
+            return self.valuation
+
+        signed = self.sides * self.amounts
+        pnl = signed * (price - self.entry_prices)
+        notional = self.amounts * self.entry_prices
+        # Slot 0 holds the longs, slot 1 the shorts
+        side_slot = (self.sides < 0).astype(np.int64)
+        side_amounts = np.bincount(side_slot, weights=self.amounts, minlength=2)
+        side_notional = np.bincount(side_slot, weights=notional, minlength=2)
+        vwap = np.divide(side_notional, side_amounts, out=np.full(2, np.nan), where=side_amounts > 0)
+        net_exposure = float(signed.sum())
+
+        self.valuation = {
+            "open_orders": int(self.ids.size),
+            "net_exposure_btc": net_exposure,
+            "gross_exposure_btc": float(self.amounts.sum()),
+            "net_exposure_usd": net_exposure * price,
+            "unrealized_pnl": float(pnl.sum()),
+            "buy_vwap": None if np.isnan(vwap[0]) else float(vwap[0]),
+            "sell_vwap": None if np.isnan(vwap[1]) else float(vwap[1]),
+            "marks": [
+                {
+                    "order_id": order_id,
+                    "type": "buy" if side > 0 else "sell",
+                    "amount": amount,
+                    "entry_price": entry_price,
+                    "mark_value": mark_value,
+                    "unrealized_pnl": order_pnl,
+                }
+                for order_id, side, amount, entry_price, mark_value, order_pnl in zip(
+                    self.ids.tolist(),
+                    self.sides.tolist(),
+                    self.amounts.tolist(),
+                    self.entry_prices.tolist(),
+                    (self.amounts * price).tolist(),
+                    pnl.tolist()
+                )
+            ],
+        }
+        self.marked_price = price
+        return self.valuation
+
+class OpenBookCache:
+    """
+    Least recently used open books, keyed by account. Trades invalidate the
+    book of their account, so a new tick only revalues the cached arrays.
+    """
+    def __init__(self, max_accounts: int = PORTFOLIO_CACHE_ACCOUNTS):
+        self.max_accounts = max_accounts
+        self._books: "OrderedDict[Hashable, OpenBook]" = OrderedDict()
+
+    def get(self, account_id: Hashable) -> Optional[OpenBook]:
+        book = self._books.get(account_id)
+        if book is not None:
+            self._books.move_to_end(account_id)
+        return book
+
+    def put(self, account_id: Hashable, book: OpenBook):
+        self._books[account_id] = book
+        self._books.move_to_end(account_id)
+        while len(self._books) > self.max_accounts:
+            self._books.popitem(last=False)
+
+    def invalidate(self, account_id: Hashable):
+        """Drop an account's book so the next valuation reloads its open orders"""
+        self._books.pop(account_id, None)
+
+    def clear(self):
+        self._books.clear()
+
+class PortfolioService:
+    def __init__(
+        self,
+        order_repo: OrderRepository,
+        order_cache: OrderCacheService,
+        books: OpenBookCache = None
+    ):
+        self.order_repo = order_repo
+        # The order cache generation also moves when another process trades on the account
+        self.order_cache = order_cache
+        self.books = books or open_books
+
+    async def get_open_book(self) -> OpenBook:
+        """
+        Get the open orders as arrays, reloading them only if the account traded since they were cached
+        """
+        account_id = self.order_repo.account_id
+        generation = await self.order_cache.generation()
+        book = self.books.get(account_id)
+        stale = book is None or book.generation != generation
+        cache_lookup("open_book", not stale)
+        if stale:
+            book = OpenBook(await self.order_repo.get_open_positions(), generation)
+            self.books.put(account_id, book)
+        return book
+
+    async def get_portfolio(self, include_marks: bool = True) -> Dict[str, Any]:
+        """
+        Value the open orders against the current price
+        """
+        book = await self.get_open_book()
+        price = await PriceService.get_price()
+        valuation = book.mark(price)
+        portfolio = {"price": price, "timestamp": datetime.datetime.utcnow(), **valuation}
+        if not include_marks:
+            portfolio["marks"] = None
+        return portfolio
+
+# Process-wide cache of open books, invalidated by OrderService on every trade
+open_books = OpenBookCache()
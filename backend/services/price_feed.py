@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class PriceTick(NamedTuple):
+    price: float
+    source_ts: float  # Upstream timestamp of the quote (epoch seconds)
+    sequence: int  # Monotonically increasing per process
+    received_at: float  # time.monotonic() when the tick was recorded
+
+class PriceFeed:
+    """
+    Polls the upstream price at a fixed interval and keeps the latest tick in memory.
+    """
+    def __init__(
+        self,
+        fetch_quote: Callable[[], Awaitable[Tuple[float, float]]],
+        interval: float,
+        max_staleness: float
+    ):
+        self.fetch_quote = fetch_quote
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self._tick: Optional[PriceTick] = None
+        self._sequence = 0
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[PriceTick], None]] = []
+
+    @property
+    def latest(self) -> Optional[PriceTick]:
+        """The most recent tick, regardless of its age"""
+        return self._tick
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def fresh_tick(self, max_staleness: Optional[float] = None) -> Optional[PriceTick]:
+        """Return the latest tick if it is within the staleness budget, else None"""
+        tick = self._tick
+        budget = self.max_staleness if max_staleness is None else max_staleness
+        if tick and time.monotonic() - tick.received_at <= budget:
+            return tick
+        return None
+
+    def subscribe(self, listener: Callable[[PriceTick], None]):
+        """Call `listener` with every new tick. Listeners must not block."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[PriceTick], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def publish(self, price: float, source_ts: Optional[float] = None) -> PriceTick:
+        """Record a new tick, ignoring quotes older than the one already held"""
+        if source_ts is None:
+            source_ts = time.time()
+        if self._tick and source_ts < self._tick.source_ts:
+            return self._tick
+
+        self._sequence += 1
+        self._tick = PriceTick(price, source_ts, self._sequence, time.monotonic())
+        for listener in list(self._listeners):
+            try:
+                listener(self._tick)
+            except Exception:
+                logger.warning("Price tick listener failed", exc_info=True)
+        return self._tick
+
+    def reset(self):
+        """Drop the cached tick"""
+        self._tick = None
+
+    async def refresh(self) -> PriceTick:
+        """Fetch a quote from upstream and publish it"""
+        price, source_ts = await self.fetch_quote()
+        return self.publish(price, source_ts)
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Price poll failed", exc_info=True)
+            # Keep a fixed polling rate regardless of how long the fetch took
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        """Start the background poller on the running event loop"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background poller and wait for it to exit"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,311 @@
+import asyncio
+import collections
+import logging
+import statistics
+import time
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple, Type
+import httpx
+from config import (
+    PRICE_AGGREGATION, PRICE_FETCH_TIMEOUT, PRICE_PROVIDER_TIMEOUT, PRICE_HEDGE_DELAY,
+    PRICE_HEDGE_MIN_DELAY, PRICE_HEDGE_MAX_DELAY, PRICE_BREAKER_FAILURES, PRICE_BREAKER_RESET
+)
+from metrics import PRICE_PROVIDER_OPEN, stage
+
+logger = logging.getLogger(__name__)
+
+# A price and the source's timestamp for it, in epoch seconds
+Quote = Tuple[float, float]
+
+class PriceUnavailable(Exception):
+    """No provider returned a usable quote"""
+
+class PriceProvider:
+    """
+    One upstream source of BTC-USD quotes. Subclasses name the source, give the URL
+    to request and parse its body; a stub can override fetch_quote instead.
+    """
+    name: str = ""
+    url: str = ""
+
+    async def fetch_quote(self, client: httpx.AsyncClient, timeout: float) -> Quote:
+        response = await client.get(self.url, timeout=timeout)
+        return self.parse(response.json())
+
+    def parse(self, data) -> Quote:
+        raise NotImplementedError
+
+class CoindeskProvider(PriceProvider):
+    name = "coindesk"
+    url = "https://data-api.coindesk.com/index/cc/v1/latest/tick?market=cadli&instruments=BTC-USD"
+
+    def parse(self, data) -> Quote:
+        tick = data["Data"]["BTC-USD"]
+        return float(tick["VALUE"]), float(tick.get("VALUE_LAST_UPDATE_TS", time.time()))
+
+class CoinbaseProvider(PriceProvider):
+    name = "coinbase"
+    url = "https://api.coinbase.com/v2/prices/BTC-USD/spot"
+
+    def parse(self, data) -> Quote:
+        # The spot price carries no timestamp
+        return float(data["data"]["amount"]), time.time()
+
+class KrakenProvider(PriceProvider):
+    name = "kraken"
+    url = "https://api.kraken.com/0/public/Ticker?pair=XBTUSD"
+
+    def parse(self, data) -> Quote:
+        if data.get("error"):
+            raise ValueError(f"Kraken error: {data['error']}")
+        ticker = next(iter(data["result"].values()))
+        # "c" is the last trade as [price, volume]
+        return float(ticker["c"][0]), time.time()
+
+class BitstampProvider(PriceProvider):
+    name = "bitstamp"
+    url = "https://www.bitstamp.net/api/v2/ticker/btcusd/"
+
+    def parse(self, data) -> Quote:
+        return float(data["last"]), float(data["timestamp"])
+
+class StaticProvider(PriceProvider):
+    """A local stand-in that answers with a fixed price, after an optional delay"""
+    def __init__(self, price: float = 50000.0, delay: float = 0.0, name: str = "static"):
+        self.price = price
+        self.delay = delay
+        self.name = name
+
+    async def fetch_quote(self, client: httpx.AsyncClient, timeout: float) -> Quote:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.price, time.time()
+
+PROVIDERS: Dict[str, Type[PriceProvider]] = {
+    provider.name: provider
+    for provider in (CoindeskProvider, CoinbaseProvider, KrakenProvider, BitstampProvider, StaticProvider)
+}
+
+def build_providers(names: str) -> List[PriceProvider]:
+    """Providers from a comma-separated list of names, e.g. PRICE_PROVIDERS"""
+    providers = []
+    for name in filter(None, (name.strip() for name in names.split(","))):
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown price provider {name!r}; expected one of {', '.join(PROVIDERS)}")
+        providers.append(PROVIDERS[name]())
+    return providers
+
+class CircuitBreaker:
+    """
+    Stops calling a provider after `failure_threshold` consecutive failures. Once
+    open, one request is let through every `reset_timeout` seconds (half-open); a
+    success closes the breaker again.
+    """
+    def __init__(self, failure_threshold: int = PRICE_BREAKER_FAILURES, reset_timeout: float = PRICE_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        """Whether a request may go out now. Admitting a half-open trial restarts the wait."""
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.reset_timeout:
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class LatencyWindow:
+    """The latencies of a provider's recent successful requests"""
+    def __init__(self, size: int = 100):
+        self._samples: Deque[float] = collections.deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class PriceSource:
+    """A provider with its circuit breaker and latency history"""
+    def __init__(self, provider: PriceProvider, breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyWindow()
+        PRICE_PROVIDER_OPEN.labels(provider.name).set_function(lambda: self.breaker.opened_at is not None)
+
+    def hedge_delay(self) -> float:
+        """How long to wait on this provider before also asking the next: its p95 latency"""
+        p95 = self.latencies.percentile(0.95)
+        if p95 is None:
+            return PRICE_HEDGE_DELAY
+        return min(PRICE_HEDGE_MAX_DELAY, max(PRICE_HEDGE_MIN_DELAY, p95))
+
+class PriceAggregator:
+    """
+    Fetches a quote from a list of providers, in order of preference, skipping any
+    whose circuit breaker is open.
+
+    In "first" mode requests are hedged: the first provider is asked, and if it hasn't
+    answered within its p95 latency (or has failed) the next is asked too, and so on;
+    the first good answer wins and the rest are cancelled. In "median" mode every
+    provider is asked at once and the median price is returned; once one answers, the
+    others get at most their own hedge delay longer.
+
+    Each request gets `provider_timeout` seconds, shorter than the overall `timeout`,
+    so a hanging provider fails and trips its breaker rather than being cancelled
+    every time. A request still running when the overall timeout expires without an
+    answer counts as a failure too; one cancelled because another provider won doesn't.
+    """
+    def __init__(
+        self,
+        providers: Sequence[PriceProvider],
+        get_client: Callable[[], httpx.AsyncClient],
+        mode: str = PRICE_AGGREGATION,
+        timeout: float = PRICE_FETCH_TIMEOUT,
+        provider_timeout: float = PRICE_PROVIDER_TIMEOUT
+    ):
+        if mode not in ("first", "median"):
+            raise ValueError(f"Unknown price aggregation {mode!r}; expected 'first' or 'median'")
+        self.get_client = get_client
+        self.mode = mode
+        self.timeout = timeout
+        self.provider_timeout = min(provider_timeout, timeout)
+        self.use(providers)
+
+    def use(self, providers: Sequence[PriceProvider]):
+        """Replace the providers, e.g. with local stubs, starting with fresh breakers"""
+        self.sources = [PriceSource(provider) for provider in providers]
+
+    async def fetch_quote(self) -> Quote:
+        if self.mode == "median":
+            return await self._median()
+        return await self._first()
+
+    async def _fetch(self, source: PriceSource) -> Quote:
+        started = time.perf_counter()
+        try:
+            with stage(f"{source.provider.name}_fetch"):
+                # Enforced here too, for providers that don't honour the client timeout
+                quote = await asyncio.wait_for(
+                    source.provider.fetch_quote(self.get_client(), self.provider_timeout), self.provider_timeout
+                )
+        except asyncio.CancelledError:
+            # Cancelled by the caller, who decides whether that was a failure
+            raise
+        except Exception:
+            self._record_failure(source)
+            raise
+        source.latencies.record(time.perf_counter() - started)
+        source.breaker.record_success()
+        return quote
+
+    def _record_failure(self, source: PriceSource):
+        was_open = source.breaker.opened_at is not None
+        source.breaker.record_failure()
+        if not was_open and source.breaker.opened_at is not None:
+            logger.warning("Price provider %s failing, opening its circuit breaker", source.provider.name)
+
+    def _abandon(self, pending: Dict[asyncio.Future, PriceSource], timed_out: bool):
+        """Cancel the requests still running, as failures if they ran out the overall timeout"""
+        for task, source in pending.items():
+            task.cancel()
+            if timed_out:
+                self._record_failure(source)
+
+    def _launch(self, sources: List[PriceSource], pending: Dict[asyncio.Future, PriceSource]) -> Optional[PriceSource]:
+        """Start a request to the next provider whose breaker allows one"""
+        while sources:
+            source = sources.pop(0)
+            if source.breaker.allow():
+                pending[asyncio.ensure_future(self._fetch(source))] = source
+                return source
+        return None
+
+    async def _first(self) -> Quote:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        waiting = list(self.sources)
+        pending: Dict[asyncio.Future, PriceSource] = {}
+        hedge_at = deadline
+        quote: Optional[Quote] = None
+        try:
+            launch = True
+            while True:
+                if launch:
+                    source = self._launch(waiting, pending)
+                    if source is not None:
+                        hedge_at = min(deadline, loop.time() + source.hedge_delay())
+                    launch = False
+                if not pending:
+                    break
+                now = loop.time()
+                if now >= deadline:
+                    break
+                wake_at = hedge_at if waiting else deadline
+                done, _ = await asyncio.wait(
+                    pending, timeout=max(0.0, wake_at - now), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Slower than usual: hedge with the next provider
+                    launch = True
+                    continue
+                for task in done:
+                    del pending[task]
+                    if task.exception() is None:
+                        quote = task.result()
+                        return quote
+                # A failure moves on to the next provider straight away
+                launch = True
+        finally:
+            # Requests that lost a hedge race say nothing about their provider's health
+            self._abandon(pending, timed_out=quote is None and loop.time() >= deadline)
+        raise PriceUnavailable("No price provider returned a quote")
+
+    async def _median(self) -> Quote:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        waiting = list(self.sources)
+        pending: Dict[asyncio.Future, PriceSource] = {}
+        while self._launch(waiting, pending) is not None:
+            pass
+        quotes: List[Quote] = []
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                done, _ = await asyncio.wait(
+                    pending, timeout=deadline - now, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    del pending[task]
+                    if task.exception() is None:
+                        if not quotes and pending:
+                            # Don't let a slow provider hold up an answer we already have
+                            deadline = min(deadline, loop.time() + max(s.hedge_delay() for s in pending.values()))
+                        quotes.append(task.result())
+        finally:
+            self._abandon(pending, timed_out=not quotes and loop.time() >= deadline)
+        if not quotes:
+            raise PriceUnavailable("No price provider returned a quote")
+        return statistics.median(price for price, _ in quotes), max(source_ts for _, source_ts in quotes)
@@ -1,18 +1,83 @@
+import asyncio
+from typing import Optional, Tuple
 import httpx
 from fastapi import HTTPException
+from config import PRICE_POLL_INTERVAL, PRICE_MAX_STALENESS, PRICE_PROVIDERS
+from resources import resources
+from metrics import cache_lookup
+from services.price_feed import PriceFeed
+from services.price_providers import PriceAggregator, build_providers
 
 class PriceService:
+    # The upstream request currently in flight, shared by concurrent callers
+    _inflight: Optional[asyncio.Future] = None
+
+    @staticmethod
+    def get_client() -> httpx.AsyncClient:
+        """
+        Returns the app-lifetime HTTP client, so fetches reuse pooled keep-alive connections.
+        """
+        return resources.http_client
+
+    @classmethod
+    async def _request_quote(cls) -> Tuple[float, float]:
+        try:
+            return await price_aggregator.fetch_quote()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Error fetching live price")
+
+    @classmethod
+    async def fetch_live_quote(cls) -> Tuple[float, float]:
+        """
+        Fetches the live Bitcoin price and its source timestamp from the configured providers.
+        Concurrent callers share a single upstream request.
+        """
+        inflight = cls._inflight
+        if inflight is None:
+            inflight = asyncio.ensure_future(cls._request_quote())
+            cls._inflight = inflight
+            inflight.add_done_callback(cls._clear_inflight)
+        # Shield the shared request so one cancelled caller doesn't cancel it for everyone
+        return await asyncio.shield(inflight)
+
+    @classmethod
+    def _clear_inflight(cls, future: asyncio.Future):
+        if cls._inflight is future:
+            cls._inflight = None
+        # Mark the error as retrieved even if every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
+
     @staticmethod
     async def fetch_live_price() -> float:
         """
-        Fetches the live Bitcoin price using the Coindesk API endpoint.
+        Fetches the live Bitcoin price from the configured providers.
         """
-        url = "https://data-api.coindesk.com/index/cc/v1/latest/tick?market=cadli&instruments=BTC-USD"
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, timeout=10.0)
-                data = response.json()
-                price = float(data["Data"]["BTC-USD"]["VALUE"])
-            except Exception as e:
-                raise HTTPException(status_code=500, detail="Error fetching live price")
+        price, _ = await PriceService.fetch_live_quote()
         return price
+
+    @staticmethod
+    async def get_price() -> float:
+        """
+        Returns the latest polled price, fetching synchronously only when it is stale.
+        """
+        tick = price_feed.fresh_tick()
+        cache_lookup("price_tick", tick is not None)
+        if tick:
+            return tick.price
+
+        # Publish under the quote's own timestamp: a local one would run ahead of the
+        # source's and make the poller's next ticks look older than this one
+        price, source_ts = await PriceService.fetch_live_quote()
+        price_feed.publish(price, source_ts)
+        return price
+
+# App-scoped provider list; tests and local runs can swap in stubs with price_aggregator.use()
+price_aggregator = PriceAggregator(build_providers(PRICE_PROVIDERS), lambda: PriceService.get_client())
+
+# Shared last-tick cache, polled in the background from the app startup hook
+price_feed = PriceFeed(
+    lambda: PriceService.fetch_live_quote(),
+    interval=PRICE_POLL_INTERVAL,
+    max_staleness=PRICE_MAX_STALENESS
+)
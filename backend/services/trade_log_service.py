@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config import TRADE_LOG_QUEUE_SIZE, TRADE_LOG_BATCH_SIZE, TRADE_LOG_FLUSH_INTERVAL
+from metrics import QUEUE_DEPTH, stage
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class TradeLogService:
+    """
+    Buffers trade log entries in a bounded queue and writes them to MongoDB in batches.
+    """
+    def __init__(
+        self,
+        max_queue_size: int = TRADE_LOG_QUEUE_SIZE,
+        batch_size: int = TRADE_LOG_BATCH_SIZE,
+        flush_interval: float = TRADE_LOG_FLUSH_INTERVAL
+    ):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.collection = None
+        self._connect: Optional[Callable[[], Any]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # A queue read left waiting when a batch's flush interval ended, reused by the next batch
+        self._get: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of entries waiting to be written"""
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self, collection=None, connect: Optional[Callable[[], Any]] = None):
+        """
+        Start the background flusher writing into the given Motor collection, or into
+        the one `connect` returns on the first write, which keeps connecting to Mongo
+        off the startup path
+        """
+        if self.running:
+            return
+        self.collection = collection
+        self._connect = connect
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._get = None
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Flush everything queued so far and stop the flusher
+        """
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, entry: Dict[str, Any]):
+        """
+        Queue an entry for writing. Waits for room when the queue is full.
+        """
+        if not self.running:
+            raise RuntimeError("Trade log writer is not running")
+        await self._queue.put(entry)
+
+    async def submit_many(self, entries: Iterable[Dict[str, Any]]):
+        """
+        Queue several entries for writing, in order
+        """
+        for entry in entries:
+            await self.submit(entry)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _collect_batch(self):
+        """
+        Wait for one entry, then gather more until the batch is full or the flush interval ends
+        """
+        loop = asyncio.get_running_loop()
+        batch: List[Dict[str, Any]] = []
+        item = await self._next_get()
+        self._get = None
+        deadline = loop.time() + self.flush_interval
+
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            # Unlike wait_for(get()), an unfinished read isn't cancelled at the deadline,
+            # where it could drop an entry it had just dequeued; it carries over instead
+            done, _ = await asyncio.wait({self._next_get()}, timeout=deadline - loop.time())
+            if not done:
+                return batch, False
+            item = self._get.result()
+            self._get = None
+        return batch, True
+
+    def _next_get(self) -> asyncio.Task:
+        if self._get is None:
+            self._get = asyncio.ensure_future(self._queue.get())
+        return self._get
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        try:
+            if self.collection is None:
+                self.collection = self._connect()
+            with stage("mongo_trade_log"):
+                await self.collection.insert_many(batch, ordered=False)
+        except Exception:
+            logger.error("Failed to write %d trade log entries", len(batch), exc_info=True)
+
+# App-scoped writer, started and drained from the app lifecycle hooks
+trade_log_service = TradeLogService()
+QUEUE_DEPTH.labels("trade_log").set_function(lambda: trade_log_service.queue_depth)
@@ -1,6 +1,7 @@
 import asyncio
 import unittest
 import os
+import time
 import pytest
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
@@ -10,6 +11,7 @@ from unittest.mock import Mock, AsyncMock, patch
 # Import your app modules
 from models.db_models import Base, Account, TradeOrder
 from main import app
+from services.price_service import price_feed
 
 # Set up test database
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -45,11 +47,18 @@ def test_client():
     with TestClient(app) as client:
         yield client
 
+@pytest.fixture(autouse=True)
+def reset_price_feed():
+    """Make sure no cached price tick leaks between tests"""
+    price_feed.reset()
+    yield
+    price_feed.reset()
+
 @pytest.fixture
 def mock_price_service():
     """Mock for price service that returns a fixed price"""
-    with patch('services.price_service.PriceService.fetch_live_price', 
-               new_callable=AsyncMock, return_value=50000.0):
+    with patch('services.price_service.PriceService.fetch_live_quote',
+               new_callable=AsyncMock, return_value=(50000.0, time.time())):
         yield
 
 @pytest.fixture
@@ -0,0 +1,103 @@
+import asyncio
+import httpx
+import pytest
+import redis.asyncio as redis
+from fakeredis import aioredis
+from fastapi import FastAPI
+from unittest.mock import AsyncMock
+from admission import AdmissionMiddleware, TokenBucketLimiter
+
+class TestAdmission:
+
+    def setup_method(self, method):
+        self.redis = aioredis.FakeRedis()
+        self.release = asyncio.Event()
+        self.app = FastAPI()
+
+        @self.app.get("/price")
+        async def price():
+            return {"price": 50000.0}
+
+        @self.app.post("/trade")
+        async def trade():
+            await self.release.wait()
+            return {"order_id": 1}
+
+        @self.app.get("/metrics")
+        async def metrics():
+            return {}
+
+    def client(self, max_in_flight_writes=10, limiter=None, rate_limit=True):
+        self.app.add_middleware(
+            AdmissionMiddleware,
+            rate_limit=rate_limit,
+            max_in_flight_writes=max_in_flight_writes,
+            limiter=limiter or TokenBucketLimiter(self.redis, read_rate=1.0, read_burst=3, write_rate=1.0, write_burst=3)
+        )
+        return httpx.AsyncClient(app=self.app, base_url="http://test")
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_limits_each_client(self):
+        """Test that a client past its burst gets 429 with Retry-After, and other clients don't"""
+        async with self.client() as client:
+            statuses = [(await client.get("/price")).status_code for _ in range(4)]
+            limited = await client.get("/price")
+            other = await client.get("/price", headers={"X-API-Key": "bot-2"})
+
+        assert statuses == [200, 200, 200, 429]
+        assert limited.status_code == 429
+        assert limited.headers["retry-after"] == "1"
+        assert limited.json() == {"detail": "Rate limit exceeded"}
+        assert other.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_bucket_refills(self):
+        """Test that tokens come back at the configured rate"""
+        limiter = TokenBucketLimiter(self.redis, read_rate=100.0, read_burst=1)
+
+        assert (await limiter.acquire("ip:1", "read"))[0] is True
+        allowed, wait = await limiter.acquire("ip:1", "read")
+        assert allowed is False
+        assert 0 < wait <= 0.01
+
+        await asyncio.sleep(0.02)
+        assert (await limiter.acquire("ip:1", "read"))[0] is True
+
+    @pytest.mark.asyncio
+    async def test_in_flight_writes_are_capped(self):
+        """Test that writes beyond the in-flight cap are shed instead of queued"""
+        async with self.client(max_in_flight_writes=2, rate_limit=False) as client:
+            running = [asyncio.ensure_future(client.post("/trade")) for _ in range(2)]
+            await asyncio.sleep(0.01)
+
+            shed = await client.post("/trade")
+            read = await client.get("/price")
+            self.release.set()
+            done = await asyncio.gather(*running)
+            after = await client.post("/trade")
+
+        assert shed.status_code == 429
+        assert shed.json() == {"detail": "Too many requests in flight"}
+        assert "retry-after" in shed.headers
+        assert read.status_code == 200
+        assert [response.status_code for response in done] == [200, 200]
+        assert after.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_fails_open_without_redis(self):
+        """Test that requests are admitted when the limiter can't reach Redis"""
+        limiter = TokenBucketLimiter(self.redis)
+        limiter._take_token = AsyncMock(side_effect=redis.ConnectionError("unreachable"))
+
+        async with self.client(limiter=limiter) as client:
+            response = await client.get("/price")
+
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_exempt_paths(self):
+        """Test that monitoring endpoints are never limited"""
+        async with self.client() as client:
+            statuses = {(await client.get("/metrics")).status_code for _ in range(10)}
+
+        assert statuses == {200}
@@ -0,0 +1,47 @@
+from benchmarks.run import summarize, find_regressions
+
+class TestBenchmarkReport:
+
+    def report(self, rps, p95, p99, errors=0, rejected=0):
+        return {"endpoints": {"GET /price": {
+            "rps": rps, "p95_ms": p95, "p99_ms": p99, "errors": errors, "rejected": rejected
+        }}}
+
+    def test_summarize(self):
+        """Test throughput and percentiles of a run"""
+        summary = summarize([0.001 * i for i in range(1, 101)], errors=2, elapsed=2.0)
+
+        assert summary["requests"] == 100
+        assert summary["errors"] == 2
+        assert summary["rps"] == 50.0
+        assert summary["p50_ms"] == 50.5
+        assert summary["max_ms"] == 100.0
+
+    def test_summarize_reports_rejections_apart(self):
+        """Test that 429s are counted separately from the timed requests"""
+        summary = summarize([0.01] * 10, errors=0, elapsed=1.0, rejected=90)
+
+        assert summary["requests"] == 10
+        assert summary["rejected"] == 90
+        assert summary["p99_ms"] == 10.0
+
+    def test_summarize_without_requests(self):
+        """Test that an empty run summarizes to zeros"""
+        summary = summarize([], errors=0, elapsed=0.0)
+
+        assert summary["requests"] == 0
+        assert summary["rps"] == 0.0
+        assert summary["p99_ms"] == 0.0
+
+    def test_find_regressions_within_tolerance(self):
+        """Test that changes inside the tolerance are not regressions"""
+        assert find_regressions(self.report(90, 11, 22), self.report(100, 10, 20), tolerance=0.2) == []
+
+    def test_find_regressions(self):
+        """Test that slower throughput, higher tail latency, new errors and new rejections are reported"""
+        regressions = find_regressions(
+            self.report(50, 20, 20, errors=1, rejected=5), self.report(100, 10, 20), tolerance=0.2
+        )
+
+        assert len(regressions) == 4
+        assert all(regression.startswith("GET /price") for regression in regressions)
@@ -0,0 +1,68 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from metrics import (
+    registry, stage, cache_lookup, MetricsMiddleware, QUEUE_DEPTH
+)
+from api.endpoints import system
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0.0
+
+class TestMetrics:
+
+    def setup_method(self, method):
+        self.app = FastAPI()
+        self.app.add_middleware(MetricsMiddleware)
+        self.app.include_router(system.router)
+
+        @self.app.get("/accounts/{account_id}/ping")
+        async def ping(account_id: int):
+            return {"account_id": account_id}
+
+    def test_stage_records_duration(self):
+        """Test that a timed block lands in its stage histogram"""
+        before = sample("trading_stage_seconds_count", stage="test_stage")
+
+        with stage("test_stage"):
+            pass
+
+        assert sample("trading_stage_seconds_count", stage="test_stage") == before + 1
+
+    def test_cache_lookup_counts_hits_and_misses(self):
+        """Test that hits and misses are counted separately"""
+        hits = sample("trading_cache_lookups_total", cache="test_cache", result="hit")
+        misses = sample("trading_cache_lookups_total", cache="test_cache", result="miss")
+
+        cache_lookup("test_cache", True)
+        cache_lookup("test_cache", False)
+        cache_lookup("test_cache", False)
+
+        assert sample("trading_cache_lookups_total", cache="test_cache", result="hit") == hits + 1
+        assert sample("trading_cache_lookups_total", cache="test_cache", result="miss") == misses + 2
+
+    @pytest.mark.asyncio
+    async def test_middleware_labels_by_handler(self):
+        """Test that requests are recorded per handler, not per path"""
+        before = sample("trading_request_seconds_count", method="GET", handler="ping", status="200")
+
+        async with httpx.AsyncClient(app=self.app, base_url="http://test") as client:
+            await client.get("/accounts/1/ping")
+            await client.get("/accounts/2/ping")
+            await client.get("/missing")
+
+        assert sample("trading_request_seconds_count", method="GET", handler="ping", status="200") == before + 2
+        assert sample("trading_request_seconds_count", method="GET", handler="unmatched", status="404") >= 1
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self):
+        """Test that /metrics serves the registry in the Prometheus text format"""
+        QUEUE_DEPTH.labels("test_queue").set(3)
+
+        async with httpx.AsyncClient(app=self.app, base_url="http://test") as client:
+            response = await client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'trading_queue_depth{queue="test_queue"} 3.0' in response.text
+        assert 'trading_queue_depth{queue="trade_log"}' in response.text
@@ -0,0 +1,92 @@
+import json
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from models.migrations import ensure_schema, schema_version, LATEST_VERSION
+
+# The schema create_all produced before migrations, with an order already in it
+LEGACY_SCHEMA = [
+    "CREATE TABLE accounts (id INTEGER PRIMARY KEY, cash_balance FLOAT, btc_balance FLOAT)",
+    "CREATE TABLE trade_orders (id INTEGER PRIMARY KEY, type VARCHAR NOT NULL, amount FLOAT NOT NULL, "
+    "price FLOAT NOT NULL, status VARCHAR NOT NULL, created_at DATETIME, closed_at DATETIME)",
+    "CREATE INDEX ix_trade_orders_created_at_id ON trade_orders (created_at, id)",
+    "INSERT INTO accounts (cash_balance, btc_balance) VALUES (9000.0, 0.7)",
+    "INSERT INTO trade_orders (type, amount, price, status, created_at) "
+    "VALUES ('buy', 0.1, 50000.0, 'open', '2025-03-01 12:00:00')",
+]
+
+class TestMigrations:
+
+    @pytest.fixture
+    async def engine(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'schema.db'}")
+        yield engine
+        await engine.dispose()
+
+    async def query(self, engine, sql):
+        async with engine.connect() as connection:
+            return (await connection.execute(text(sql))).all()
+
+    @pytest.mark.asyncio
+    async def test_fresh_database(self, engine):
+        """Test that an empty database gets every table and the default account"""
+        assert await ensure_schema(engine) is True
+
+        assert await self.query(engine, "SELECT id, cash_balance, btc_balance FROM accounts") == [(1, 10000.0, 0.5)]
+        rows = await self.query(engine, "SELECT version FROM schema_version")
+        assert rows == [(LATEST_VERSION,)]
+
+    @pytest.mark.asyncio
+    async def test_current_schema_is_skipped(self, engine):
+        """Test that a second boot finds the fingerprint current and runs nothing"""
+        await ensure_schema(engine)
+
+        assert await ensure_schema(engine) is False
+        assert len(await self.query(engine, "SELECT id FROM accounts")) == 1
+
+    @pytest.mark.asyncio
+    async def test_legacy_database_is_upgraded(self, engine):
+        """Test that a database from before migrations gains the newer columns and indexes"""
+        async with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                await connection.execute(text(statement))
+
+        assert await ensure_schema(engine) is True
+
+        assert await self.query(engine, "SELECT account_id, kind, trigger_price FROM trade_orders") == [
+            (1, "market", None)
+        ]
+        assert await self.query(engine, "SELECT cash_balance, ledger_seq FROM accounts") == [(9000.0, 0)]
+        async with engine.connect() as connection:
+            indexes = await connection.run_sync(
+                lambda sync: {index["name"] for index in inspect(sync).get_indexes("trade_orders")}
+            )
+        assert "ix_trade_orders_created_at_id" not in indexes
+        assert "ix_trade_orders_account_created_at_id" in indexes
+
+    @pytest.mark.asyncio
+    async def test_changed_fingerprint_reruns(self, engine):
+        """Test that a stale fingerprint triggers a migration pass and is then recorded"""
+        await ensure_schema(engine)
+        async with engine.begin() as connection:
+            await connection.execute(schema_version.update().values(fingerprint="stale"))
+
+        assert await ensure_schema(engine) is True
+        assert await ensure_schema(engine) is False
+
+    @pytest.mark.asyncio
+    async def test_existing_accounts_are_snapshotted(self, engine):
+        """Test that accounts from before the journal start from a snapshot of their state"""
+        async with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                await connection.execute(text(statement))
+
+        await ensure_schema(engine)
+
+        rows = await self.query(engine, "SELECT account_id, seq, state FROM account_snapshots")
+        assert len(rows) == 1
+        account_id, seq, state = rows[0]
+        state = json.loads(state)
+        assert (account_id, seq) == (1, 0)
+        assert (state["cash_balance"], state["btc_balance"]) == (9000.0, 0.7)
+        assert [(order["id"], order["status"]) for order in state["orders"]] == [(1, "open")]
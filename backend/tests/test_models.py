@@ -1,7 +1,8 @@
 import unittest
 import datetime
 from models.db_models import Account, TradeOrder
-from models.schemas import TradeRequest, TradeOrderResponse
+from pydantic import ValidationError
+from models.schemas import TradeRequest, TradeOrderResponse, BulkCloseRequest
 
 class TestModels(unittest.TestCase):
     """Test case for data models"""
@@ -59,5 +60,15 @@ class TestModels(unittest.TestCase):
         self.assertEqual(response.created_at, created_at)
         self.assertEqual(response.closed_at, closed_at)
 
+    def test_bulk_close_request_schema(self):
+        """Test that BulkCloseRequest takes either order ids or a filter"""
+        self.assertEqual(BulkCloseRequest(order_ids=[1, 2]).order_ids, [1, 2])
+        self.assertIsNone(BulkCloseRequest(filter={}).filter.type)
+        
+        with self.assertRaises(ValidationError):
+            BulkCloseRequest()
+        with self.assertRaises(ValidationError):
+            BulkCloseRequest(order_ids=[1], filter={"type": "buy"})
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from replica import ReplicaMonitor
+
+def postgres_engine(result=None, error=None):
+    """A mock Postgres engine whose queries return `result` or raise `error`"""
+    connection = MagicMock()
+    connection.scalar = AsyncMock(return_value=result, side_effect=error)
+    engine = MagicMock()
+    engine.dialect.name = "postgresql"
+    engine.connect.return_value.__aenter__ = AsyncMock(return_value=connection)
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine, connection
+
+def with_replica(lag=None, error=None):
+    """Patch in a primary at a fixed WAL position and a replica whose lag query returns `lag` or raises `error`"""
+    engine, connection = postgres_engine(lag, error)
+    primary, _ = postgres_engine("0/3000060")
+    return patch("replica.resources", MagicMock(engine=primary, replica_engine=engine)), connection
+
+class TestReplicaMonitor:
+
+    def setup_method(self, method):
+        self.monitor = ReplicaMonitor(max_lag=2.0, check_interval=60.0)
+
+    @pytest.mark.asyncio
+    async def test_no_replica_reads_primary(self):
+        """Test that without a replica every read goes to the primary"""
+        with patch("replica.resources", MagicMock(replica_engine=None)):
+            assert await self.monitor.use_replica(1) is False
+
+    @pytest.mark.asyncio
+    async def test_current_replica_serves_reads(self):
+        """Test that a replica within the lag budget serves reads, measured once per interval"""
+        resources, connection = with_replica(lag=0.5)
+        with resources:
+            results = await asyncio.gather(*(self.monitor.use_replica(1) for _ in range(10)))
+
+        assert results == [True] * 10
+        assert connection.scalar.call_count == 1
+        # The replica is compared against the primary's WAL position
+        assert connection.scalar.call_args[0][1] == {"primary_lsn": "0/3000060"}
+        assert self.monitor.lag == 0.5
+
+    @pytest.mark.asyncio
+    async def test_lagging_replica_falls_back(self):
+        """Test that reads go to the primary while the replica is over the lag budget"""
+        resources, _ = with_replica(lag=5.0)
+        with resources:
+            assert await self.monitor.use_replica(1) is False
+
+    @pytest.mark.asyncio
+    async def test_unreachable_replica_falls_back(self):
+        """Test that a failed lag query sends reads to the primary"""
+        resources, _ = with_replica(error=OSError("connection refused"))
+        with resources:
+            assert await self.monitor.use_replica(1) is False
+        assert self.monitor.lag is None
+
+    @pytest.mark.asyncio
+    async def test_unmeasurable_lag_falls_back(self):
+        """Test that a replica behind the primary without a replayed transaction to date it reads as unknown"""
+        resources, _ = with_replica(lag=None)
+        with resources:
+            assert await self.monitor.use_replica(1) is False
+        assert self.monitor.lag is None
+
+    @pytest.mark.asyncio
+    async def test_account_reads_its_writes_from_primary(self):
+        """Test that an account that wrote after the replica was last known current reads from the primary"""
+        resources, _ = with_replica(lag=0.0)
+        with resources:
+            assert await self.monitor.use_replica(1) is True
+            self.monitor.record_write(1)
+
+            assert await self.monitor.use_replica(1) is False
+            assert await self.monitor.use_replica(2) is True
+
+            # The next measurement shows the replica has caught up past the write
+            self.monitor._checked_at = float("-inf")
+            assert await self.monitor.use_replica(1) is True
+
+    def test_write_tracking_is_bounded(self):
+        """Test that only the most recent writers are remembered"""
+        monitor = ReplicaMonitor(max_accounts=2)
+        for account_id in (1, 2, 3):
+            monitor.record_write(account_id)
+        assert list(monitor._writes) == [2, 3]
@@ -31,17 +31,17 @@ class TestAccountRepository:
         assert result.btc_balance == 0.5
     
     @pytest.mark.asyncio
-    async def test_update_account_balances(self, setup_database, db_session, account_with_balance):
-        """Test updating account balances"""
+    async def test_apply_balance_delta_in_sequence(self, setup_database, db_session, account_with_balance):
+        """Test applying successive balance changes"""
         repo = AccountRepository(db_session)
         
-        # Update balances with positive deltas
-        updated = await repo.update_account_balances(cash_delta=1000.0, btc_delta=0.25)
+        # Increase both balances
+        updated = await repo.apply_balance_delta(cash_delta=1000.0, btc_delta=0.25)
         assert updated.cash_balance == 11000.0  # 10000 + 1000
         assert updated.btc_balance == 1.25  # 1.0 + 0.25
         
-        # Update with negative deltas
-        updated = await repo.update_account_balances(cash_delta=-2000.0, btc_delta=-0.5)
+        # Decrease both balances
+        updated = await repo.apply_balance_delta(cash_delta=-2000.0, btc_delta=-0.5)
         assert updated.cash_balance == 9000.0  # 11000 - 2000
         assert updated.btc_balance == 0.75  # 1.25 - 0.5
         
@@ -51,11 +51,56 @@ class TestAccountRepository:
         assert account.btc_balance == 0.75
 
     @pytest.mark.asyncio
-    async def test_update_account_no_account(self, setup_database, db_session):
-        """Test updating when no account exists should raise ValueError"""
+    async def test_apply_balance_delta(self, setup_database, db_session, account_with_balance):
+        """Test applying a guarded balance change"""
         repo = AccountRepository(db_session)
         
-        with pytest.raises(ValueError) as excinfo:
-            await repo.update_account_balances(cash_delta=1000.0, btc_delta=0.1)
+        balances = await repo.apply_balance_delta(cash_delta=-5000.0, btc_delta=0.1)
+        assert balances.cash_balance == 5000.0
+        assert balances.btc_balance == 1.1
         
-        assert "Account not initialized" in str(excinfo.value)
+        # Verify changes are persisted and visible through the ORM
+        account = await repo.get_account()
+        assert account.cash_balance == 5000.0
+        assert account.btc_balance == 1.1
+    
+    @pytest.mark.asyncio
+    async def test_apply_balance_delta_insufficient(self, setup_database, db_session, account_with_balance):
+        """Test that the guard rejects a change that would overdraw the account"""
+        repo = AccountRepository(db_session)
+        
+        assert await repo.apply_balance_delta(cash_delta=-20000.0, btc_delta=0.4) is None
+        assert await repo.apply_balance_delta(cash_delta=100000.0, btc_delta=-2.0) is None
+        
+        account = await repo.get_account()
+        assert account.cash_balance == 10000.0
+        assert account.btc_balance == 1.0
+    
+    @pytest.mark.asyncio
+    async def test_apply_balance_delta_no_account(self, setup_database, db_session):
+        """Test applying a balance change when no account exists"""
+        repo = AccountRepository(db_session)
+        assert await repo.apply_balance_delta(cash_delta=1000.0, btc_delta=0.1) is None
+
+    @pytest.mark.asyncio
+    async def test_get_account_for_update(self, setup_database, db_session, account_with_balance):
+        """Test reading the account with a row lock"""
+        repo = AccountRepository(db_session)
+        account = await repo.get_account_for_update()
+        assert account.id == account_with_balance.id
+        assert account.cash_balance == 10000.0
+
+    @pytest.mark.asyncio
+    async def test_accounts_are_isolated(self, setup_database, db_session, account_with_balance):
+        """Test that a repository only reads and changes its own account"""
+        other = await AccountRepository(db_session).create_account(cash_balance=100.0, btc_balance=0.0)
+        repo = AccountRepository(db_session, other.id)
+        
+        assert (await repo.get_account()).cash_balance == 100.0
+        assert await repo.apply_balance_delta(cash_delta=-500.0, btc_delta=0.01) is None
+        balances = await repo.apply_balance_delta(cash_delta=-50.0, btc_delta=0.001)
+        assert balances.id == other.id
+        
+        default = await AccountRepository(db_session).get_account()
+        assert default.cash_balance == 10000.0
+        assert await AccountRepository(db_session, 9999).get_account() is None
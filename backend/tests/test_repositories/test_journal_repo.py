@@ -0,0 +1,42 @@
+import pytest
+from repositories.journal_repo import JournalRepository
+
+class TestJournalRepository:
+    
+    @pytest.mark.asyncio
+    async def test_append_numbers_events_per_account(self, setup_database, db_session, account_with_balance):
+        """Test that appended events get consecutive sequence numbers and read back in order"""
+        repo = JournalRepository(db_session, account_with_balance.id)
+        
+        assert await repo.append([("order_opened", {"id": 1, "status": "open"})]) == 1
+        assert await repo.append([
+            ("order_closed", {"id": 1, "status": "closed"}),
+            ("balance_changed", {"cash_balance": 9000.0, "btc_balance": 1.0})
+        ]) == 3
+        
+        events = await repo.get_events()
+        assert [(event.seq, event.type) for event in events] == [
+            (1, "order_opened"), (2, "order_closed"), (3, "balance_changed")
+        ]
+        assert events[2].payload == {"cash_balance": 9000.0, "btc_balance": 1.0}
+        assert [event.seq for event in await repo.get_events(after_seq=1, limit=1)] == [2]
+    
+    @pytest.mark.asyncio
+    async def test_append_unknown_account(self, setup_database, db_session):
+        """Test that appending to a missing account writes nothing"""
+        repo = JournalRepository(db_session, 999)
+        assert await repo.append([("order_opened", {"id": 1, "status": "open"})]) is None
+        assert await repo.get_events() == []
+    
+    @pytest.mark.asyncio
+    async def test_only_the_latest_snapshot_is_kept(self, setup_database, db_session, account_with_balance):
+        """Test that saving a snapshot replaces the previous one"""
+        repo = JournalRepository(db_session, account_with_balance.id)
+        assert await repo.get_snapshot() is None
+        
+        await repo.save_snapshot(10, {"cash_balance": 1.0, "btc_balance": 0.0, "orders": []})
+        await repo.save_snapshot(20, {"cash_balance": 2.0, "btc_balance": 0.0, "orders": []})
+        
+        snapshot = await repo.get_snapshot()
+        assert snapshot.seq == 20
+        assert snapshot.state["cash_balance"] == 2.0
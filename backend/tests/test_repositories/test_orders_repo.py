@@ -6,10 +6,10 @@ from models.db_models import TradeOrder
 class TestOrderRepository:
     
     @pytest.mark.asyncio
-    async def test_get_all_orders_empty(self, setup_database, db_session):
-        """Test getting all orders when none exist"""
+    async def test_list_orders_empty(self, setup_database, db_session):
+        """Test listing orders when none exist"""
         repo = OrderRepository(db_session)
-        orders = await repo.get_all_orders()
+        orders = await repo.list_orders(limit=10)
         assert len(orders) == 0
     
     @pytest.mark.asyncio
@@ -30,7 +30,7 @@ class TestOrderRepository:
         assert order.closed_at is None
         
         # Verify it's in the database
-        orders = await repo.get_all_orders()
+        orders = await repo.list_orders(limit=10)
         assert len(orders) == 1
         assert orders[0].id == order.id
     
@@ -93,3 +93,144 @@ class TestOrderRepository:
         # Try to close a non-existent order
         order = await repo.close_order(9999)
         assert order is None
+
+    @pytest.mark.asyncio
+    async def test_list_orders_keyset_pages(self, setup_database, db_session):
+        """Test walking the orders newest first with a (created_at, id) cursor"""
+        base = datetime.datetime(2025, 3, 1, 12, 0, 0)
+        for i in range(5):
+            db_session.add(TradeOrder(
+                type="buy" if i % 2 == 0 else "sell",
+                amount=0.1,
+                price=50000.0 + i,
+                created_at=base + datetime.timedelta(minutes=i)
+            ))
+        await db_session.commit()
+        repo = OrderRepository(db_session)
+        
+        first_page = await repo.list_orders(2)
+        assert [order.price for order in first_page] == [50004.0, 50003.0]
+        
+        last = first_page[-1]
+        second_page = await repo.list_orders(2, cursor=(last.created_at, last.id))
+        assert [order.price for order in second_page] == [50002.0, 50001.0]
+    
+    @pytest.mark.asyncio
+    async def test_list_orders_filters(self, setup_database, db_session):
+        """Test filtering orders by type, status and time range"""
+        base = datetime.datetime(2025, 3, 1, 12, 0, 0)
+        for i in range(4):
+            db_session.add(TradeOrder(
+                type="buy" if i % 2 == 0 else "sell",
+                amount=0.1,
+                price=50000.0 + i,
+                status="closed" if i == 0 else "open",
+                created_at=base + datetime.timedelta(minutes=i)
+            ))
+        await db_session.commit()
+        repo = OrderRepository(db_session)
+        
+        buys = await repo.list_orders(10, type="buy")
+        assert [order.price for order in buys] == [50002.0, 50000.0]
+        
+        open_buys = await repo.list_orders(10, type="buy", status="open")
+        assert [order.price for order in open_buys] == [50002.0]
+        
+        in_range = await repo.list_orders(
+            10,
+            created_from=base + datetime.timedelta(minutes=1),
+            created_to=base + datetime.timedelta(minutes=3)
+        )
+        assert [order.price for order in in_range] == [50002.0, 50001.0]
+
+    @pytest.mark.asyncio
+    async def test_create_orders(self, setup_database, db_session):
+        """Test creating several orders at once"""
+        repo = OrderRepository(db_session)
+        
+        orders = await repo.create_orders([("buy", 0.1, 50000.0), ("sell", 0.2, 50000.0)])
+        
+        assert [order.type for order in orders] == ["buy", "sell"]
+        assert all(order.id is not None for order in orders)
+        assert all(order.status == "open" for order in orders)
+        assert orders[0].created_at == orders[1].created_at
+        assert len(await repo.list_orders(limit=10)) == 2
+
+    @pytest.mark.asyncio
+    async def test_close_orders_by_ids(self, setup_database, db_session):
+        """Test closing a set of open orders in one call"""
+        repo = OrderRepository(db_session)
+        orders = await repo.create_orders([("buy", 0.1, 50000.0), ("sell", 0.2, 50000.0), ("buy", 0.3, 50000.0)])
+        
+        closed = await repo.close_orders(order_ids=[orders[0].id, orders[1].id, 9999])
+        
+        assert [order.id for order in closed] == [orders[0].id, orders[1].id]
+        assert all(order.status == "closed" and order.closed_at is not None for order in closed)
+        
+        # Already closed orders are not closed again
+        assert await repo.close_orders(order_ids=[orders[0].id]) == []
+        assert await repo.get_open_order_by_id(orders[2].id) is not None
+    
+    @pytest.mark.asyncio
+    async def test_close_orders_by_filter(self, setup_database, db_session):
+        """Test closing every open order matching a filter"""
+        repo = OrderRepository(db_session)
+        await repo.create_orders([("buy", 0.1, 50000.0), ("sell", 0.2, 50000.0), ("buy", 0.3, 50000.0)])
+        
+        closed = await repo.close_orders(type="buy")
+        assert [order.amount for order in closed] == [0.1, 0.3]
+        
+        closed = await repo.close_orders()
+        assert [order.amount for order in closed] == [0.2]
+
+    @pytest.mark.asyncio
+    async def test_orders_are_scoped_to_the_account(self, setup_database, db_session):
+        """Test that one account can neither see nor close another account's orders"""
+        repo = OrderRepository(db_session, account_id=1)
+        other_repo = OrderRepository(db_session, account_id=2)
+        order = await repo.create_order(type="buy", amount=0.1, price=50000.0)
+        other_orders = await other_repo.create_orders([("sell", 0.2, 50000.0)])
+        
+        assert [o.id for o in await repo.list_orders(10)] == [order.id]
+        assert [o.id for o in await other_repo.list_orders(10)] == [other_orders[0].id]
+        assert await other_repo.get_order_by_id(order.id) is None
+        assert await other_repo.close_order(order.id) is None
+        assert await other_repo.close_orders(order_ids=[order.id]) == []
+        
+        closed = await other_repo.close_orders()
+        assert [o.id for o in closed] == [other_orders[0].id]
+        assert (await repo.get_open_order_by_id(order.id)) is not None
+
+    @pytest.mark.asyncio
+    async def test_get_open_positions(self, setup_database, db_session):
+        """Test loading the columns of the open orders only"""
+        repo = OrderRepository(db_session)
+        orders = await repo.create_orders([("buy", 0.1, 50000.0), ("sell", 0.2, 51000.0)])
+        await repo.close_order(orders[0].id)
+        
+        positions = await repo.get_open_positions()
+        
+        assert [tuple(position) for position in positions] == [(orders[1].id, "sell", 0.2, 51000.0)]
+
+    @pytest.mark.asyncio
+    async def test_pending_order_transitions(self, setup_database, db_session):
+        """Test that pending orders fill, cancel or reject exactly once"""
+        repo = OrderRepository(db_session)
+        to_fill = await repo.create_order("buy", 0.1, 48000.0, kind="limit", trigger_price=48000.0, status="pending")
+        to_cancel = await repo.create_order("sell", 0.1, 52000.0, kind="stop", trigger_price=52000.0, status="pending")
+        to_reject = await repo.create_order("sell", 9.0, 52000.0, kind="limit", trigger_price=52000.0, status="pending")
+        
+        pending = await repo.get_all_pending_orders()
+        assert [(o.id, o.kind, o.trigger_price) for o in pending] == [
+            (to_fill.id, "limit", 48000.0), (to_cancel.id, "stop", 52000.0), (to_reject.id, "limit", 52000.0)
+        ]
+        
+        filled = await repo.fill_order(to_fill.id, 47900.0)
+        assert (filled.status, filled.price, filled.trigger_price) == ("open", 47900.0, 48000.0)
+        assert await repo.fill_order(to_fill.id, 47000.0) is None
+        assert (await repo.cancel_order(to_cancel.id)).status == "cancelled"
+        assert await repo.fill_order(to_cancel.id, 52000.0) is None
+        assert (await repo.reject_order(to_reject.id)).status == "rejected"
+        assert await repo.get_all_pending_orders() == []
+        # Only open orders can be closed
+        assert await repo.close_order(to_cancel.id) is None
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from repositories.account_repo import AccountRepository
+from repositories.orders_repo import OrderRepository
+
+class TestUnitOfWork:
+    
+    @pytest.mark.asyncio
+    async def test_commits_once_at_the_end(self, setup_database, db_session, account_with_balance):
+        """Test that writes inside a unit of work share a single commit"""
+        account_repo = AccountRepository(db_session)
+        order_repo = OrderRepository(db_session)
+        
+        with patch.object(db_session, "commit", wraps=db_session.commit) as mock_commit:
+            async with order_repo.unit_of_work():
+                await account_repo.apply_balance_delta(cash_delta=-5000.0, btc_delta=0.1)
+                order = await order_repo.create_order(type="buy", amount=0.1, price=50000.0)
+                assert mock_commit.call_count == 0
+        
+        assert mock_commit.call_count == 1
+        assert order.id is not None
+        assert order.status == "open"
+        assert order.created_at is not None
+    
+    @pytest.mark.asyncio
+    async def test_rolls_back_every_write_on_error(self, setup_database, db_session, account_with_balance):
+        """Test that a failure leaves no partial state behind"""
+        account_repo = AccountRepository(db_session)
+        order_repo = OrderRepository(db_session)
+        
+        with pytest.raises(RuntimeError):
+            async with order_repo.unit_of_work():
+                await account_repo.apply_balance_delta(cash_delta=-5000.0, btc_delta=0.1)
+                await order_repo.create_order(type="buy", amount=0.1, price=50000.0)
+                raise RuntimeError("insert failed")
+        
+        account = await account_repo.get_account()
+        assert account.cash_balance == 10000.0
+        assert account.btc_balance == 1.0
+        assert await order_repo.list_orders(limit=10) == []
+    
+    @pytest.mark.asyncio
+    async def test_nested_unit_of_work_joins_outer(self, setup_database, db_session, account_with_balance):
+        """Test that an inner unit of work does not commit on its own"""
+        order_repo = OrderRepository(db_session)
+        
+        with patch.object(db_session, "commit", wraps=db_session.commit) as mock_commit:
+            async with order_repo.unit_of_work():
+                async with order_repo.unit_of_work():
+                    await order_repo.create_order(type="buy", amount=0.1, price=50000.0)
+                assert mock_commit.call_count == 0
+        
+        assert mock_commit.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_rollback_hooks(self, setup_database, db_session):
+        """Test that compensating actions only run when the unit of work rolls back"""
+        order_repo = OrderRepository(db_session)
+        calls = []
+        
+        async def compensate():
+            calls.append("undone")
+        
+        async with order_repo.unit_of_work():
+            order_repo.on_rollback(compensate)
+        assert calls == []
+        
+        with pytest.raises(RuntimeError):
+            async with order_repo.unit_of_work():
+                order_repo.on_rollback(compensate)
+                raise RuntimeError("insert failed")
+        assert calls == ["undone"]
+    
+    @pytest.mark.asyncio
+    async def test_commit_records_written_accounts(self, setup_database, db_session, account_with_balance):
+        """Test that accounts are recorded as written only once their transaction commits"""
+        order_repo = OrderRepository(db_session)
+        
+        with patch("repositories.base.replica_monitor") as mock_monitor:
+            async with order_repo.unit_of_work():
+                await order_repo.create_order(type="buy", amount=0.1, price=50000.0)
+                mock_monitor.record_write.assert_not_called()
+            mock_monitor.record_write.assert_called_once_with(1)
+            
+            with pytest.raises(RuntimeError):
+                async with order_repo.unit_of_work():
+                    await order_repo.create_order(type="buy", amount=0.1, price=50000.0)
+                    raise RuntimeError("insert failed")
+            assert mock_monitor.record_write.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_reads_use_the_read_session(self, setup_database, db_session, account_with_balance):
+        """Test that read-only queries go to the read session and writes to the primary session"""
+        read_session = AsyncMock()
+        read_session.execute.return_value = MagicMock()
+        account_repo = AccountRepository(db_session, read_session=read_session)
+        
+        await account_repo.get_account()
+        read_session.execute.assert_called_once()
+        
+        balances = await account_repo.apply_balance_delta(cash_delta=-100.0, btc_delta=0.0)
+        assert balances.cash_balance == 9900.0
+        assert read_session.execute.call_count == 1
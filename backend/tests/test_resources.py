@@ -0,0 +1,76 @@
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy.ext.asyncio import create_async_engine
+from resources import AppResources, MongoPoolStats
+
+class TestAppResources:
+
+    def setup_method(self, method):
+        self.resources = AppResources()
+
+    @pytest.mark.asyncio
+    async def test_clients_are_built_once(self):
+        """Test that each shared client is only constructed on first use"""
+        assert self.resources.engine is self.resources.engine
+        assert self.resources.session_factory is self.resources.session_factory
+        assert self.resources.redis is self.resources.redis
+        assert self.resources.http_client is self.resources.http_client
+        await self.resources.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_pool_stats_only_reports_built_pools(self):
+        """Test that pool stats cover the pools that exist"""
+        assert self.resources.pool_stats() == {}
+
+        self.resources.engine
+        self.resources.redis
+        self.resources.http_client
+        stats = self.resources.pool_stats()
+
+        assert set(stats) == {"postgres", "redis", "http"}
+        assert stats["postgres"]["checked_out"] == 0
+        assert stats["redis"]["in_use"] == 0
+        assert stats["http"]["open"] == 0
+        await self.resources.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_replica_is_optional(self):
+        """Test that no replica is built without a URL, and an installed one is used and disposed"""
+        assert self.resources.replica_engine is None
+        assert self.resources.replica_session_factory is None
+
+        replica = create_async_engine("sqlite+aiosqlite:///:memory:")
+        self.resources.use(replica_engine=replica)
+        assert self.resources.replica_engine is replica
+        assert self.resources.replica_session_factory is self.resources.replica_session_factory
+
+        await self.resources.shutdown()
+        assert self.resources.replica_engine is None
+
+    @pytest.mark.asyncio
+    async def test_shutdown_closes_clients(self):
+        """Test that shutdown closes clients and a later access rebuilds them"""
+        http_client = self.resources.http_client
+        self.resources.redis
+
+        await self.resources.shutdown()
+
+        assert http_client.is_closed
+        assert self.resources.pool_stats() == {}
+        assert self.resources.http_client is not http_client
+        await self.resources.shutdown()
+
+    def test_mongo_pool_stats(self):
+        """Test that Mongo pool events are tallied"""
+        stats = MongoPoolStats()
+        event = MagicMock()
+
+        stats.connection_created(event)
+        stats.connection_created(event)
+        stats.connection_checked_out(event)
+        stats.connection_checked_in(event)
+        stats.connection_checked_out(event)
+        stats.connection_closed(event)
+
+        assert stats.open == 1
+        assert stats.checked_out == 1
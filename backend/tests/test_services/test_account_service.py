@@ -34,45 +34,37 @@ class TestAccountService:
         assert "Account not initialized" in excinfo.value.detail
     
     @pytest.mark.asyncio
-    async def test_check_buy_feasibility_sufficient_funds(self):
-        """Test buy feasibility check with sufficient funds"""
-        mock_account = Account(id=1, cash_balance=10000.0, btc_balance=1.0)
-        self.mock_repo.get_account.return_value = mock_account
+    async def test_apply_balance_delta_sufficient_funds(self):
+        """Test a balance change the account can cover"""
+        mock_account = Account(id=1, cash_balance=5000.0, btc_balance=1.1)
+        self.mock_repo.apply_balance_delta.return_value = mock_account
         
-        # Should not raise an exception
-        await self.service.check_buy_feasibility(5000.0)
-        self.mock_repo.get_account.assert_called_once()
+        result = await self.service.apply_balance_delta(-5000.0, 0.1, "Insufficient cash balance")
+        
+        assert result is mock_account
+        self.mock_repo.apply_balance_delta.assert_called_once_with(-5000.0, 0.1)
+        self.mock_repo.get_account.assert_not_called()
     
     @pytest.mark.asyncio
-    async def test_check_buy_feasibility_insufficient_funds(self):
-        """Test buy feasibility check with insufficient funds"""
-        mock_account = Account(id=1, cash_balance=5000.0, btc_balance=1.0)
-        self.mock_repo.get_account.return_value = mock_account
+    async def test_apply_balance_delta_insufficient_cash(self):
+        """Test a buy-side balance change the cash balance can't cover"""
+        self.mock_repo.apply_balance_delta.return_value = None
+        self.mock_repo.get_account.return_value = Account(id=1, cash_balance=5000.0, btc_balance=1.0)
         
         with pytest.raises(HTTPException) as excinfo:
-            await self.service.check_buy_feasibility(10000.0)
+            await self.service.apply_balance_delta(-10000.0, 0.2, "Insufficient cash balance")
         
         assert excinfo.value.status_code == 400
         assert "Insufficient cash balance" in excinfo.value.detail
     
     @pytest.mark.asyncio
-    async def test_check_sell_feasibility_sufficient_btc(self):
-        """Test sell feasibility check with sufficient BTC"""
-        mock_account = Account(id=1, cash_balance=10000.0, btc_balance=1.0)
-        self.mock_repo.get_account.return_value = mock_account
-        
-        # Should not raise an exception
-        await self.service.check_sell_feasibility(0.5)
-        self.mock_repo.get_account.assert_called_once()
-    
-    @pytest.mark.asyncio
-    async def test_check_sell_feasibility_insufficient_btc(self):
-        """Test sell feasibility check with insufficient BTC"""
-        mock_account = Account(id=1, cash_balance=10000.0, btc_balance=0.1)
-        self.mock_repo.get_account.return_value = mock_account
+    async def test_apply_balance_delta_insufficient_btc(self):
+        """Test a sell-side balance change the BTC balance can't cover"""
+        self.mock_repo.apply_balance_delta.return_value = None
+        self.mock_repo.get_account.return_value = Account(id=1, cash_balance=10000.0, btc_balance=0.1)
         
         with pytest.raises(HTTPException) as excinfo:
-            await self.service.check_sell_feasibility(0.5)
+            await self.service.apply_balance_delta(25000.0, -0.5, "Insufficient BTC balance")
         
         assert excinfo.value.status_code == 400
         assert "Insufficient BTC balance" in excinfo.value.detail
@@ -80,25 +72,106 @@ class TestAccountService:
     @pytest.mark.asyncio
     async def test_process_buy(self):
         """Test processing a buy order"""
-        mock_account = Account(id=1, cash_balance=10000.0, btc_balance=1.0)
-        self.mock_repo.get_account.return_value = mock_account
-        self.mock_repo.update_account_balances.return_value = mock_account
+        mock_account = Account(id=1, cash_balance=5000.0, btc_balance=1.1)
+        self.mock_repo.apply_balance_delta.return_value = mock_account
         
         result = await self.service.process_buy(0.1, 50000.0)
         
         assert result is mock_account
-        # Check that update was called with correct deltas
-        self.mock_repo.update_account_balances.assert_called_once_with(-5000.0, 0.1)
+        # Check that a single guarded update was issued with the correct deltas
+        self.mock_repo.apply_balance_delta.assert_called_once_with(-5000.0, 0.1)
+        self.mock_repo.get_account.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_process_sell(self):
         """Test processing a sell order"""
         mock_account = Account(id=1, cash_balance=15000.0, btc_balance=0.9)
-        self.mock_repo.get_account.return_value = mock_account
-        self.mock_repo.update_account_balances.return_value = mock_account
+        self.mock_repo.apply_balance_delta.return_value = mock_account
         
         result = await self.service.process_sell(0.1, 50000.0)
         
         assert result is mock_account
-        # Check that update was called with correct deltas
-        self.mock_repo.update_account_balances.assert_called_once_with(5000.0, -0.1)
+        # Check that a single guarded update was issued with the correct deltas
+        self.mock_repo.apply_balance_delta.assert_called_once_with(5000.0, -0.1)
+        self.mock_repo.get_account.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_process_buy_insufficient_funds(self):
+        """Test that a failed balance guard is reported as insufficient cash"""
+        self.mock_repo.apply_balance_delta.return_value = None
+        self.mock_repo.get_account.return_value = Account(id=1, cash_balance=100.0, btc_balance=1.0)
+        
+        with pytest.raises(HTTPException) as excinfo:
+            await self.service.process_buy(0.1, 50000.0)
+        
+        assert excinfo.value.status_code == 400
+        assert "Insufficient cash balance" in excinfo.value.detail
+    
+    @pytest.mark.asyncio
+    async def test_close_buy_order_insufficient_btc(self):
+        """Test that a failed balance guard on close is reported as insufficient BTC"""
+        self.mock_repo.apply_balance_delta.return_value = None
+        self.mock_repo.get_account.return_value = Account(id=1, cash_balance=100.0, btc_balance=0.0)
+        
+        with pytest.raises(HTTPException) as excinfo:
+            await self.service.close_buy_order(0.1, 50000.0)
+        
+        assert excinfo.value.status_code == 400
+        assert "Insufficient BTC balance" in excinfo.value.detail
+    
+    @pytest.mark.asyncio
+    async def test_process_buy_no_account(self):
+        """Test that a missing account is reported as not initialized"""
+        self.mock_repo.apply_balance_delta.return_value = None
+        self.mock_repo.get_account.return_value = None
+        
+        with pytest.raises(HTTPException) as excinfo:
+            await self.service.process_buy(0.1, 50000.0)
+        
+        assert excinfo.value.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_lock_account_not_found(self):
+        """Test locking the account when it doesn't exist"""
+        self.mock_repo.get_account_for_update.return_value = None
+        
+        with pytest.raises(HTTPException) as excinfo:
+            await self.service.lock_account()
+        
+        assert excinfo.value.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_ledger_mode_applies_in_memory(self):
+        """Test that ledger mode changes balances without touching the repository"""
+        ledger = MagicMock()
+        ledger.load = AsyncMock()
+        ledger.apply = AsyncMock(return_value=Account(id=1, cash_balance=5000.0, btc_balance=1.1))
+        repo = MagicMock()
+        repo.account_id = 1
+        service = AccountService(repo, ledger)
+        
+        result = await service.process_buy(0.1, 50000.0)
+        
+        assert result.cash_balance == 5000.0
+        ledger.apply.assert_called_once_with(1, -5000.0, 0.1)
+        
+        # A compensating change is registered in case the trade's transaction rolls back
+        hook = repo.on_rollback.call_args[0][0]
+        await hook()
+        ledger.apply.assert_called_with(1, 5000.0, -0.1, force=True)
+    
+    @pytest.mark.asyncio
+    async def test_ledger_mode_insufficient_funds(self):
+        """Test that ledger rejections are reported like database guard failures"""
+        ledger = MagicMock()
+        ledger.load = AsyncMock()
+        ledger.apply = AsyncMock(return_value=None)
+        ledger.get.return_value = Account(id=1, cash_balance=100.0, btc_balance=1.0)
+        repo = MagicMock()
+        repo.account_id = 1
+        service = AccountService(repo, ledger)
+        
+        with pytest.raises(HTTPException) as excinfo:
+            await service.process_buy(0.1, 50000.0)
+        
+        assert excinfo.value.status_code == 400
@@ -0,0 +1,113 @@
+import json
+import numpy as np
+import pytest
+from services.backtest_service import BacktestService, load_prices, moving_average_crossover, main
+
+def sequential_backtest(prices, signals, close_after, cash, btc):
+    """Replay orders one at a time with the live services' guard: refuse what would overdraw"""
+    events = []
+    for tick in np.flatnonzero(signals):
+        events.append((tick, 1, tick))
+        if close_after is not None and tick + close_after < len(prices):
+            events.append((tick + close_after, 0, tick))
+    status = {}
+    for tick, is_open, order in sorted(events):
+        side, amount = np.sign(signals[order]), abs(signals[order])
+        if is_open:
+            cash_delta, btc_delta = -side * amount * prices[tick], side * amount
+        elif status.get(order) == "open":
+            cash_delta, btc_delta = side * amount * prices[tick], -side * amount
+        else:
+            continue
+        if cash + cash_delta < -1e-9 or btc + btc_delta < -1e-9:
+            status.setdefault(order, "rejected")
+            continue
+        cash, btc = cash + cash_delta, btc + btc_delta
+        status[order] = "open" if is_open else "closed"
+    return cash, btc, status
+
+class TestBacktestService:
+    
+    def setup_method(self, method):
+        self.service = BacktestService(cash_balance=10000.0, btc_balance=0.5)
+    
+    def test_buy_and_close_round_trip(self):
+        """Test that a closed buy realizes its PnL like close_trade would"""
+        prices = np.array([50000.0, 51000.0, 52000.0, 53000.0])
+        signals = np.array([0.1, 0.0, 0.0, 0.0])
+        
+        result = self.service.run(prices, lambda p: signals, close_after=2)
+        
+        assert result.cash.tolist() == pytest.approx([5000.0, 5000.0, 10200.0, 10200.0])
+        assert result.btc.tolist() == pytest.approx([0.6, 0.6, 0.5, 0.5])
+        assert result.equity[-1] == pytest.approx(10200.0 + 0.5 * 53000.0)
+        assert result.orders["status"].tolist() == ["closed"]
+        assert result.stats["realized_pnl"] == pytest.approx(200.0)
+        assert result.stats["win_rate"] == 1.0
+    
+    def test_refuses_what_the_balances_cannot_cover(self):
+        """Test that overdrawing opens are rejected and later ones still fill"""
+        prices = np.full(4, 50000.0)
+        # 0.15 BTC costs 7500: the second buy can't be paid for until the first closes
+        signals = np.array([0.15, 0.15, -0.5, 0.15])
+        
+        result = self.service.run(prices, lambda p: signals, close_after=2)
+        
+        assert result.orders["status"].tolist() == ["closed", "rejected", "open", "open"]
+        assert result.stats["rejected"] == 1
+        assert result.btc.min() >= 0 and result.cash.min() >= 0
+        assert result.stats["unrealized_pnl"] == 0.0
+    
+    def test_matches_sequential_replay(self):
+        """Test the vectorized bookkeeping against a one-order-at-a-time replay"""
+        rng = np.random.default_rng(7)
+        prices = 50000.0 * np.exp(np.cumsum(rng.normal(0, 0.01, 20000)))
+        signals = rng.choice([-0.2, 0.0, 0.0, 0.15], prices.size)
+        
+        result = self.service.run(prices, lambda p: signals, close_after=25)
+        cash, btc, status = sequential_backtest(prices, signals, 25, 10000.0, 0.5)
+        
+        assert result.cash[-1] == pytest.approx(cash)
+        assert result.btc[-1] == pytest.approx(btc)
+        assert result.orders["status"].tolist() == [status[tick] for tick in np.flatnonzero(signals)]
+        assert 0 < result.stats["rejected"] < result.stats["orders"]
+    
+    def test_invalid_inputs(self):
+        """Test that mis-shaped signals and zero holding periods are refused"""
+        prices = np.full(3, 50000.0)
+        with pytest.raises(ValueError):
+            self.service.run(prices, lambda p: np.zeros(2))
+        with pytest.raises(ValueError):
+            self.service.run(prices, lambda p: np.zeros(3), close_after=0)
+    
+    def test_moving_average_crossover(self):
+        """Test that the reference strategy trades only on crossings"""
+        prices = np.concatenate((np.linspace(100.0, 50.0, 50), np.linspace(50.0, 150.0, 50), np.linspace(150.0, 50.0, 50)))
+        
+        signals = moving_average_crossover(fast=3, slow=10, amount=0.01)(prices)
+        
+        assert signals.shape == prices.shape
+        assert sorted(set(signals.tolist())) == [-0.01, 0.0, 0.01]
+        assert np.count_nonzero(signals) == 2
+        
+        # An empty series has nothing to trade
+        assert moving_average_crossover(3, 5)(np.array([])).shape == (0,)
+    
+    def test_load_prices(self, tmp_path):
+        """Test loading prices from NumPy and CSV files"""
+        np.save(tmp_path / "prices.npy", np.array([1.0, 2.0]))
+        (tmp_path / "header.csv").write_text("timestamp,close,volume\n1,50000,3\n2,50100,4\n")
+        (tmp_path / "bare.csv").write_text("1,50000\n2,50100\n")
+        
+        assert load_prices(str(tmp_path / "prices.npy")).tolist() == [1.0, 2.0]
+        assert load_prices(str(tmp_path / "header.csv")).tolist() == [50000.0, 50100.0]
+        assert load_prices(str(tmp_path / "bare.csv")).tolist() == [50000.0, 50100.0]
+    
+    def test_cli(self, tmp_path, capsys):
+        """Test running a backtest from the command line"""
+        np.save(tmp_path / "prices.npy", np.linspace(50000.0, 60000.0, 500))
+        
+        main([str(tmp_path / "prices.npy"), "--close-after", "10"])
+        
+        stats = json.loads(capsys.readouterr().out)
+        assert stats["ticks"] == 500
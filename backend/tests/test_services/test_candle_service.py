@@ -0,0 +1,116 @@
+import datetime
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from unittest.mock import AsyncMock
+from services.candle_service import CandleBuffer, CandleStore
+from services.price_feed import PriceFeed
+
+BASE = 1699999980.0  # a whole minute, and bucket 3 of a five-slot ring
+
+class TestCandleBuffer:
+    
+    @pytest.fixture
+    def buffer(self, tmp_path):
+        buffer = CandleBuffer(str(tmp_path / "1m.candles"), interval=60, capacity=5)
+        buffer.open()
+        yield buffer
+        buffer.close()
+    
+    def test_aggregates_ticks_into_ohlcv(self, buffer):
+        """Test that ticks in one bucket fold into a single candle"""
+        for offset, price in [(0, 100.0), (10, 105.0), (20, 95.0), (59, 101.0), (60, 102.0)]:
+            buffer.record(price, BASE + offset)
+        
+        history = buffer.history(BASE, BASE + 60)
+        
+        assert history["time"] == [int(BASE), int(BASE) + 60]
+        assert history["open"] == [100.0, 102.0]
+        assert history["high"] == [105.0, 102.0]
+        assert history["low"] == [95.0, 102.0]
+        assert history["close"] == [101.0, 102.0]
+        assert history["volume"] == [4.0, 1.0]
+    
+    def test_ring_wraps_and_skips_gaps(self, buffer):
+        """Test that old laps are overwritten and empty buckets are left out"""
+        for minute in [0, 1, 3, 4, 5, 6]:
+            buffer.record(100.0 + minute, BASE + minute * 60)
+        
+        history = buffer.history(BASE, BASE + 6 * 60)
+        
+        # Only the newest five buckets fit; minute 2 never had a tick
+        assert history["time"] == [int(BASE) + minute * 60 for minute in [3, 4, 5, 6]]
+        assert history["close"] == [103.0, 104.0, 105.0, 106.0]
+        # A tick for a bucket already overwritten is dropped
+        buffer.record(1.0, BASE)
+        assert buffer.history(BASE + 5 * 60, BASE + 5 * 60)["close"] == [105.0]
+    
+    def test_slices_are_views(self, buffer):
+        """Test that reading a range doesn't copy the mapped columns"""
+        for minute in range(7):
+            buffer.record(100.0, BASE + minute * 60)
+        
+        slices = buffer.slices(BASE + 60, BASE + 5 * 60)
+        
+        assert len(slices) == 2
+        assert all(np.shares_memory(columns, buffer._columns) for columns in slices)
+    
+    def test_persists_across_reopen(self, buffer):
+        """Test that candles survive closing and remapping the file"""
+        buffer.record(100.0, BASE)
+        buffer.close()
+        
+        buffer.open()
+        
+        assert buffer.history(BASE, BASE)["close"] == [100.0]
+
+class TestCandleStore:
+    
+    def test_records_price_feed_ticks(self, tmp_path):
+        """Test that the store builds every interval from feed ticks and serves ranges"""
+        store = CandleStore(str(tmp_path), {"1s": 10, "1m": 10, "1h": 10})
+        feed = PriceFeed(AsyncMock(), interval=1.0, max_staleness=5.0)
+        store.start(feed)
+        try:
+            feed.publish(100.0, BASE)
+            feed.publish(110.0, BASE + 1)
+            
+            start = datetime.datetime.utcfromtimestamp(BASE)
+            seconds = store.history("1s", start, start + datetime.timedelta(seconds=1))
+            minutes = store.history("1m", start, start + datetime.timedelta(seconds=1))
+        finally:
+            store.stop()
+        
+        assert seconds["interval"] == "1s"
+        assert seconds["close"] == [100.0, 110.0]
+        assert minutes["high"] == [110.0] and minutes["volume"] == [2.0]
+        # Stopped stores stop listening and refuse reads
+        feed.publish(120.0, BASE + 2)
+        with pytest.raises(HTTPException) as excinfo:
+            store.history("1m")
+        assert excinfo.value.status_code == 503
+
+    def test_one_process_records(self, tmp_path):
+        """Test that stores sharing a directory record each tick once, and hand over on stop"""
+        capacities = {"1s": 10, "1m": 10, "1h": 10}
+        owner, follower = CandleStore(str(tmp_path), capacities), CandleStore(str(tmp_path), capacities)
+        feed = PriceFeed(AsyncMock(), interval=1.0, max_staleness=5.0)
+        owner.start(feed)
+        follower.start(feed)
+        start = datetime.datetime.utcfromtimestamp(BASE)
+        try:
+            assert owner.owner and not follower.owner
+            feed.publish(100.0, BASE)
+            feed.publish(110.0, BASE + 1)
+            
+            # The follower serves the owner's candles, each tick counted once
+            minutes = follower.history("1m", start, start)
+            assert minutes["volume"] == [2.0] and minutes["close"] == [110.0]
+            
+            owner.stop()
+            feed.publish(120.0, BASE + 2)
+            assert follower.owner
+            assert follower.history("1m", start, start)["volume"] == [3.0]
+        finally:
+            owner.stop()
+            follower.stop()
@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+import orjson
+import pytest
+from fakeredis import aioredis
+from fastapi import HTTPException
+from unittest.mock import AsyncMock
+from models.schemas import CancelRequest, CancelResponse
+from services.idempotency_service import IdempotencyService, REPLAYED_HEADER
+
+TIMESTAMP = datetime.datetime(2025, 3, 1, 12, 0, 0)
+
+class TestIdempotencyService:
+
+    def setup_method(self, method):
+        self.redis = aioredis.FakeRedis()
+        self.service = IdempotencyService(self.redis, ttl=60, lock_ttl=1.0)
+        self.request = CancelRequest(order_id=7)
+        self.action = AsyncMock(return_value={"order_id": 7, "status": "cancelled", "timestamp": TIMESTAMP})
+
+    async def run(self, key="key-1", request=None):
+        return await self.service.run(key, "cancel", request or self.request, CancelResponse, self.action)
+
+    @pytest.mark.asyncio
+    async def test_without_key_runs_action(self):
+        """Test that requests without a key are passed straight through"""
+        result = await self.run(key=None)
+
+        assert result["status"] == "cancelled"
+        self.action.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_retry_replays_stored_response(self):
+        """Test that a retry gets the first response's bytes without running again"""
+        first = await self.run()
+        retry = await self.run()
+
+        assert first.status_code == retry.status_code == 200
+        assert first.body == retry.body
+        assert orjson.loads(first.body) == {"order_id": 7, "status": "cancelled", "timestamp": "2025-03-01T12:00:00"}
+        assert REPLAYED_HEADER not in first.headers
+        assert retry.headers[REPLAYED_HEADER] == "true"
+        self.action.assert_called_once()
+        assert 0 < await self.redis.ttl("idempotency:cancel:key-1") <= 60
+
+    @pytest.mark.asyncio
+    async def test_concurrent_retries_wait_for_the_original(self):
+        """Test that retries arriving mid-request share its result"""
+        async def slow_cancel():
+            await asyncio.sleep(0.02)
+            return {"order_id": 7, "status": "cancelled", "timestamp": TIMESTAMP}
+        self.action.side_effect = slow_cancel
+
+        responses = await asyncio.gather(*(self.run() for _ in range(10)))
+
+        assert self.action.call_count == 1
+        assert len({response.body for response in responses}) == 1
+        assert sum(REPLAYED_HEADER in response.headers for response in responses) == 9
+
+    @pytest.mark.asyncio
+    async def test_waits_for_another_process(self):
+        """Test that a key claimed elsewhere is polled until its response is stored"""
+        fingerprint = self.service.fingerprint("cancel", self.request)
+        await self.redis.set("idempotency:cancel:key-1", orjson.dumps({"fingerprint": fingerprint, "pending": "x"}))
+
+        async def finish_elsewhere():
+            await asyncio.sleep(0.03)
+            await self.redis.set("idempotency:cancel:key-1", orjson.dumps(
+                {"fingerprint": fingerprint, "status_code": 200, "body": '{"order_id":7}'}
+            ))
+        asyncio.ensure_future(finish_elsewhere())
+
+        response = await self.run()
+
+        assert response.body == b'{"order_id":7}'
+        self.action.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_stored(self):
+        """Test that a 4xx outcome is replayed rather than retried"""
+        self.action.side_effect = HTTPException(status_code=404, detail="Pending order not found")
+
+        first = await self.run()
+        retry = await self.run()
+
+        assert first.status_code == retry.status_code == 404
+        assert orjson.loads(retry.body) == {"detail": "Pending order not found"}
+        self.action.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_server_errors_release_the_key(self):
+        """Test that a 5xx outcome frees the key so a retry runs again"""
+        self.action.side_effect = [HTTPException(status_code=500, detail="Error fetching live price"),
+                                   {"order_id": 7, "status": "cancelled", "timestamp": TIMESTAMP}]
+
+        with pytest.raises(HTTPException):
+            await self.run()
+        assert await self.redis.get("idempotency:cancel:key-1") is None
+
+        response = await self.run()
+        assert response.status_code == 200
+        assert self.action.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_key_reused_for_another_request(self):
+        """Test that a key sent with a different body is refused"""
+        await self.run()
+
+        with pytest.raises(HTTPException) as excinfo:
+            await self.run(request=CancelRequest(order_id=8))
+        assert excinfo.value.status_code == 422
@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from services.journal_service import AccountState, JournalService, balance_event, order_event
+
+def order(id, status):
+    return {"id": id, "type": "buy", "kind": "market", "amount": 0.1, "price": 50000.0,
+            "trigger_price": None, "status": status, "created_at": "2025-03-01T12:00:00", "closed_at": None}
+
+def event(seq, type, payload):
+    return MagicMock(seq=seq, type=type, payload=payload)
+
+class TestAccountState:
+    
+    def test_apply_events(self):
+        """Test that balance events set the balances and only live orders stay in the state"""
+        state = AccountState()
+        state.apply(1, *balance_event("account_opened", MagicMock(cash_balance=10000.0, btc_balance=0.5)))
+        state.apply(2, *order_event("order_opened", order(1, "open")))
+        state.apply(3, *order_event("order_placed", order(2, "pending")))
+        state.apply(4, *order_event("order_closed", order(1, "closed")))
+        
+        assert (state.seq, state.cash_balance, state.btc_balance) == (4, 10000.0, 0.5)
+        assert list(state.orders) == [2]
+    
+    def test_snapshot_round_trip(self):
+        """Test that a state survives being stored as a snapshot"""
+        state = AccountState(7, 100.0, 2.0, {3: order(3, "open")})
+        restored = AccountState.from_snapshot(7, state.to_snapshot())
+        
+        assert (restored.seq, restored.cash_balance, restored.btc_balance) == (7, 100.0, 2.0)
+        assert restored.orders == {3: order(3, "open")}
+
+class TestJournalService:
+    
+    def setup_method(self, method):
+        self.mock_repo = AsyncMock()
+        self.service = JournalService(self.mock_repo, snapshot_interval=10)
+    
+    @pytest.mark.asyncio
+    async def test_rebuild_from_snapshot_and_tail(self):
+        """Test that a rebuild starts from the snapshot and reads only the events after it"""
+        self.mock_repo.get_snapshot.return_value = MagicMock(
+            seq=10, state={"cash_balance": 9000.0, "btc_balance": 0.6, "orders": [order(1, "open")]}
+        )
+        self.mock_repo.get_events.return_value = [
+            event(11, "order_opened", order(2, "open")),
+            event(12, "balance_changed", {"cash_balance": 4000.0, "btc_balance": 0.7}),
+        ]
+        
+        state = await self.service.rebuild()
+        
+        self.mock_repo.get_events.assert_called_once_with(10)
+        assert (state.seq, state.cash_balance, state.btc_balance) == (12, 4000.0, 0.7)
+        assert sorted(state.orders) == [1, 2]
+    
+    @pytest.mark.asyncio
+    async def test_record_snapshots_every_interval(self):
+        """Test that a snapshot is taken when an append crosses a multiple of the interval"""
+        self.mock_repo.get_snapshot.return_value = None
+        self.mock_repo.get_events.return_value = [
+            event(seq, "balance_changed", {"cash_balance": float(seq), "btc_balance": 0.0}) for seq in range(1, 11)
+        ]
+        
+        self.mock_repo.append.return_value = 9
+        await self.service.record([balance_event("balance_changed", MagicMock(cash_balance=9.0, btc_balance=0.0))])
+        self.mock_repo.save_snapshot.assert_not_called()
+        
+        self.mock_repo.append.return_value = 11
+        await self.service.record([
+            balance_event("balance_changed", MagicMock(cash_balance=10.0, btc_balance=0.0)),
+            balance_event("balance_changed", MagicMock(cash_balance=11.0, btc_balance=0.0)),
+        ])
+        seq, state = self.mock_repo.save_snapshot.call_args[0]
+        assert seq == 10
+        assert state == {"cash_balance": 10.0, "btc_balance": 0.0, "orders": []}
+    
+    @pytest.mark.asyncio
+    async def test_record_nothing(self):
+        """Test that recording no events doesn't touch the journal"""
+        assert await self.service.record([]) is None
+        self.mock_repo.append.assert_not_called()
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import threading
+import pytest
+from repositories.account_repo import AccountRepository
+from services.ledger_service import LedgerService
+from tests.conftest import TestingSessionLocal
+
+class TestLedgerService:
+    
+    @pytest.fixture
+    async def ledger(self, setup_database, account_with_balance, tmp_path):
+        ledger = LedgerService(journal_path=str(tmp_path / "ledger.journal"), flush_interval=3600)
+        await ledger.start(TestingSessionLocal)
+        yield ledger
+        await ledger.stop()
+    
+    async def read_account(self):
+        async with TestingSessionLocal() as session:
+            return await AccountRepository(session).get_account()
+    
+    @pytest.mark.asyncio
+    async def test_apply_updates_balances_in_memory(self, ledger, account_with_balance):
+        """Test that changes are applied in memory and journaled before Postgres sees them"""
+        balance = await ledger.apply(account_with_balance.id, -5000.0, 0.1)
+        
+        assert balance.cash_balance == 5000.0
+        assert balance.btc_balance == 1.1
+        assert ledger.pending_count == 1
+        assert (await self.read_account()).cash_balance == 10000.0
+        
+        with open(ledger.journal_path) as journal:
+            entry = json.loads(journal.readline())
+        assert entry["cash_balance"] == 5000.0
+    
+    @pytest.mark.asyncio
+    async def test_apply_rejects_overdraft(self, ledger, account_with_balance):
+        """Test that the ledger refuses changes the balances can't cover"""
+        assert await ledger.apply(account_with_balance.id, -20000.0, 0.4) is None
+        assert await ledger.apply(account_with_balance.id, 100000.0, -2.0) is None
+        assert ledger.pending_count == 0
+        
+        # Forced compensations bypass the guard
+        balance = await ledger.apply(account_with_balance.id, -20000.0, 0.0, force=True)
+        assert balance.cash_balance == -10000.0
+    
+    @pytest.mark.asyncio
+    async def test_apply_unknown_account(self, ledger):
+        """Test applying a change to an account the ledger doesn't hold"""
+        assert await ledger.apply(9999, 100.0, 0.0) is None
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_applies_never_overdraw(self, ledger, account_with_balance):
+        """Test that parallel trades against one account can't spend the same cash twice"""
+        results = await asyncio.gather(*[
+            ledger.apply(account_with_balance.id, -1000.0, 0.02) for _ in range(50)
+        ])
+        
+        assert sum(1 for result in results if result is not None) == 10
+        assert ledger.get(account_with_balance.id).cash_balance == 0.0
+    
+    @pytest.mark.asyncio
+    async def test_flush_writes_behind_and_truncates_journal(self, ledger, account_with_balance):
+        """Test that the write-behind persists the latest balances and resets the journal"""
+        await ledger.apply(account_with_balance.id, -5000.0, 0.1)
+        await ledger.apply(account_with_balance.id, -1000.0, 0.02)
+        
+        await ledger.flush()
+        
+        account = await self.read_account()
+        assert account.cash_balance == 4000.0
+        assert account.btc_balance == pytest.approx(1.12)
+        assert account.ledger_seq == 2
+        assert ledger.pending_count == 0
+        with open(ledger.journal_path) as journal:
+            assert journal.read() == ""
+
+    @pytest.mark.asyncio
+    async def test_flush_compacts_journal_under_load(self, ledger, account_with_balance):
+        """Test that entries journaled during a flush are carried over and the rest dropped"""
+        await ledger.apply(account_with_balance.id, -5000.0, 0.1)
+        flush = asyncio.create_task(ledger.flush())
+        await asyncio.sleep(0)  # the flush is now writing behind
+        await ledger.apply(account_with_balance.id, -1000.0, 0.02)
+        await flush
+
+        assert (await self.read_account()).ledger_seq == 1
+        assert ledger.pending_count == 1
+        with open(ledger.journal_path) as journal:
+            assert [json.loads(line)["seq"] for line in journal] == [2]
+
+        # Later entries append to the compacted journal
+        await ledger.apply(account_with_balance.id, -1000.0, 0.02)
+        with open(ledger.journal_path) as journal:
+            assert [json.loads(line)["seq"] for line in journal] == [2, 3]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_flush_keeps_batch(self, ledger, account_with_balance):
+        """Test that a flush cancelled mid-write leaves its entries pending"""
+        await ledger.apply(account_with_balance.id, -5000.0, 0.1)
+        flush = asyncio.create_task(ledger.flush())
+        await asyncio.sleep(0)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+
+        assert ledger.pending_count == 1
+        await ledger.flush()
+        assert (await self.read_account()).ledger_seq == 1
+
+    @pytest.mark.asyncio
+    async def test_flush_during_fsync_keeps_entry(self, setup_database, account_with_balance, tmp_path, monkeypatch):
+        """Test that a flush finishing while an entry is being fsynced can't drop it"""
+        ledger = LedgerService(journal_path=str(tmp_path / "ledger.journal"), flush_interval=3600, fsync="always")
+        await ledger.start(TestingSessionLocal)
+        fsyncing, release = threading.Event(), threading.Event()
+        def slow_fsync(fd):
+            fsyncing.set()
+            release.wait(5)
+        monkeypatch.setattr("services.ledger_service.os.fsync", slow_fsync)
+
+        apply = asyncio.create_task(ledger.apply(account_with_balance.id, -5000.0, 0.1))
+        while not fsyncing.is_set():
+            await asyncio.sleep(0.001)
+        await ledger.flush()
+        release.set()
+        await apply
+
+        # The flush wrote the entry behind instead of discarding it with the journal
+        account = await self.read_account()
+        assert account.cash_balance == 5000.0
+        assert account.ledger_seq == 1
+        await ledger.stop()
+
+    @pytest.mark.asyncio
+    async def test_replay_after_crash(self, setup_database, account_with_balance, tmp_path):
+        """Test that journaled changes that never reached Postgres are recovered on startup"""
+        journal_path = str(tmp_path / "ledger.journal")
+        crashed = LedgerService(journal_path=journal_path, flush_interval=3600)
+        await crashed.start(TestingSessionLocal)
+        await crashed.apply(account_with_balance.id, -5000.0, 0.1)
+        await crashed.flush()
+        await crashed.apply(account_with_balance.id, -1000.0, 0.02)
+        # Simulate a crash: the loop dies without a final flush, leaving a torn write behind
+        crashed._task.cancel()
+        crashed._journal.write('{"seq": 3, "acc')
+        crashed._journal.close()
+        
+        recovered = LedgerService(journal_path=journal_path, flush_interval=3600)
+        await recovered.start(TestingSessionLocal)
+        
+        assert recovered.get(account_with_balance.id).cash_balance == 4000.0
+        assert recovered.pending_count == 1
+        with open(journal_path) as journal:
+            assert [json.loads(line)["seq"] for line in journal] == [2]
+        
+        # New entries continue the sequence and the replayed change reaches Postgres
+        balance = await recovered.apply(account_with_balance.id, 0.0, -0.12)
+        await recovered.stop()
+        account = await self.read_account()
+        assert account.cash_balance == 4000.0
+        assert account.btc_balance == pytest.approx(balance.btc_balance)
+        assert account.ledger_seq == 3
+    
+    @pytest.mark.asyncio
+    async def test_loads_accounts_opened_after_start(self, ledger):
+        """Test that accounts created after startup are picked up on first use"""
+        async with TestingSessionLocal() as session:
+            account = await AccountRepository(session).create_account(cash_balance=500.0, btc_balance=0.0)
+        
+        assert ledger.get(account.id) is None
+        assert (await ledger.load(account.id)).cash_balance == 500.0
+        assert (await ledger.apply(account.id, -100.0, 0.002)).cash_balance == 400.0
+        assert await ledger.load(9999) is None
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from services.matching_engine import MatchingEngine, RestingOrder
+from services.price_feed import PriceFeed
+
+def order(order_id, type, kind, trigger_price, account_id=1, amount=0.1):
+    return RestingOrder(order_id, account_id, type, kind, amount, trigger_price)
+
+class TestMatchingEngine:
+    
+    def setup_method(self, method):
+        self.engine = MatchingEngine(fill_concurrency=2)
+    
+    def test_triggers_by_side_and_kind(self):
+        """Test that limits trigger on favourable moves and stops on adverse ones"""
+        self.engine.add(order(1, "buy", "limit", 49000.0))
+        self.engine.add(order(2, "sell", "limit", 51000.0))
+        self.engine.add(order(3, "buy", "stop", 51000.0))
+        self.engine.add(order(4, "sell", "stop", 49000.0))
+        
+        assert self.engine.triggered(50000.0) == []
+        assert {o.order_id for o in self.engine.triggered(48500.0)} == {1, 4}
+        assert {o.order_id for o in self.engine.triggered(51000.0)} == {2, 3}
+        assert self.engine.resting_count == 0
+    
+    def test_pops_only_the_triggered_prefix(self):
+        """Test that a tick takes the reachable orders, nearest trigger first, and leaves the rest"""
+        for order_id, trigger in enumerate([48000.0, 49500.0, 47000.0, 49000.0], start=1):
+            self.engine.add(order(order_id, "buy", "limit", trigger))
+        
+        assert [o.order_id for o in self.engine.triggered(49000.0)] == [2, 4]
+        assert self.engine.resting_count == 2
+        assert [o.order_id for o in self.engine.triggered(40000.0)] == [1, 3]
+    
+    def test_cancel_is_lazy(self):
+        """Test that cancelled orders never trigger and their entries are dropped when reached"""
+        self.engine.add(order(1, "buy", "limit", 49000.0))
+        self.engine.add(order(2, "buy", "limit", 48000.0))
+        
+        assert self.engine.cancel(1)
+        assert not self.engine.cancel(1)
+        assert [o.order_id for o in self.engine.triggered(47000.0)] == [2]
+        assert self.engine._stale == 0
+    
+    def test_mass_cancel_compacts_heaps(self):
+        """Test that heaps are rebuilt once cancelled entries outnumber live ones"""
+        for order_id in range(3000):
+            self.engine.add(order(order_id, "buy", "limit", 40000.0 + order_id))
+        for order_id in range(2000):
+            self.engine.cancel(order_id)
+        
+        assert len(self.engine._books[("buy", "limit")]) < 3000
+        assert self.engine.resting_count == 1000
+        assert len(self.engine.triggered(0.0)) == 1000
+    
+    @pytest.mark.asyncio
+    async def test_fill_groups_by_account_and_retries_failures(self):
+        """Test that fills run per account and a failed account's orders rest again"""
+        calls = {}
+        async def fill_orders(account_id, orders, price):
+            calls[account_id] = [o.order_id for o in orders]
+            if account_id == 2:
+                raise RuntimeError("database down")
+        self.engine._fill_orders = fill_orders
+        
+        await self.engine.fill(
+            [order(1, "buy", "limit", 49000.0), order(2, "buy", "limit", 49000.0, account_id=2),
+             order(3, "sell", "stop", 49000.0)],
+            48000.0
+        )
+        
+        assert calls == {1: [1, 3], 2: [2]}
+        assert [o.order_id for o in self.engine.triggered(48000.0)] == [2]
+    
+    @pytest.mark.asyncio
+    async def test_ticks_drive_fills(self):
+        """Test that the engine matches each new price feed tick, and new orders against the last one"""
+        feed = PriceFeed(AsyncMock(), interval=1.0, max_staleness=5.0)
+        fill_orders = AsyncMock()
+        await self.engine.start(feed, fill_orders, [order(1, "buy", "limit", 49000.0)])
+        try:
+            feed.publish(50000.0)
+            await asyncio.sleep(0)
+            fill_orders.assert_not_called()
+            
+            feed.publish(48000.0)
+            await asyncio.sleep(0.01)
+            fill_orders.assert_called_once_with(1, [order(1, "buy", "limit", 49000.0)], 48000.0)
+            
+            self.engine.add(order(2, "sell", "stop", 48500.0))
+            await asyncio.sleep(0.01)
+            assert fill_orders.call_args[0][1] == [order(2, "sell", "stop", 48500.0)]
+        finally:
+            await self.engine.stop()
+        
+        assert not self.engine.running
@@ -0,0 +1,185 @@
+import gzip
+import orjson
+import pytest
+from fakeredis import aioredis
+from unittest.mock import AsyncMock, MagicMock
+from services.order_cache_service import OrderCacheService, CACHE_VERSION
+
+KEYS = ["order_history:version", "order_history:index", "order_history:orders", "order_history:complete"]
+GENERATION = "order_history:generation"
+
+def make_order(order_id, created_at="2025-03-01T12:00:00", status="open"):
+    return {
+        "id": order_id,
+        "type": "buy",
+        "amount": 0.1,
+        "price": 50000.0,
+        "status": status,
+        "created_at": created_at,
+        "closed_at": None,
+    }
+
+class TestOrderCacheService:
+
+    def setup_method(self, method):
+        self.mock_redis = MagicMock()
+        self.mock_redis.get = AsyncMock()
+        self.mock_redis.delete = AsyncMock()
+        self.scripts = {}
+
+        def register_script(source):
+            script = AsyncMock(return_value=1)
+            self.scripts[len(self.scripts)] = script
+            return script
+
+        self.mock_redis.register_script.side_effect = register_script
+        self.cache = OrderCacheService(self.mock_redis, window=3, ttl=60)
+        self.get_page, self.apply, self.rebuild = (self.scripts[i] for i in range(3))
+
+    @pytest.mark.asyncio
+    async def test_get_page_hit(self):
+        """Test that cached orders come back encoded, in order"""
+        entries = [orjson.dumps(make_order(2)), orjson.dumps(make_order(1))]
+        self.get_page.return_value = entries
+
+        result = await self.cache.get_page(2)
+
+        assert result == entries
+        self.get_page.assert_called_once_with(keys=KEYS, args=[CACHE_VERSION, 2])
+
+    @pytest.mark.asyncio
+    async def test_get_page_of_status(self):
+        """Test that a status reads its own window"""
+        self.get_page.return_value = []
+        await self.cache.get_page(2, "open")
+        assert self.get_page.call_args[1]["keys"][0] == "order_history:open:version"
+
+    @pytest.mark.asyncio
+    async def test_get_page_version_mismatch(self):
+        """Test that a missing or outdated version reads as a miss"""
+        self.get_page.return_value = None
+        assert await self.cache.get_page(2) is None
+
+    @pytest.mark.asyncio
+    async def test_get_page_missing_entry(self):
+        """Test that an index entry without its order reads as a miss"""
+        self.get_page.return_value = [orjson.dumps(make_order(2)), None]
+        assert await self.cache.get_page(2) is None
+
+    @pytest.mark.asyncio
+    async def test_add_orders_scores_by_creation_time(self):
+        """Test that new orders go to every window with a (created_at, id) ordering"""
+        order = make_order(42, created_at="1970-01-01T00:00:01.000005")
+
+        assert await self.cache.add_orders([order]) is True
+
+        keys, args = self.apply.call_args[1]["keys"], self.apply.call_args[1]["args"]
+        assert keys[0] == GENERATION
+        assert keys[1:5] == KEYS
+        assert args == [
+            CACHE_VERSION, 3, 3, "", "open", "closed",
+            "add", 1000005, "000000000042", orjson.dumps(order), "open"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_update_orders_patches_in_place(self):
+        """Test that changed orders are sent as updates, with their status"""
+        order = make_order(42, status="closed")
+
+        await self.cache.update_orders([order])
+
+        args = self.apply.call_args[1]["args"]
+        assert args[6:] == ["update", self.cache._score(order), "000000000042", orjson.dumps(order), "closed"]
+
+    @pytest.mark.asyncio
+    async def test_rebuild_is_guarded_by_generation(self):
+        """Test that rebuilds carry the generation read before the database query"""
+        self.rebuild.return_value = 0
+        orders = [make_order(i) for i in range(5, 0, -1)]
+
+        assert await self.cache.rebuild(orders, 9) is False
+
+        args = self.rebuild.call_args[1]["args"]
+        # A full window may have more orders beyond it
+        assert args[:4] == [CACHE_VERSION, 9, 60, "0"]
+        # Only the window is written
+        assert len(args[4:]) == 3 * 3
+
+    @pytest.mark.asyncio
+    async def test_generation(self):
+        """Test reading the mutation counter"""
+        self.mock_redis.get.return_value = b"12"
+        assert await self.cache.generation() == 12
+
+        self.mock_redis.get.return_value = None
+        assert await self.cache.generation() == 0
+
+    def test_compress_page_reuses_unchanged_pages(self):
+        """Test that an unchanged page is compressed once, and a changed one again"""
+        body = orjson.dumps([make_order(i) for i in range(3)])
+        compressed = self.cache.compress_page(body, 3, "open")
+        
+        assert gzip.decompress(compressed) == body
+        assert self.cache.compress_page(bytes(body), 3, "open") is compressed
+        
+        changed = orjson.dumps([make_order(i, status="closed") for i in range(3)])
+        assert gzip.decompress(self.cache.compress_page(changed, 3, "open")) == changed
+        # Other windows and limits are kept apart
+        assert gzip.decompress(self.cache.compress_page(body, 2, "open")) == body
+
+    @pytest.mark.asyncio
+    async def test_invalidate(self):
+        """Test that invalidating drops every window's version marker"""
+        await self.cache.invalidate()
+        self.mock_redis.delete.assert_called_once_with(
+            "order_history:version", "order_history:open:version", "order_history:closed:version"
+        )
+
+
+class TestOrderCacheWindows:
+    """The cache scripts, run against fakeredis"""
+
+    def setup_method(self, method):
+        self.redis = aioredis.FakeRedis()
+        self.cache = OrderCacheService(self.redis, window=3, ttl=60)
+
+    def order(self, order_id, status="open"):
+        return make_order(order_id, created_at=f"2025-03-01T12:00:{order_id:02d}", status=status)
+
+    async def page(self, limit, status=None):
+        entries = await self.cache.get_page(limit, status)
+        return None if entries is None else [orjson.loads(entry)["id"] for entry in entries]
+
+    @pytest.mark.asyncio
+    async def test_orders_move_between_status_windows(self):
+        """Test that closing an open order moves it from the open window to the closed one"""
+        for status in (None, "open", "closed"):
+            await self.cache.rebuild([], await self.cache.generation(), status)
+        await self.cache.add_orders([self.order(1), self.order(2)])
+
+        await self.cache.update_orders([self.order(1, status="closed")])
+
+        assert await self.page(3) == [2, 1]
+        assert await self.page(3, "open") == [2]
+        assert await self.page(3, "closed") == [1]
+
+    @pytest.mark.asyncio
+    async def test_incomplete_window_serves_only_what_it_covers(self):
+        """Test that a window with orders beyond it misses for pages it can't fill"""
+        generation = await self.cache.generation()
+        await self.cache.rebuild([self.order(i) for i in (5, 4, 3)], generation, "open")
+        await self.cache.update_orders([self.order(5, status="closed")])
+
+        assert await self.page(2, "open") == [4, 3]
+        # Open orders older than the window may exist, so a full page needs the database
+        assert await self.page(3, "open") is None
+        # An old order filled into the open set lies beyond the window and is skipped
+        await self.cache.update_orders([self.order(1)])
+        assert await self.page(3, "open") is None
+
+    @pytest.mark.asyncio
+    async def test_windows_expire(self):
+        """Test that a rebuilt window expires, bounding staleness from a lost update"""
+        await self.cache.rebuild([self.order(1)], await self.cache.generation())
+        assert 0 < await self.redis.ttl(KEYS[0]) <= 60
+        assert 0 < await self.redis.ttl(KEYS[1]) <= 60
@@ -1,53 +1,83 @@
 import pytest
 import unittest
 import datetime
+import time
+import orjson
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi import HTTPException, BackgroundTasks
 from services.order_service import OrderService
+from services.matching_engine import RestingOrder
 from models.db_models import Account, TradeOrder
 
 class TestOrderService:
     
     def setup_method(self, method):
         self.mock_order_repo = AsyncMock()
+        self.mock_uow = MagicMock()
+        self.mock_order_repo.unit_of_work = MagicMock(return_value=self.mock_uow)
         self.mock_account_service = AsyncMock()
         self.mock_cache_service = AsyncMock()
         self.mock_bg_tasks = MagicMock(spec=BackgroundTasks)
-        
-        # Mock MongoDB
-        self.mock_collection = MagicMock()
-        self.patch_mongo = patch('pymongo.MongoClient', autospec=True)
-        self.mock_mongo_client = self.patch_mongo.start()
-        self.mock_mongo_client.return_value.__getitem__.return_value.__getitem__.return_value = self.mock_collection
+        self.mock_trade_log = AsyncMock()
+        self.mock_order_cache = AsyncMock()
+        self.mock_books = MagicMock()
+        self.mock_engine = MagicMock()
         
         self.service = OrderService(
             self.mock_order_repo,
             self.mock_account_service,
             self.mock_cache_service,
-            self.mock_bg_tasks
+            self.mock_bg_tasks,
+            self.mock_trade_log,
+            self.mock_order_cache,
+            self.mock_books,
+            self.mock_engine
         )
     
-    def teardown_method(self):
-        self.patch_mongo.stop()
-    
     @pytest.mark.asyncio
     async def test_get_order_history_from_cache(self):
-        """Test getting order history from cache"""
-        cached_orders = [{"id": 1, "type": "buy", "amount": 0.1}]
-        self.mock_cache_service.get_json.return_value = cached_orders
+        """Test that cached entries are joined into the body without decoding"""
+        cached_orders = [b'{"id":2,"type":"buy","amount":0.1}', b'{"id":1,"type":"buy","amount":0.1}']
+        self.mock_order_cache.get_page.return_value = cached_orders
         
         result = await self.service.get_order_history()
         
-        assert result == cached_orders
-        self.mock_cache_service.get_json.assert_called_once_with("order_history")
-        # Verify we didn't query the database
-        self.mock_order_repo.get_all_orders.assert_not_called()
+        assert result["body"] == b'[{"id":2,"type":"buy","amount":0.1},{"id":1,"type":"buy","amount":0.1}]'
+        assert result["next_cursor"] is None
+        self.mock_order_cache.get_page.assert_called_once_with(100, None)
+        # Verify we didn't query the database or rebuild the cache
+        self.mock_order_repo.list_orders.assert_not_called()
+        self.mock_order_cache.rebuild.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_get_order_history_from_cache_gzipped(self):
+        """Test that a large cached page is sent pre-compressed to clients accepting gzip"""
+        cached_orders = [
+            orjson.dumps({"id": i, "type": "buy", "created_at": "2025-03-01T12:00:00"}) for i in range(500, 0, -1)
+        ]
+        self.mock_order_cache.get_page.return_value = cached_orders
+        self.mock_order_cache.compress_page = MagicMock(return_value=b"gzipped")
+        
+        result = await self.service.get_order_history(limit=500, status="open", accept_gzip=True)
+        
+        assert result["body"] == b"gzipped"
+        assert result["encoding"] == "gzip"
+        self.mock_order_cache.compress_page.assert_called_once_with(
+            b"[" + b",".join(cached_orders) + b"]", 500, "open"
+        )
+        
+        # Small pages are left to be sent as they are
+        self.mock_order_cache.get_page.return_value = cached_orders[:1]
+        result = await self.service.get_order_history(limit=500, status="open", accept_gzip=True)
+        assert result["encoding"] is None
+        assert orjson.loads(result["body"])[0]["id"] == 500
     
     @pytest.mark.asyncio
     async def test_get_order_history_from_db(self):
         """Test getting order history from database when not in cache"""
         # Set up cache miss
-        self.mock_cache_service.get_json.return_value = None
+        self.mock_order_cache.get_page.return_value = None
+        self.mock_order_cache.generation.return_value = 7
         
         # Set up mock orders
         created_at = datetime.datetime(2025, 3, 1, 12, 0, 0)
@@ -55,45 +85,110 @@ class TestOrderService:
             MagicMock(
                 id=1, 
                 type="buy", 
+                kind="market",
                 amount=0.1, 
                 price=50000.0, 
+                trigger_price=None,
                 status="open",
                 created_at=created_at,
                 closed_at=None
             )
         ]
-        self.mock_order_repo.get_all_orders.return_value = mock_orders
+        self.mock_order_repo.list_orders.return_value = mock_orders
         
         result = await self.service.get_order_history()
         
         # Verify we queried both cache and database
-        self.mock_cache_service.get_json.assert_called_once_with("order_history")
-        self.mock_order_repo.get_all_orders.assert_called_once()
+        self.mock_order_cache.get_page.assert_called_once_with(100, None)
+        self.mock_order_repo.list_orders.assert_called_once()
         
-        # Verify we cached the result
-        self.mock_cache_service.set_json.assert_called_once()
-        call_args = self.mock_cache_service.set_json.call_args
-        assert call_args[0][0] == "order_history"
-        assert isinstance(call_args[0][1], list)
-        assert call_args[0][1][0]["id"] == 1
-        assert call_args[0][2] == 30  # 30 second expiration
+        # Verify we rebuilt the cache against the generation read before the query
+        self.mock_order_cache.rebuild.assert_called_once()
+        call_args = self.mock_order_cache.rebuild.call_args
+        assert isinstance(call_args[0][0], list)
+        assert call_args[0][0][0]["id"] == 1
+        assert call_args[0][1] == 7
+        assert call_args[0][2] is None
         
         # Verify the returned data
-        assert isinstance(result, list)
-        assert len(result) == 1
-        assert result[0]["id"] == 1
-        assert result[0]["type"] == "buy"
+        orders = orjson.loads(result["body"])
+        assert len(orders) == 1
+        assert orders[0]["id"] == 1
+        assert orders[0]["type"] == "buy"
+        assert orders[0]["created_at"] == "2025-03-01T12:00:00"
+    
+    @pytest.mark.asyncio
+    async def test_get_order_history_status_from_cache(self):
+        """Test that the first page of a cached status is served from its window"""
+        self.mock_order_cache.get_page.return_value = [b'{"id":2,"status":"open"}']
+        
+        result = await self.service.get_order_history(limit=500, status="open")
+        
+        assert result["body"] == b'[{"id":2,"status":"open"}]'
+        self.mock_order_cache.get_page.assert_called_once_with(500, "open")
+        self.mock_order_repo.list_orders.assert_not_called()
+        
+        # A miss rebuilds that status's window
+        self.mock_order_cache.get_page.return_value = None
+        self.mock_order_repo.list_orders.return_value = []
+        await self.service.get_order_history(limit=100, status="closed")
+        self.mock_order_repo.list_orders.assert_called_once_with(500, status="closed", primary=True)
+        assert self.mock_order_cache.rebuild.call_args[0][2] == "closed"
+    
+    @pytest.mark.asyncio
+    async def test_get_order_history_filtered_page(self):
+        """Test that filtered pages go to the database with a decoded cursor"""
+        created_at = datetime.datetime(2025, 3, 1, 12, 0, 0)
+        mock_orders = [
+            MagicMock(id=5, type="buy", kind="market", amount=0.1, price=50000.0, trigger_price=None,
+                      status="open", created_at=created_at, closed_at=None)
+        ]
+        self.mock_order_repo.list_orders.return_value = mock_orders
+        cursor = self.service.encode_cursor({"created_at": "2025-03-02T00:00:00", "id": 9})
+        
+        result = await self.service.get_order_history(limit=1, cursor=cursor, status="open")
+        
+        self.mock_order_cache.get_page.assert_not_called()
+        self.mock_order_repo.list_orders.assert_called_once_with(
+            1,
+            cursor=(datetime.datetime(2025, 3, 2), 9),
+            status="open",
+            type=None,
+            created_from=None,
+            created_to=None
+        )
+        # A full page comes back with a cursor pointing at its last order
+        assert result["next_cursor"] == self.service.encode_cursor(orjson.loads(result["body"])[-1])
+    
+    @pytest.mark.asyncio
+    async def test_get_order_history_cursor_from_cache(self):
+        """Test that a full cached page decodes its last entry for the cursor"""
+        self.mock_order_cache.get_page.return_value = [
+            b'{"id":2,"created_at":"2025-03-01T12:00:01"}', b'{"id":1,"created_at":"2025-03-01T12:00:00"}'
+        ]
+        
+        result = await self.service.get_order_history(limit=2)
+        
+        assert result["next_cursor"] == self.service.encode_cursor({"id": 1, "created_at": "2025-03-01T12:00:00"})
+    
+    @pytest.mark.asyncio
+    async def test_get_order_history_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        with pytest.raises(HTTPException) as excinfo:
+            await self.service.get_order_history(cursor="not-a-cursor")
+        assert excinfo.value.status_code == 400
     
     @pytest.mark.asyncio
-    async def test_invalidate_order_cache(self):
-        """Test invalidating the order cache"""
-        await self.service.invalidate_order_cache()
-        self.mock_cache_service.delete.assert_called_once_with("order_history")
+    async def test_log_trade_action(self):
+        """Test that trade logs are queued for the batched writer"""
+        log_entry = {"order_id": 1, "action": "create"}
+        await self.service.log_trade_action(log_entry)
+        self.mock_trade_log.submit.assert_called_once_with(log_entry)
     
     @pytest.mark.asyncio
     async def test_create_trade_buy(self):
         """Test creating a buy trade"""
-        with patch('services.price_service.PriceService.fetch_live_price', return_value=50000.0):
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(50000.0, time.time())):
             # Set up mock account after buy
             mock_account = MagicMock(cash_balance=5000.0, btc_balance=1.1)
             self.mock_account_service.process_buy.return_value = mock_account
@@ -117,9 +212,18 @@ class TestOrderService:
             # Verify order was created
             self.mock_order_repo.create_order.assert_called_once_with("buy", 0.1, 50000.0)
             
+            # Verify both writes ran in one committed unit of work
+            self.mock_order_repo.unit_of_work.assert_called_once()
+            self.mock_uow.__aexit__.assert_called_once_with(None, None, None)
+            
             # Verify background tasks were added
             assert self.mock_bg_tasks.add_task.call_count == 2
             
+            # Verify the new order is appended to the cache rather than invalidating it
+            cache_call = self.mock_bg_tasks.add_task.call_args_list[1]
+            assert cache_call[0][0] == self.mock_order_cache.add_orders
+            assert cache_call[0][1][0]["id"] == 1
+            
             # Verify the result
             assert result["order_id"] == 1
             assert result["price"] == 50000.0
@@ -129,7 +233,7 @@ class TestOrderService:
     @pytest.mark.asyncio
     async def test_create_trade_sell(self):
         """Test creating a sell trade"""
-        with patch('services.price_service.PriceService.fetch_live_price', return_value=50000.0):
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(50000.0, time.time())):
             mock_account = MagicMock(cash_balance=15000.0, btc_balance=0.3)
             self.mock_account_service.process_sell.return_value = mock_account
 
@@ -159,10 +263,67 @@ class TestOrderService:
             await self.service.create_trade("hold", 0.1)
         assert excinfo.value.status_code == 400
 
+    @pytest.mark.asyncio
+    async def test_create_trades_batch(self):
+        """Test creating a batch of trades with cumulative feasibility checks"""
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(50000.0, time.time())):
+            self.mock_account_service.lock_account.return_value = MagicMock(cash_balance=6000.0, btc_balance=0.1)
+            created_at = datetime.datetime(2025, 3, 1, 12, 0, 0)
+            self.mock_order_repo.create_orders.return_value = [
+                MagicMock(id=10, type="buy", amount=0.1, price=50000.0, created_at=created_at),
+                MagicMock(id=11, type="sell", amount=0.15, price=50000.0, created_at=created_at),
+            ]
+            mock_account = MagicMock(cash_balance=8500.0, btc_balance=0.05)
+            self.mock_account_service.apply_balance_delta.return_value = mock_account
+            
+            result = await self.service.create_trades([
+                ("buy", 0.1),    # 5000 of 6000 cash
+                ("buy", 0.1),    # only 1000 cash left
+                ("sell", 0.15),  # 0.2 BTC after the first buy
+                ("hold", 0.1),
+            ])
+            
+            # Accepted trades are inserted together and settled with one net delta
+            self.mock_order_repo.create_orders.assert_called_once_with(
+                [("buy", 0.1, 50000.0), ("sell", 0.15, 50000.0)]
+            )
+            cash_delta, btc_delta, _ = self.mock_account_service.apply_balance_delta.call_args[0]
+            assert cash_delta == pytest.approx(2500.0)
+            assert btc_delta == pytest.approx(-0.05)
+            self.mock_order_repo.unit_of_work.assert_called_once()
+            
+            assert result["results"] == [
+                {"index": 0, "status": "filled", "order_id": 10},
+                {"index": 1, "status": "rejected", "error": "Insufficient cash balance"},
+                {"index": 2, "status": "filled", "order_id": 11},
+                {"index": 3, "status": "rejected", "error": "Invalid trade type"},
+            ]
+            assert result["account"] == {"cash_balance": 8500.0, "btc_balance": 0.05}
+            
+            # One batched log write and one cache append
+            assert self.mock_bg_tasks.add_task.call_count == 2
+            log_call = self.mock_bg_tasks.add_task.call_args_list[0]
+            assert log_call[0][0] == self.mock_trade_log.submit_many
+            assert [entry["order_id"] for entry in log_call[0][1]] == [10, 11]
+    
+    @pytest.mark.asyncio
+    async def test_create_trades_all_rejected(self):
+        """Test that a batch with nothing feasible writes nothing"""
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(50000.0, time.time())):
+            self.mock_account_service.lock_account.return_value = MagicMock(cash_balance=100.0, btc_balance=0.0)
+            
+            result = await self.service.create_trades([("buy", 0.1), ("sell", 0.1)])
+            
+            self.mock_order_repo.create_orders.assert_not_called()
+            self.mock_account_service.apply_balance_delta.assert_not_called()
+            self.mock_bg_tasks.add_task.assert_not_called()
+            assert [r["status"] for r in result["results"]] == ["rejected", "rejected"]
+            assert result["account"] == {"cash_balance": 100.0, "btc_balance": 0.0}
+    
     @pytest.mark.asyncio
     async def test_close_trade_buy(self):
         """Test closing a buy trade order"""
-        with patch('services.price_service.PriceService.fetch_live_price', return_value=55000.0):
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(55000.0, time.time())):
             # Set up an open buy order
             mock_order = MagicMock(
                 id=3,
@@ -193,7 +354,8 @@ class TestOrderService:
 
             result = await self.service.close_trade(3)
 
-            self.mock_order_repo.get_open_order_by_id.assert_called_once_with(3)
+            # The order is closed with a single guarded update, without a prior lookup
+            self.mock_order_repo.get_open_order_by_id.assert_not_called()
             self.mock_account_service.close_buy_order.assert_called_once_with(0.1, 55000.0)
             self.mock_order_repo.close_order.assert_called_once_with(3)
 
@@ -206,7 +368,7 @@ class TestOrderService:
     @pytest.mark.asyncio
     async def test_close_trade_sell(self):
         """Test closing a sell trade order"""
-        with patch('services.price_service.PriceService.fetch_live_price', return_value=55000.0):
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(55000.0, time.time())):
             # Set up an open sell order
             mock_order = MagicMock(
                 id=4,
@@ -237,7 +399,8 @@ class TestOrderService:
 
             result = await self.service.close_trade(4)
 
-            self.mock_order_repo.get_open_order_by_id.assert_called_once_with(4)
+            # The order is closed with a single guarded update, without a prior lookup
+            self.mock_order_repo.get_open_order_by_id.assert_not_called()
             self.mock_account_service.close_sell_order.assert_called_once_with(0.15, 55000.0)
             self.mock_order_repo.close_order.assert_called_once_with(4)
 
@@ -250,7 +413,196 @@ class TestOrderService:
     @pytest.mark.asyncio
     async def test_close_trade_not_found(self):
         """Test closing a trade that doesn't exist"""
-        self.mock_order_repo.get_open_order_by_id.return_value = None
+        self.mock_order_repo.close_order.return_value = None
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(55000.0, time.time())):
+            with pytest.raises(HTTPException) as excinfo:
+                await self.service.close_trade(999)
+        assert excinfo.value.status_code == 404
+        self.mock_account_service.close_buy_order.assert_not_called()
+        self.mock_account_service.close_sell_order.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_close_trades_bulk(self):
+        """Test closing many orders with one aggregated balance change"""
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(60000.0, time.time())):
+            closed_at = datetime.datetime(2025, 3, 1, 16, 0, 0)
+            self.mock_order_repo.close_orders.return_value = [
+                MagicMock(id=1, type="buy", amount=0.3, price=50000.0, status="closed",
+                          created_at=closed_at, closed_at=closed_at),
+                MagicMock(id=2, type="sell", amount=0.1, price=50000.0, status="closed",
+                          created_at=closed_at, closed_at=closed_at),
+            ]
+            mock_account = MagicMock(cash_balance=22000.0, btc_balance=0.3)
+            self.mock_account_service.apply_balance_delta.return_value = mock_account
+            
+            result = await self.service.close_trades(order_ids=[1, 2, 3])
+            
+            self.mock_order_repo.close_orders.assert_called_once_with([1, 2, 3], None, None, None)
+            # Selling 0.3 BTC and buying back 0.1 BTC nets out to selling 0.2 BTC
+            cash_delta, btc_delta, _ = self.mock_account_service.apply_balance_delta.call_args[0]
+            assert cash_delta == pytest.approx(12000.0)
+            assert btc_delta == pytest.approx(-0.2)
+            
+            assert result["closed_order_ids"] == [1, 2]
+            assert result["close_price"] == 60000.0
+            assert result["account"] == {"cash_balance": 22000.0, "btc_balance": 0.3}
+            
+            # Caches and logs are updated once for the whole batch
+            assert self.mock_bg_tasks.add_task.call_count == 2
+            cache_call = self.mock_bg_tasks.add_task.call_args_list[1]
+            assert cache_call[0][0] == self.mock_order_cache.update_orders
+            assert [order["id"] for order in cache_call[0][1]] == [1, 2]
+    
+    @pytest.mark.asyncio
+    async def test_close_trades_nothing_open(self):
+        """Test a bulk close that matches no open orders"""
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(60000.0, time.time())):
+            self.mock_order_repo.close_orders.return_value = []
+            self.mock_account_service.get_account_details.return_value = MagicMock(cash_balance=100.0, btc_balance=1.0)
+            
+            result = await self.service.close_trades(type="sell")
+            
+            self.mock_account_service.apply_balance_delta.assert_not_called()
+            self.mock_bg_tasks.add_task.assert_not_called()
+            assert result["closed_order_ids"] == []
+    
+    @pytest.mark.asyncio
+    async def test_create_trade_limit_rests_in_engine(self):
+        """Test that a limit order is stored as pending and handed to the matching engine"""
+        self.mock_order_repo.account_id = 3
+        created_at = datetime.datetime(2025, 3, 1, 12, 0, 0)
+        self.mock_order_repo.create_order.return_value = TradeOrder(
+            id=8, type="buy", kind="limit", amount=0.1, price=48000.0, trigger_price=48000.0,
+            status="pending", created_at=created_at
+        )
+        self.mock_account_service.get_account_details.return_value = Account(cash_balance=10000.0, btc_balance=0.5)
+        
+        with patch('services.order_service.PriceService.get_price', new_callable=AsyncMock) as mock_price:
+            result = await self.service.create_trade("buy", 0.1, "limit", 48000.0)
+        
+        # Nothing is priced or paid for until the order triggers
+        mock_price.assert_not_called()
+        self.mock_account_service.process_buy.assert_not_called()
+        self.mock_order_repo.create_order.assert_called_once_with(
+            "buy", 0.1, 48000.0, kind="limit", trigger_price=48000.0, status="pending"
+        )
+        self.mock_engine.add.assert_called_once_with(RestingOrder(8, 3, "buy", "limit", 0.1, 48000.0))
+        assert result["status"] == "pending"
+        assert result["price"] == 48000.0
+        assert result["account"]["cash_balance"] == 10000.0
+    
+    @pytest.mark.asyncio
+    async def test_create_trade_resting_order_validation(self):
+        """Test that resting orders need a known kind and a positive trigger price"""
+        for kind, trigger_price in [("iceberg", 48000.0), ("stop", None), ("limit", -1.0)]:
+            with pytest.raises(HTTPException) as excinfo:
+                await self.service.create_trade("sell", 0.1, kind, trigger_price)
+            assert excinfo.value.status_code == 400
+        self.mock_order_repo.create_order.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_create_trade_resting_order_unknown_account(self):
+        """Test that no order is rested for an account that doesn't exist"""
+        self.mock_account_service.get_account_details.side_effect = HTTPException(
+            status_code=404, detail="Account not initialized"
+        )
+        
         with pytest.raises(HTTPException) as excinfo:
-            await self.service.close_trade(999)
+            await self.service.create_trade("buy", 0.1, "limit", 48000.0)
+        
         assert excinfo.value.status_code == 404
+        self.mock_order_repo.create_order.assert_not_called()
+        self.mock_engine.add.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_cancel_order(self):
+        """Test cancelling a pending order removes it from the engine"""
+        closed_at = datetime.datetime(2025, 3, 1, 12, 5, 0)
+        self.mock_order_repo.cancel_order.return_value = MagicMock(id=8, status="cancelled", closed_at=closed_at)
+        
+        result = await self.service.cancel_order(8)
+        
+        self.mock_engine.cancel.assert_called_once_with(8)
+        assert result == {"order_id": 8, "status": "cancelled", "timestamp": closed_at}
+        
+        self.mock_order_repo.cancel_order.return_value = None
+        with pytest.raises(HTTPException) as excinfo:
+            await self.service.cancel_order(9)
+        assert excinfo.value.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_fill_orders(self):
+        """Test that triggered orders fill through the account paths, rejecting unfundable ones"""
+        self.mock_order_repo.account_id = 1
+        filled_at = datetime.datetime(2025, 3, 1, 12, 0, 0)
+        def fill_order(order_id, price):
+            if order_id == 3:
+                return None  # cancelled after triggering
+            return MagicMock(id=order_id, type="buy", kind="limit", amount=0.1, price=price,
+                             trigger_price=49000.0, status="open", created_at=filled_at, closed_at=None)
+        self.mock_order_repo.fill_order.side_effect = fill_order
+        self.mock_order_repo.reject_order.return_value = MagicMock(
+            id=2, type="sell", kind="stop", amount=5.0, price=49000.0, trigger_price=49000.0,
+            status="rejected", created_at=filled_at, closed_at=filled_at
+        )
+        self.mock_account_service.process_sell.side_effect = HTTPException(status_code=400, detail="Insufficient BTC balance")
+        
+        filled = await self.service.fill_orders(
+            [
+                RestingOrder(1, 1, "buy", "limit", 0.1, 49000.0),
+                RestingOrder(2, 1, "sell", "stop", 5.0, 49000.0),
+                RestingOrder(3, 1, "buy", "limit", 0.1, 49000.0),
+            ],
+            48000.0
+        )
+        
+        assert [order.id for order in filled] == [1]
+        self.mock_account_service.process_buy.assert_called_once_with(0.1, 48000.0)
+        self.mock_order_repo.reject_order.assert_called_once_with(2)
+        self.mock_books.invalidate.assert_called_once_with(1)
+        log_entries = self.mock_trade_log.submit_many.call_args[0][0]
+        assert [(entry["order_id"], entry["action"]) for entry in log_entries] == [(1, "fill"), (2, "reject")]
+        updated = self.mock_order_cache.update_orders.call_args[0][0]
+        assert [(order["id"], order["status"]) for order in updated] == [(1, "open"), (2, "rejected")]
+
+    @pytest.mark.asyncio
+    async def test_fill_orders_rejects_on_client_error(self):
+        """Test that an order whose account is gone is rejected rather than retried forever"""
+        self.mock_order_repo.account_id = 1
+        filled_at = datetime.datetime(2025, 3, 1, 12, 0, 0)
+        self.mock_order_repo.fill_order.return_value = MagicMock(id=1)
+        self.mock_order_repo.reject_order.return_value = MagicMock(
+            id=1, type="buy", kind="limit", amount=0.1, price=49000.0, trigger_price=49000.0,
+            status="rejected", created_at=filled_at, closed_at=filled_at
+        )
+        self.mock_account_service.process_buy.side_effect = HTTPException(status_code=404, detail="Account not initialized")
+        
+        filled = await self.service.fill_orders([RestingOrder(1, 1, "buy", "limit", 0.1, 49000.0)], 48000.0)
+        
+        assert filled == []
+        self.mock_order_repo.reject_order.assert_called_once_with(1)
+        
+        # Server errors still propagate, so the engine retries the order
+        self.mock_account_service.process_buy.side_effect = HTTPException(status_code=500, detail="Database error")
+        with pytest.raises(HTTPException):
+            await self.service.fill_orders([RestingOrder(1, 1, "buy", "limit", 0.1, 49000.0)], 48000.0)
+
+    @pytest.mark.asyncio
+    async def test_create_trade_journals_events(self):
+        """Test that a trade journals its order and balance change inside its unit of work"""
+        journal = AsyncMock()
+        self.service.journal = journal
+        self.mock_uow.__aexit__.side_effect = lambda *args: journal.record.assert_called_once()
+        self.mock_account_service.process_buy.return_value = MagicMock(cash_balance=5000.0, btc_balance=1.1)
+        self.mock_order_repo.create_order.return_value = MagicMock(
+            id=1, type="buy", kind="market", amount=0.1, price=50000.0, trigger_price=None,
+            status="open", created_at=datetime.datetime(2025, 3, 1, 12, 0, 0), closed_at=None
+        )
+        
+        with patch('services.price_service.PriceService.fetch_live_quote', return_value=(50000.0, time.time())):
+            await self.service.create_trade("buy", 0.1)
+        
+        events = journal.record.call_args[0][0]
+        assert [type for type, _ in events] == ["order_opened", "balance_changed"]
+        assert events[0][1]["id"] == 1
+        assert events[1][1] == {"cash_balance": 5000.0, "btc_balance": 1.1}
@@ -0,0 +1,99 @@
+import pytest
+from collections import namedtuple
+from unittest.mock import AsyncMock, patch
+from services.portfolio_service import PortfolioService, OpenBook, OpenBookCache
+
+Position = namedtuple("Position", ["id", "type", "amount", "price"])
+
+POSITIONS = [
+    Position(1, "buy", 0.1, 50000.0),
+    Position(2, "buy", 0.3, 40000.0),
+    Position(3, "sell", 0.2, 60000.0),
+]
+
+class TestPortfolioService:
+    
+    def setup_method(self, method):
+        self.mock_order_repo = AsyncMock()
+        self.mock_order_repo.account_id = 1
+        self.mock_order_repo.get_open_positions.return_value = POSITIONS
+        self.mock_order_cache = AsyncMock()
+        self.mock_order_cache.generation.return_value = 7
+        self.books = OpenBookCache()
+        self.service = PortfolioService(self.mock_order_repo, self.mock_order_cache, self.books)
+    
+    @pytest.mark.asyncio
+    async def test_get_portfolio_values_open_orders(self):
+        """Test PnL, exposure, VWAP and per-order marks against the current price"""
+        with patch('services.portfolio_service.PriceService.get_price', new_callable=AsyncMock, return_value=55000.0):
+            portfolio = await self.service.get_portfolio()
+        
+        assert portfolio["price"] == 55000.0
+        assert portfolio["open_orders"] == 3
+        assert portfolio["net_exposure_btc"] == pytest.approx(0.2)
+        assert portfolio["gross_exposure_btc"] == pytest.approx(0.6)
+        assert portfolio["net_exposure_usd"] == pytest.approx(11000.0)
+        # 0.1 * 5000 + 0.3 * 15000 - 0.2 * -5000
+        assert portfolio["unrealized_pnl"] == pytest.approx(6000.0)
+        assert portfolio["buy_vwap"] == pytest.approx(42500.0)
+        assert portfolio["sell_vwap"] == pytest.approx(60000.0)
+        assert [mark["order_id"] for mark in portfolio["marks"]] == [1, 2, 3]
+        assert portfolio["marks"][2]["type"] == "sell"
+        assert portfolio["marks"][2]["unrealized_pnl"] == pytest.approx(1000.0)
+        assert portfolio["marks"][0]["mark_value"] == pytest.approx(5500.0)
+    
+    @pytest.mark.asyncio
+    async def test_empty_book(self):
+        """Test valuing an account without open orders"""
+        self.mock_order_repo.get_open_positions.return_value = []
+        
+        with patch('services.portfolio_service.PriceService.get_price', new_callable=AsyncMock, return_value=55000.0):
+            portfolio = await self.service.get_portfolio(include_marks=False)
+        
+        assert portfolio["open_orders"] == 0
+        assert portfolio["unrealized_pnl"] == 0.0
+        assert portfolio["buy_vwap"] is None and portfolio["sell_vwap"] is None
+        assert portfolio["marks"] is None
+    
+    @pytest.mark.asyncio
+    async def test_new_tick_revalues_without_reloading(self):
+        """Test that the cached arrays are reused across ticks"""
+        with patch('services.portfolio_service.PriceService.get_price', new_callable=AsyncMock) as mock_price:
+            mock_price.return_value = 50000.0
+            first = await self.service.get_portfolio()
+            mock_price.return_value = 60000.0
+            second = await self.service.get_portfolio()
+        
+        self.mock_order_repo.get_open_positions.assert_called_once()
+        assert first["unrealized_pnl"] == pytest.approx(3000.0 + 2000.0)
+        assert second["unrealized_pnl"] == pytest.approx(1000.0 + 6000.0)
+    
+    @pytest.mark.asyncio
+    async def test_trades_force_a_reload(self):
+        """Test that invalidation or a moved generation reloads the open orders"""
+        with patch('services.portfolio_service.PriceService.get_price', new_callable=AsyncMock, return_value=50000.0):
+            await self.service.get_portfolio()
+            self.books.invalidate(1)
+            await self.service.get_portfolio()
+            self.mock_order_cache.generation.return_value = 8
+            await self.service.get_portfolio()
+            await self.service.get_portfolio()
+        
+        assert self.mock_order_repo.get_open_positions.call_count == 3
+    
+    def test_mark_reuses_valuation_for_same_price(self):
+        """Test that marking twice at one price doesn't recompute"""
+        book = OpenBook(POSITIONS, generation=0)
+        assert book.mark(50000.0) is book.mark(50000.0)
+        assert book.mark(51000.0) is not None
+    
+    def test_book_cache_evicts_least_recently_used(self):
+        """Test that the cache keeps a bounded number of accounts"""
+        books = OpenBookCache(max_accounts=2)
+        books.put(1, OpenBook([], 0))
+        books.put(2, OpenBook([], 0))
+        books.get(1)
+        books.put(3, OpenBook([], 0))
+        
+        assert books.get(2) is None
+        assert books.get(1) is not None and books.get(3) is not None
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from services.price_feed import PriceFeed
+
+class TestPriceFeed:
+
+    def setup_method(self, method):
+        self.fetch_quote = AsyncMock(return_value=(50000.0, 1700000000.0))
+        self.feed = PriceFeed(self.fetch_quote, interval=0.01, max_staleness=5.0)
+
+    def test_publish_increments_sequence(self):
+        """Test that each published tick gets the next sequence number"""
+        first = self.feed.publish(50000.0, 1700000000.0)
+        second = self.feed.publish(50100.0, 1700000001.0)
+
+        assert first.sequence == 1
+        assert second.sequence == 2
+        assert self.feed.latest is second
+
+    def test_publish_ignores_older_quotes(self):
+        """Test that an out-of-order quote does not replace a newer tick"""
+        newer = self.feed.publish(50100.0, 1700000001.0)
+        result = self.feed.publish(50000.0, 1700000000.0)
+
+        assert result is newer
+        assert self.feed.latest.price == 50100.0
+
+    def test_listeners_see_new_ticks_only(self):
+        """Test that subscribers are called for every accepted tick, and survive a failing peer"""
+        seen = []
+        def broken(tick):
+            raise RuntimeError("boom")
+        self.feed.subscribe(broken)
+        self.feed.subscribe(seen.append)
+
+        self.feed.publish(50100.0, 1700000001.0)
+        self.feed.publish(50000.0, 1700000000.0)
+        self.feed.unsubscribe(seen.append)
+        self.feed.publish(50200.0, 1700000002.0)
+
+        assert [tick.price for tick in seen] == [50100.0]
+
+    def test_fresh_tick_respects_staleness_budget(self):
+        """Test that ticks older than the budget are not returned"""
+        tick = self.feed.publish(50000.0)
+        assert self.feed.fresh_tick() is tick
+
+        with patch('services.price_feed.time.monotonic', return_value=tick.received_at + 10):
+            assert self.feed.fresh_tick() is None
+            assert self.feed.fresh_tick(max_staleness=20) is tick
+
+    def test_fresh_tick_empty(self):
+        """Test that no tick is returned before the first poll"""
+        assert self.feed.fresh_tick() is None
+
+    @pytest.mark.asyncio
+    async def test_poller_publishes_ticks(self):
+        """Test that the background poller keeps refreshing the tick"""
+        self.feed.start()
+        await asyncio.sleep(0.05)
+        await self.feed.stop()
+
+        assert self.fetch_quote.call_count >= 2
+        assert self.feed.latest.price == 50000.0
+        assert not self.feed.running
+
+    @pytest.mark.asyncio
+    async def test_poller_survives_fetch_errors(self):
+        """Test that a failed poll does not stop the poller"""
+        self.fetch_quote.side_effect = [Exception("upstream down"), (51000.0, 1700000002.0)]
+
+        self.feed.start()
+        await asyncio.sleep(0.05)
+        await self.feed.stop()
+
+        assert self.feed.latest.price == 51000.0
@@ -0,0 +1,216 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from services.price_providers import (
+    BitstampProvider, CircuitBreaker, CoinbaseProvider, CoindeskProvider, KrakenProvider,
+    LatencyWindow, PriceAggregator, PriceSource, PriceUnavailable, StaticProvider, build_providers
+)
+
+class CountingProvider(StaticProvider):
+    """A stub that counts its requests and can fail"""
+    def __init__(self, price=50000.0, delay=0.0, name="stub", fail=False):
+        super().__init__(price, delay, name)
+        self.fail = fail
+        self.calls = 0
+
+    async def fetch_quote(self, client, timeout):
+        self.calls += 1
+        if self.fail:
+            await asyncio.sleep(self.delay)
+            raise ValueError("upstream down")
+        return await super().fetch_quote(client, timeout)
+
+def aggregator(*providers, mode="first", timeout=1.0):
+    return PriceAggregator(providers, lambda: MagicMock(), mode=mode, timeout=timeout)
+
+class TestProviders:
+
+    def test_parsers(self):
+        """Test that each provider reads the price out of its own response format"""
+        assert CoindeskProvider().parse(
+            {"Data": {"BTC-USD": {"VALUE": "50000.0", "VALUE_LAST_UPDATE_TS": 1700000000}}}
+        ) == (50000.0, 1700000000.0)
+        assert CoinbaseProvider().parse({"data": {"amount": "50100.5"}})[0] == 50100.5
+        assert KrakenProvider().parse({"error": [], "result": {"XXBTZUSD": {"c": ["50200.1", "0.1"]}}})[0] == 50200.1
+        assert BitstampProvider().parse({"last": "50300", "timestamp": "1700000000"}) == (50300.0, 1700000000.0)
+
+    def test_kraken_error_raises(self):
+        """Test that a Kraken error payload is a failure, not a price"""
+        with pytest.raises(ValueError):
+            KrakenProvider().parse({"error": ["EGeneral:Too many requests"], "result": {}})
+
+    def test_build_providers(self):
+        """Test building providers from a configured list of names"""
+        providers = build_providers("coindesk, kraken")
+        assert [provider.name for provider in providers] == ["coindesk", "kraken"]
+        with pytest.raises(ValueError):
+            build_providers("coindesk,nope")
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold(self):
+        """Test that consecutive failures open the breaker and a success closes it"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+    def test_half_open_lets_one_trial_through(self):
+        """Test that an open breaker admits one request per reset period"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+        breaker.record_failure()
+        later = time.monotonic() + 31
+        with patch("services.price_providers.time.monotonic", return_value=later):
+            assert breaker.state == "half_open"
+            assert breaker.allow()
+            assert not breaker.allow()
+            # A failed trial opens it for another period
+            breaker.record_failure()
+            assert breaker.state == "open"
+
+class TestLatencyWindow:
+
+    def test_percentile_and_hedge_delay(self):
+        """Test that the hedge delay follows the p95 latency within its bounds"""
+        window = LatencyWindow()
+        assert window.percentile(0.95) is None
+        for i in range(100):
+            window.record(i / 1000)
+        assert window.percentile(0.95) == 0.095
+
+        source = PriceSource(StaticProvider())
+        with patch("services.price_providers.PRICE_HEDGE_DELAY", 0.25):
+            assert source.hedge_delay() == 0.25
+        source.latencies = window
+        assert source.hedge_delay() == 0.095
+        source.latencies = LatencyWindow()
+        source.latencies.record(0.0001)
+        with patch("services.price_providers.PRICE_HEDGE_MIN_DELAY", 0.05):
+            assert source.hedge_delay() == 0.05
+
+class TestPriceAggregator:
+
+    @pytest.mark.asyncio
+    async def test_first_answer_wins_without_hedging(self):
+        """Test that a fast primary answers alone"""
+        primary, backup = CountingProvider(50000.0, name="a"), CountingProvider(51000.0, name="b")
+        price, _ = await aggregator(primary, backup).fetch_quote()
+
+        assert price == 50000.0
+        assert (primary.calls, backup.calls) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_is_hedged(self):
+        """Test that a backup request goes out after the primary's hedge delay and wins"""
+        primary, backup = CountingProvider(50000.0, delay=1.0, name="a"), CountingProvider(51000.0, name="b")
+        prices = aggregator(primary, backup)
+        prices.sources[0].latencies.record(0.01)
+
+        started = time.perf_counter()
+        price, _ = await prices.fetch_quote()
+
+        assert price == 51000.0
+        assert time.perf_counter() - started < 0.5
+        assert (primary.calls, backup.calls) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_failure_fails_over_immediately(self):
+        """Test that a failed provider moves on to the next without waiting for the hedge delay"""
+        primary, backup = CountingProvider(name="a", fail=True), CountingProvider(51000.0, name="b")
+        prices = aggregator(primary, backup)
+
+        with patch("services.price_providers.PRICE_HEDGE_DELAY", 5.0):
+            price, _ = await prices.fetch_quote()
+
+        assert price == 51000.0
+        assert prices.sources[0].breaker.failures == 1
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_is_skipped(self):
+        """Test that a provider with an open breaker isn't called"""
+        primary, backup = CountingProvider(name="a"), CountingProvider(51000.0, name="b")
+        prices = aggregator(primary, backup)
+        prices.sources[0].breaker.opened_at = time.monotonic()
+
+        price, _ = await prices.fetch_quote()
+
+        assert price == 51000.0
+        assert primary.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_all_providers_failing(self):
+        """Test that PriceUnavailable is raised when no provider answers"""
+        prices = aggregator(CountingProvider(name="a", fail=True), CountingProvider(name="b", fail=True))
+        with pytest.raises(PriceUnavailable):
+            await prices.fetch_quote()
+
+    @pytest.mark.asyncio
+    async def test_timeout(self):
+        """Test that providers slower than the overall timeout are abandoned"""
+        prices = aggregator(CountingProvider(delay=1.0, name="a"), timeout=0.05)
+        with pytest.raises(PriceUnavailable):
+            await prices.fetch_quote()
+
+    @pytest.mark.asyncio
+    async def test_hanging_provider_opens_breaker(self):
+        """Test that a provider that never answers fails on its own timeout and gets skipped"""
+        hanging, backup = CountingProvider(delay=60.0, name="a"), CountingProvider(51000.0, name="b")
+        prices = PriceAggregator([hanging, backup], lambda: MagicMock(), timeout=1.0, provider_timeout=0.02)
+        source = prices.sources[0]
+        source.breaker.failure_threshold = 2
+
+        with patch("services.price_providers.PRICE_HEDGE_DELAY", 5.0):
+            for _ in range(3):
+                price, _ = await prices.fetch_quote()
+                assert price == 51000.0
+
+        assert source.breaker.state == "open"
+        assert hanging.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_abandoned_at_deadline_counts_as_failure(self):
+        """Test that a request cut off by the overall timeout is a failure, but a lost hedge isn't"""
+        prices = aggregator(CountingProvider(delay=1.0, name="a"), timeout=0.05)
+        with pytest.raises(PriceUnavailable):
+            await prices.fetch_quote()
+        assert prices.sources[0].breaker.failures == 1
+
+        primary, backup = CountingProvider(50000.0, delay=1.0, name="a"), CountingProvider(51000.0, name="b")
+        prices = aggregator(primary, backup)
+        prices.sources[0].latencies.record(0.01)
+        await prices.fetch_quote()
+        assert prices.sources[0].breaker.failures == 0
+
+    @pytest.mark.asyncio
+    async def test_median_across_providers(self):
+        """Test that median mode asks every provider and returns the median price"""
+        providers = [CountingProvider(price, name=name) for price, name in ((100.0, "a"), (300.0, "b"), (150.0, "c"))]
+        price, _ = await aggregator(*providers, mode="median").fetch_quote()
+
+        assert price == 150.0
+        assert all(provider.calls == 1 for provider in providers)
+
+    @pytest.mark.asyncio
+    async def test_median_does_not_wait_for_stragglers(self):
+        """Test that median mode gives slow providers only their hedge delay after the first answer"""
+        fast, slow = CountingProvider(100.0, name="a"), CountingProvider(300.0, delay=1.0, name="b")
+        prices = aggregator(fast, slow, mode="median")
+        prices.sources[1].latencies.record(0.05)
+
+        started = time.perf_counter()
+        price, _ = await prices.fetch_quote()
+
+        assert price == 100.0
+        assert time.perf_counter() - started < 0.5
+
+    def test_unknown_mode(self):
+        """Test that an unknown aggregation mode is rejected"""
+        with pytest.raises(ValueError):
+            aggregator(StaticProvider(), mode="mean")
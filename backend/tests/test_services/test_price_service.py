@@ -1,11 +1,19 @@
+import asyncio
+import time
 import pytest
 import httpx
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi import HTTPException
-from services.price_service import PriceService
+from config import PRICE_PROVIDERS
+from services.price_providers import build_providers
+from services.price_service import PriceService, price_aggregator, price_feed
 
 class TestPriceService:
-    
+
+    def setup_method(self):
+        # Fresh circuit breakers, so failures in one test don't open them for the next
+        price_aggregator.use(build_providers(PRICE_PROVIDERS))
+
     @pytest.mark.asyncio
     async def test_fetch_live_price_success(self):
         """Test successful price fetch"""
@@ -56,3 +64,79 @@ class TestPriceService:
                 await PriceService.fetch_live_price()
             assert excinfo.value.status_code == 500
             assert "Error fetching live price" in excinfo.value.detail
+
+    @pytest.mark.asyncio
+    async def test_get_price_uses_fresh_tick(self):
+        """Test that a fresh polled tick is served without an upstream call"""
+        price_feed.publish(48000.0)
+
+        with patch('services.price_service.PriceService.fetch_live_quote', new_callable=AsyncMock) as mock_fetch:
+            price = await PriceService.get_price()
+
+        assert price == 48000.0
+        mock_fetch.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_price_falls_back_when_stale(self):
+        """Test that a stale tick triggers a synchronous fetch"""
+        price_feed.publish(48000.0)
+
+        with patch('services.price_service.PriceService.fetch_live_quote',
+                   new_callable=AsyncMock, return_value=(51000.0, time.time())) as mock_fetch, \
+             patch('services.price_feed.time.monotonic', return_value=time.monotonic() + 60):
+            price = await PriceService.get_price()
+
+        assert price == 51000.0
+        mock_fetch.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_price_fallback_keeps_source_timestamp(self):
+        """Test that a fallback fetch doesn't shut out the next polled tick"""
+        price_feed.reset()
+        # Upstream timestamps trail local time by a few seconds
+        source_ts = time.time() - 5
+
+        with patch('services.price_service.PriceService.fetch_live_quote',
+                   new_callable=AsyncMock, return_value=(51000.0, source_ts)):
+            assert await PriceService.get_price() == 51000.0
+
+        tick = price_feed.publish(51500.0, source_ts + 1)
+        assert tick.price == 51500.0
+        assert price_feed.fresh_tick().price == 51500.0
+
+    @pytest.mark.asyncio
+    async def test_fetch_live_price_reuses_client(self):
+        """Test that fetches share one pooled HTTP client"""
+        assert PriceService.get_client() is PriceService.get_client()
+
+    @pytest.mark.asyncio
+    async def test_fetch_live_price_coalesces_concurrent_calls(self):
+        """Test that concurrent fetches share a single upstream request"""
+        mock_response = MagicMock()
+        mock_response.json = MagicMock(return_value={"Data": {"BTC-USD": {"VALUE": "50000.0"}}})
+
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return mock_response
+
+        with patch('httpx.AsyncClient.get', side_effect=slow_get) as mock_get:
+            prices = await asyncio.gather(*[PriceService.fetch_live_price() for _ in range(20)])
+
+        assert prices == [50000.0] * 20
+        assert mock_get.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_fetch_live_price_error_shared_by_waiters(self):
+        """Test that an upstream error is raised to every coalesced caller after each provider is tried once"""
+        async def failing_get(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            raise httpx.HTTPError("Error")
+
+        with patch('httpx.AsyncClient.get', side_effect=failing_get) as mock_get:
+            results = await asyncio.gather(
+                *[PriceService.fetch_live_price() for _ in range(5)],
+                return_exceptions=True
+            )
+
+        assert mock_get.call_count == len(price_aggregator.sources)
+        assert all(isinstance(r, HTTPException) and r.status_code == 500 for r in results)
@@ -0,0 +1,140 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from services.trade_log_service import TradeLogService
+
+class TestTradeLogService:
+
+    def setup_method(self, method):
+        self.mock_collection = AsyncMock()
+
+    @pytest.mark.asyncio
+    async def test_flush_on_batch_size(self):
+        """Test that a full batch is written with a single insert_many"""
+        service = TradeLogService(max_queue_size=100, batch_size=3, flush_interval=10.0)
+        service.start(self.mock_collection)
+
+        await service.submit_many([{"order_id": i} for i in range(3)])
+        await asyncio.sleep(0.01)
+
+        self.mock_collection.insert_many.assert_called_once_with(
+            [{"order_id": 0}, {"order_id": 1}, {"order_id": 2}], ordered=False
+        )
+        await service.stop()
+
+    @pytest.mark.asyncio
+    async def test_connects_on_first_write(self):
+        """Test that a lazily connected writer resolves its collection once, when it first flushes"""
+        connect = MagicMock(return_value=self.mock_collection)
+        service = TradeLogService(max_queue_size=100, batch_size=1, flush_interval=10.0)
+        service.start(connect=connect)
+        connect.assert_not_called()
+
+        await service.submit({"order_id": 1})
+        await service.submit({"order_id": 2})
+        await service.stop()
+
+        connect.assert_called_once_with()
+        assert self.mock_collection.insert_many.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_flush_on_interval(self):
+        """Test that a partial batch is written once the flush interval elapses"""
+        service = TradeLogService(max_queue_size=100, batch_size=50, flush_interval=0.02)
+        service.start(self.mock_collection)
+
+        await service.submit({"order_id": 1})
+        await asyncio.sleep(0.005)
+        self.mock_collection.insert_many.assert_not_called()
+
+        await asyncio.sleep(0.05)
+        self.mock_collection.insert_many.assert_called_once_with([{"order_id": 1}], ordered=False)
+        await service.stop()
+
+    @pytest.mark.asyncio
+    async def test_read_left_waiting_carries_over(self):
+        """Test that the queue read outstanding at a flush deadline serves the next batch"""
+        service = TradeLogService(max_queue_size=100, batch_size=50, flush_interval=0.01)
+        service.start(self.mock_collection)
+
+        await service.submit({"order_id": 1})
+        await asyncio.sleep(0.03)
+        read = service._get
+        assert read is not None and not read.done()
+
+        await service.submit({"order_id": 2})
+        await service.stop()
+        assert read.result() == {"order_id": 2}
+        written = [entry for call in self.mock_collection.insert_many.call_args_list for entry in call[0][0]]
+        assert written == [{"order_id": 1}, {"order_id": 2}]
+
+    @pytest.mark.asyncio
+    async def test_entries_arriving_at_the_deadline_are_kept(self):
+        """Test that entries trickling in around flush deadlines are all written, in order"""
+        service = TradeLogService(max_queue_size=100, batch_size=50, flush_interval=0.003)
+        service.start(self.mock_collection)
+
+        for i in range(40):
+            await service.submit({"order_id": i})
+            await asyncio.sleep(0.001 * (i % 4))
+        await service.stop()
+
+        written = [entry for call in self.mock_collection.insert_many.call_args_list for entry in call[0][0]]
+        assert written == [{"order_id": i} for i in range(40)]
+
+    @pytest.mark.asyncio
+    async def test_stop_drains_queue(self):
+        """Test that stopping writes every queued entry"""
+        service = TradeLogService(max_queue_size=100, batch_size=50, flush_interval=10.0)
+        service.start(self.mock_collection)
+
+        await service.submit_many([{"order_id": i} for i in range(5)])
+        await service.stop()
+
+        written = [entry for call in self.mock_collection.insert_many.call_args_list for entry in call[0][0]]
+        assert written == [{"order_id": i} for i in range(5)]
+        assert not service.running
+
+    @pytest.mark.asyncio
+    async def test_backpressure_when_queue_full(self):
+        """Test that submit waits while the queue is full"""
+        release = asyncio.Event()
+
+        async def slow_insert(batch, ordered):
+            await release.wait()
+
+        self.mock_collection.insert_many.side_effect = slow_insert
+        service = TradeLogService(max_queue_size=2, batch_size=1, flush_interval=10.0)
+        service.start(self.mock_collection)
+
+        # The first entry is taken by the blocked flusher, the next two fill the queue
+        await service.submit_many([{"order_id": i} for i in range(3)])
+        blocked = asyncio.ensure_future(service.submit({"order_id": 3}))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        assert service.queue_depth == 2
+
+        release.set()
+        await asyncio.wait_for(blocked, 1.0)
+        await service.stop()
+        assert self.mock_collection.insert_many.call_count == 4
+
+    @pytest.mark.asyncio
+    async def test_write_errors_do_not_stop_writer(self):
+        """Test that a failed insert is logged and the writer keeps going"""
+        self.mock_collection.insert_many.side_effect = [Exception("mongo down"), None]
+        service = TradeLogService(max_queue_size=100, batch_size=1, flush_interval=10.0)
+        service.start(self.mock_collection)
+
+        await service.submit({"order_id": 1})
+        await service.submit({"order_id": 2})
+        await service.stop()
+
+        assert self.mock_collection.insert_many.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_submit_requires_running_writer(self):
+        """Test that submitting before start is rejected"""
+        service = TradeLogService()
+        with pytest.raises(RuntimeError):
+            await service.submit({"order_id": 1})
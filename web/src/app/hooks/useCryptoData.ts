@@ -3,6 +3,22 @@
 import { useState, useEffect } from 'react';
 import { Position, HistoryPosition, OrderDto, Account } from '../../types';
 
+// Every page of an order listing, following X-Next-Cursor until it runs out
+const fetchAllOrders = async (query: string): Promise<OrderDto[]> => {
+  const orders: OrderDto[] = [];
+  let cursor: string | null = null;
+  do {
+    const url: string = `http://localhost:8000/orders?${query}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : "");
+    const response = await fetch(url);
+    if (!response.ok) {
+      throw new Error("Failed to fetch orders");
+    }
+    orders.push(...(await response.json()));
+    cursor = response.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return orders;
+};
+
 export const useCryptoData = () => {
   const [btcPrice, setBtcPrice] = useState(0);
   const [priceDirection, setPriceDirection] = useState('');
@@ -13,15 +29,18 @@ export const useCryptoData = () => {
   useEffect(() => {
     const fetchOrders = async () => {
       try {
-        const response = await fetch("http://localhost:8000/orders");
-        if (!response.ok) {
+        // Every open position, but only the latest page of history
+        const [openOrders, closedResponse] = await Promise.all([
+          fetchAllOrders("status=open&limit=500"),
+          fetch("http://localhost:8000/orders?status=closed&limit=100"),
+        ]);
+        if (!closedResponse.ok) {
           throw new Error("Failed to fetch orders");
         }
         
-        const data = await response.json();
+        const closedOrders: OrderDto[] = await closedResponse.json();
         
-        const openPositions = data
-          .filter((order: OrderDto) => order.status === "open")
+        const openPositions = openOrders
           .map((order: OrderDto) => ({
             id: order.id,
             type: order.type,
@@ -30,8 +49,7 @@ export const useCryptoData = () => {
             timestamp: order.created_at,
           }));
 
-        const closedPositions = data
-          .filter((order: OrderDto) => order.status === "closed")
+        const closedPositions = closedOrders
           .map((order: OrderDto) => ({
             id: order.id,
             type: order.type,